@@ -0,0 +1,116 @@
+"""
+This script compares complete saves with delta saves, which only store the differences to the
+pristine world. It generates a world file from the shipped one, to which a place with 20k entities
+is added, changes 1% of the entities and reports the time it takes to save and to restore the world
+and the size of the save in both modes. Every save and restore runs in a new process in a
+temporary directory, since a process can only hold one game.
+
+Run it from the root directory of the game: python Benchmarks/delta_save.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import Source
+from Source.EngineL import Core
+
+ENTITIES = 20000
+CHANGED_ENTITIES = ENTITIES // 100
+MODES = [("complete", []),
+         ("delta", ["--delta-save"]),
+         ("complete, binary", ["--binary-save"]),
+         ("delta, binary", ["--delta-save", "--binary-save"])]
+
+def generate_world(directory):
+    """
+    This function writes the generated world file and the string resources into the Resources
+    directory of the given directory.
+    """
+    resources_path = os.path.join(directory, "Resources")
+    os.mkdir(resources_path)
+    shutil.copy(os.path.join(ROOT_PATH, "Resources", "strings.xml"), resources_path)
+    tree = Core.ElementTree.parse(os.path.join(ROOT_PATH, Core.WORLD_PATH))
+    place = Core.ElementTree.SubElement(tree.getroot(), "Place", {"name": "Lager", "gender": "n"})
+    children = Core.ElementTree.SubElement(place, "children")
+    for index in range(0, ENTITIES):
+        Core.ElementTree.SubElement(children, "StaticEntity", {"name": "Kiste " + str(index),
+                                                               "gender": "f"})
+    tree.write(os.path.join(directory, Core.WORLD_PATH), encoding="UTF-8", xml_declaration=True)
+
+def run_game(arguments):
+    """
+    This function restores the world in the current directory and, if the first argument is
+    'save', changes some entities and saves it. It prints the time these steps took in seconds.
+    """
+    app = Core.HeadlessApp([sys.argv[0]] + arguments[1:])
+    Source.register_entity_classes(app)
+    start_time = time.perf_counter()
+    app.restore_world()
+    app.connect_places()
+    restore_time = time.perf_counter() - start_time
+    if arguments[0] == "save":
+        app.start_journal()
+        place = app.find_entity("Lager")
+        for entity in random.sample(place.children(), CHANGED_ENTITIES):
+            entity.set_state("opened", 1)
+        start_time = time.perf_counter()
+        app.save_world()
+        print(time.perf_counter() - start_time)
+    else:
+        print(restore_time)
+    # The interpreter would spend a lot of time tearing down the entities.
+    sys.stdout.flush()
+    os._exit(0)
+
+def run_child(directory, arguments):
+    """
+    This function runs run_game in a new process in the given directory and returns it's output.
+    """
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child"]
+                                     + arguments, cwd=directory)
+    return float(output.split()[-1])
+
+def main():
+    """
+    This function runs the benchmark.
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_game(sys.argv[2:])
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        generate_world(directory)
+        for label, flags in MODES:
+            for file_name in os.listdir(os.path.join(directory, "Resources")):
+                if file_name.startswith("save."):
+                    os.remove(os.path.join(directory, "Resources", file_name))
+            save_time = run_child(directory, ["save"] + flags)
+            save_path = Core.BINARY_SAVE_PATH if "--binary-save" in flags else Core.SAVE_PATH
+            save_size = os.path.getsize(os.path.join(directory, save_path))
+            restore_time = run_child(directory, ["restore"] + flags)
+            print(label.ljust(20) + ("saving: %.1f ms" % (save_time * 1000)).rjust(20)
+                  + ("restoring: %.1f ms" % (restore_time * 1000)).rjust(24)
+                  + (str(save_size) + " bytes").rjust(18))
+
+if __name__ == "__main__":
+    main()
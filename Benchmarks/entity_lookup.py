@@ -0,0 +1,83 @@
+"""
+This script benchmarks name lookups of entities in a generated world with 100k entities, using the
+name indices of the application and the places and comparing them to QObject.findChild.
+
+Run it from the root directory of the game: python Benchmarks/entity_lookup.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import Qt
+from Source.EngineL import Core
+
+PLACES = 1000
+ENTITIES_PER_PLACE = 100
+INDEXED_LOOKUPS = 100000
+WALKED_LOOKUPS = 100
+
+def generate_world(app):
+    """
+    This function fills the given application with places and entities and returns a list of
+    (place, entity name) pairs.
+    """
+    names = []
+    for place_index in range(0, PLACES):
+        place = Core.Place(app)
+        place.setObjectName("place" + str(place_index))
+        for entity_index in range(0, ENTITIES_PER_PLACE):
+            entity = Core.Entity(place)
+            entity.setObjectName("entity" + str(place_index) + "." + str(entity_index))
+            names.append((place, entity.objectName()))
+    return names
+
+def report(label, seconds, lookups):
+    """
+    This function prints the average time of one lookup in microseconds.
+    """
+    print(label.ljust(40) + ("%.3f us" % (seconds / lookups * 1000000)).rjust(16))
+
+def main():
+    """
+    This function runs the benchmark.
+    """
+    app = Core.SinglePlayerApp(sys.argv + ["-n"])
+    start = time.perf_counter()
+    names = generate_world(app)
+    build_time = time.perf_counter() - start
+    print("built " + str(PLACES * (ENTITIES_PER_PLACE + 1)) + " entities in %.2f s" % build_time)
+
+    sample = [random.choice(names) for _ in range(0, INDEXED_LOOKUPS)]
+    seconds = timeit.timeit(lambda: [app.find_entity(name) for _, name in sample], number=1)
+    report("app.find_entity", seconds, INDEXED_LOOKUPS)
+    seconds = timeit.timeit(lambda: [place.find_entity(name) for place, name in sample], number=1)
+    report("place.find_entity", seconds, INDEXED_LOOKUPS)
+
+    sample = sample[0:WALKED_LOOKUPS]
+    seconds = timeit.timeit(lambda: [app.findChild(Core.Entity, name, Qt.FindChildrenRecursively)
+                                     for _, name in sample], number=1)
+    report("app.findChild (recursive)", seconds, WALKED_LOOKUPS)
+    seconds = timeit.timeit(lambda: [place.findChild(Core.Entity, name)
+                                     for place, name in sample], number=1)
+    report("place.findChild", seconds, WALKED_LOOKUPS)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+This script benchmarks how entity names the player entered are resolved in a generated place with
+10k entities: exact names, names with a different case and a leading article and names with typos.
+The typos are also resolved by a linear scan that computes the edit distance to every name.
+
+Run it from the root directory of the game: python Benchmarks/name_resolver.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from Source.EngineL import Core
+
+ENTITIES = 10000
+LOOKUPS = 1000
+SCANNED_LOOKUPS = 10
+SYLLABLES = ["schrott", "hau", "fen", "lei", "ter", "stöp", "sel", "ofen", "mar", "me", "la", "de",
+             "wind", "rad", "müll", "berg", "fluss", "dorf", "hüt", "te", "sofa", "toast", "holz"]
+
+def generate_name():
+    """
+    This function returns a random name made of three to five syllables.
+    """
+    name = "".join(random.choice(SYLLABLES) for _ in range(0, random.randint(3, 5)))
+    return name.capitalize()
+
+def add_typo(name):
+    """
+    This function replaces one character of the given name.
+    """
+    index = random.randrange(0, len(name))
+    return name[:index] + random.choice("aeiouxyz") + name[index + 1:]
+
+def scan(place, name):
+    """
+    This function finds the name with the smallest edit distance to the given one by comparing it
+    to every name in the place.
+    """
+    normalized_name = Core.normalize_name(name)
+    return min(place.name_index, key=lambda known_name:
+               Core.edit_distance(normalized_name, Core.normalize_name(known_name)))
+
+def report(label, seconds, lookups):
+    """
+    This function prints the average time of one lookup in microseconds.
+    """
+    print(label.ljust(40) + ("%.3f us" % (seconds / lookups * 1000000)).rjust(16))
+
+def main():
+    """
+    This function runs the benchmark.
+    """
+    app = Core.HeadlessApp(sys.argv + ["-n"])
+    place = Core.Place(app)
+    names = set()
+    while len(names) < ENTITIES:
+        names.add(generate_name())
+    for name in names:
+        Core.Entity(place).setObjectName(name)
+
+    seconds = timeit.timeit(place.get_name_resolver, number=1)
+    report("building the resolver", seconds, 1)
+
+    sample = random.sample(sorted(names), LOOKUPS)
+    seconds = timeit.timeit(lambda: [place.resolve_entity(name) for name in sample], number=1)
+    report("exact names", seconds, LOOKUPS)
+
+    article = Core.get_res_man().get_string("core.grammar.definiteArticle.m.lower")
+    normalized_sample = [article + " " + name.lower() for name in sample]
+    seconds = timeit.timeit(lambda: [place.resolve_entity(name) for name in normalized_sample],
+                            number=1)
+    report("lower case names with an article", seconds, LOOKUPS)
+
+    typo_sample = [add_typo(name) for name in sample]
+    seconds = timeit.timeit(lambda: [place.resolve_entity(name) for name in typo_sample],
+                            number=1)
+    report("names with a typo: n-gram index", seconds, LOOKUPS)
+    seconds = timeit.timeit(lambda: [scan(place, name) for name in typo_sample[0:SCANNED_LOOKUPS]],
+                            number=1)
+    report("names with a typo: linear scan", seconds, SCANNED_LOOKUPS)
+
+if __name__ == "__main__":
+    main()
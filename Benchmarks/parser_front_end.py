@@ -0,0 +1,105 @@
+"""
+This script benchmarks the front end of the gameplay parser, which splits an entered command,
+removes the ignored words and finds the verb, on long command inputs. It compares the current
+implementation to the one it replaced, which read the ignored words and verbs from the resource
+tree for every command.
+
+Run it from the root directory of the game: python Benchmarks/parser_front_end.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Source
+from Source.EngineL import Core
+
+COMMAND_LENGTHS = [4, 64, 1024]
+REPETITIONS = 2000
+VERB_GROUPS = ["lookAt", "walkTo", "pickUp", "drop", "combine", "talk"]
+
+def generate_command(length):
+    """
+    This function generates a command with the given number of words, which begins with a verb and
+    contains ignored words and other words in random order.
+    """
+    res_man = Core.get_res_man()
+    ignored_words = res_man.get_string_list("core.gameplayParser.ignoreWord")
+    words = ["Schrotthaufen", "Leiter", "mit", "Werkzeug", "großer", "Haufen"]
+    command = [random.choice(res_man.get_string_list("core.gameplayParser.combine.command"))]
+    for _ in range(1, length):
+        command.append(random.choice(random.choice([ignored_words, words])))
+    return " ".join(command)
+
+def old_front_end(text):
+    """
+    This function is the parser front end as it was before: It read the ignored words from the
+    resource tree, deleted them from the split text one by one and compared the verbs of every
+    group with the beginning of the text.
+    """
+    split_text = text.split()
+    parsers_root = Core.get_res_man().get_element("core.gameplayParser")
+    ignored_words = []
+    for word in parsers_root.findall("ignoreWord"):
+        ignored_words.append(word.text)
+    index = 0
+    while index < len(split_text):
+        if split_text[index] in ignored_words:
+            del split_text[index]
+        else:
+            index += 1
+
+    for group in VERB_GROUPS:
+        for command in parsers_root.find(group).findall("command"):
+            command = command.text.split()
+            if len(command) > len(split_text):
+                continue
+            matches = True
+            for i in range(0, len(command)):
+                if split_text[i] != command[i]:
+                    matches = False
+            if matches:
+                return group, len(command)
+    return None, 0
+
+def new_front_end(parser, text):
+    """
+    This function runs the current parser front end on the given text.
+    """
+    parser.split_text = text.split()
+    parser.filter_ignored_words()
+    return Core.get_command_trie().match(parser.split_text)
+
+def main():
+    """
+    This function runs the benchmark for every command length.
+    """
+    game = Source.HeadlessGame(["benchmark", "-n", "--skip-delays"], lambda text: None)
+    player = game.find_entity(Core.get_res_man().get_string("core.player.name"))
+    parser = player.get_gameplay_parser()
+
+    for length in COMMAND_LENGTHS:
+        text = generate_command(length)
+        for label, function in [("old", lambda: old_front_end(text)),
+                                ("new", lambda: new_front_end(parser, text))]:
+            seconds = timeit.timeit(function, number=REPETITIONS)
+            label = str(length) + " words: " + label
+            print(label.ljust(32) + ("%.2f us" % (seconds / REPETITIONS * 1000000)).rjust(20))
+
+if __name__ == "__main__":
+    main()
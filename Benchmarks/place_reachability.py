@@ -0,0 +1,113 @@
+"""
+This script benchmarks the reachability checks of Place.check_transfer_as_parent on generated maps
+with 10k places, comparing the place graph to the breadth-first search it replaced.
+
+Run it from the root directory of the game: python Benchmarks/place_reachability.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from collections import deque
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from Source.EngineL import Core
+
+GRID_SIZE = 100
+GRAPH_CHECKS = 10000
+SEARCH_CHECKS = 5
+
+def generate_map(app, one_way):
+    """
+    This function creates a square grid of places in the given application and returns them. If
+    one_way is True, places are only connected to their eastern and southern neighbours, if not,
+    every connection goes both ways.
+    """
+    grid = []
+    for row in range(0, GRID_SIZE):
+        for column in range(0, GRID_SIZE):
+            place = Core.Place(app)
+            place.setObjectName("place " + str(row) + "/" + str(column))
+            grid.append(place)
+    for row in range(0, GRID_SIZE):
+        for column in range(0, GRID_SIZE):
+            place = grid[row * GRID_SIZE + column]
+            if column + 1 < GRID_SIZE:
+                place.connect_place(grid[row * GRID_SIZE + column + 1])
+                if not one_way:
+                    grid[row * GRID_SIZE + column + 1].connect_place(place)
+            if row + 1 < GRID_SIZE:
+                place.connect_place(grid[(row + 1) * GRID_SIZE + column])
+                if not one_way:
+                    grid[(row + 1) * GRID_SIZE + column].connect_place(place)
+    return grid
+
+def search(source, target):
+    """
+    This function is the breadth-first search Place.check_transfer_as_parent used to run, with a
+    list of checked places.
+    """
+    place_queue = deque()
+    place_queue.append(source)
+    checked_places = [source]
+    while len(place_queue) > 0:
+        for new_place in place_queue.popleft().get_connected_places():
+            if new_place == target:
+                return True
+            if new_place not in checked_places:
+                place_queue.append(new_place)
+                checked_places.append(new_place)
+    return False
+
+def report(label, seconds, checks):
+    """
+    This function prints the average time of one check in microseconds.
+    """
+    print(label.ljust(48) + ("%.3f us" % (seconds / checks * 1000000)).rjust(20))
+
+def run(app, one_way):
+    """
+    This function benchmarks one generated map.
+    """
+    grid = generate_map(app, one_way)
+    graph = app.get_place_graph()
+    kind = "one-way" if one_way else "two-way"
+
+    pairs = [(random.choice(grid), random.choice(grid)) for _ in range(0, GRAPH_CHECKS)]
+    seconds = timeit.timeit(lambda: graph.is_reachable(*pairs[0]), number=1)
+    report(kind + ": building the components", seconds, 1)
+    seconds = timeit.timeit(lambda: [graph.is_reachable(*pair) for pair in pairs], number=1)
+    report(kind + ": place graph", seconds, GRAPH_CHECKS)
+
+    seconds = timeit.timeit(lambda: [search(*pair) for pair in pairs[0:SEARCH_CHECKS]], number=1)
+    report(kind + ": breadth-first search", seconds, SEARCH_CHECKS)
+
+    for place in grid:
+        place.setParent(None)
+
+def main():
+    """
+    This function runs the benchmark on a two-way and a one-way map.
+    """
+    app = Core.SinglePlayerApp(sys.argv + ["-n"])
+    run(app, False)
+    app.place_graph = Core.PlaceGraph(app)
+    run(app, True)
+
+if __name__ == "__main__":
+    main()
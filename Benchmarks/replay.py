@@ -0,0 +1,96 @@
+"""
+This script replays a file of commands, one per line, through the gameplay parser of a headless
+game and reports the latency of the commands and the throughput. Scene delays are skipped. While a
+scene offers options, a line with the number of an option chooses it. By default, it replays the
+walkthrough of the story in walkthrough.txt against the shipped world, which makes it a regression
+benchmark for the whole game.
+
+Run it from the root directory of the game:
+python Benchmarks/replay.py [commands] [--save path] [--transcript path]
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Source
+
+WALKTHROUGH_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "walkthrough.txt")
+PERCENTILES = [50, 90, 99, 100]
+
+def percentile(sorted_values, percent):
+    """
+    This function returns the given percentile of the sorted values, using the nearest rank.
+    """
+    rank = max(1, -(-percent * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+def replay(window, commands):
+    """
+    This function enters the given commands into the given headless window and returns the time
+    every command took, in seconds. If a command can't be entered, it raises a RuntimeError.
+    """
+    latencies = []
+    for number, command in enumerate(commands):
+        options = window.get_option_texts()
+        start = time.perf_counter()
+        if len(options) > 0 and command.isdigit() and 0 < int(command) <= len(options):
+            window.choose_option(int(command) - 1)
+        elif not window.enter_command(command):
+            raise RuntimeError("Line " + str(number + 1) + " can't be entered: " + command)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def main():
+    """
+    This function parses the arguments, runs the replay and prints the report.
+    """
+    parser = argparse.ArgumentParser(description="Replays commands through a headless game.")
+    parser.add_argument("commands", nargs="?", default=WALKTHROUGH_PATH,
+                        help="file with one command per line")
+    parser.add_argument("--save", default="Resources/world.xml",
+                        help="save or world file to start from")
+    parser.add_argument("--transcript", help="file to write the game's output to")
+    arguments = parser.parse_args()
+
+    with open(arguments.commands, encoding="UTF-8") as command_file:
+        commands = [line.strip() for line in command_file if len(line.strip()) > 0]
+
+    output = []
+    start = time.perf_counter()
+    game = Source.HeadlessGame(["replay", "-n", "--skip-delays"], output.append, arguments.save)
+    startup = time.perf_counter() - start
+
+    latencies = replay(game.get_player_window(), commands)
+    total = sum(latencies)
+
+    if arguments.transcript is not None:
+        with open(arguments.transcript, "w", encoding="UTF-8") as transcript_file:
+            transcript_file.write("\n".join(output) + "\n")
+
+    print("startup".ljust(24) + ("%.3f ms" % (startup * 1000)).rjust(16))
+    print("commands".ljust(24) + str(len(latencies)).rjust(16))
+    print("commands per second".ljust(24) + ("%.0f" % (len(latencies) / total)).rjust(16))
+    sorted_latencies = sorted(latencies)
+    for percent in PERCENTILES:
+        label = "p" + str(percent) + " latency"
+        value = percentile(sorted_latencies, percent) * 1000000
+        print(label.ljust(24) + ("%.1f us" % value).rjust(16))
+
+if __name__ == "__main__":
+    main()
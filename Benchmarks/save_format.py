@@ -0,0 +1,101 @@
+"""
+This script compares the XML and the binary save format. It takes a snapshot of the shipped world,
+to which a generated place with 10k entities is added, and reports the size of both formats and
+the time it takes to write and to read them. It also checks that the binary format reads back the
+exact snapshot that was written.
+
+Run it from the root directory of the game: python Benchmarks/save_format.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import io
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import Source
+from Source.EngineL import Core
+
+ENTITIES = 10000
+REPEATS = 5
+
+def report(label, seconds, size=None):
+    """
+    This function prints the given time in milliseconds and, if it is given, the size in bytes.
+    """
+    line = label.ljust(32) + ("%.3f ms" % (seconds * 1000)).rjust(14)
+    if size is not None:
+        line += (str(size) + " bytes").rjust(16)
+    print(line)
+
+def write_xml(tree):
+    """
+    This function returns the given snapshot in the XML format.
+    """
+    save_file = io.BytesIO()
+    tree.write(save_file, encoding="UTF-16", xml_declaration=True)
+    return save_file.getvalue()
+
+def write_binary(tree, class_names):
+    """
+    This function returns the given snapshot in the binary format.
+    """
+    save_file = io.BytesIO()
+    Core.write_binary_save(tree, save_file, class_names)
+    return save_file.getvalue()
+
+def main():
+    """
+    This function runs the benchmark and returns the exit code.
+    """
+    app = Source.HeadlessGame([sys.argv[0], "-n", "--skip-delays"])
+    place = Core.Place(app)
+    place.setObjectName("Lager")
+    for index in range(0, ENTITIES):
+        entity = Core.StaticEntity(place)
+        entity.setObjectName("Kiste " + str(index))
+        entity.description = "${game.places.hut.sofa.description}"
+        entity.gender = random.choice("fmn")
+        entity.set_state("opened", random.randint(0, 3))
+
+    class_names = app.get_entity_class_names()
+    report("taking the snapshot", timeit.timeit(app.take_snapshot, number=REPEATS) / REPEATS)
+    tree = app.take_snapshot()
+
+    xml_data = write_xml(tree)
+    binary_data = write_binary(tree, class_names)
+    seconds = timeit.timeit(lambda: write_xml(tree), number=REPEATS) / REPEATS
+    report("writing XML", seconds, len(xml_data))
+    seconds = timeit.timeit(lambda: write_binary(tree, class_names), number=REPEATS) / REPEATS
+    report("writing binary", seconds, len(binary_data))
+
+    seconds = timeit.timeit(lambda: Core.ElementTree.parse(io.BytesIO(xml_data)),
+                            number=REPEATS) / REPEATS
+    report("reading XML", seconds)
+    seconds = timeit.timeit(lambda: Core.read_binary_save(io.BytesIO(binary_data)),
+                            number=REPEATS) / REPEATS
+    report("reading binary", seconds)
+
+    read_tree = Core.read_binary_save(io.BytesIO(binary_data))
+    if write_xml(read_tree) != xml_data:
+        print("The binary save did not read back the snapshot that was written!")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
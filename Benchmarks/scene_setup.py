@@ -0,0 +1,195 @@
+"""
+This script measures what it costs to start the scenes of the game. For every scene file, it
+reports the time it takes to read and compile it when it isn't cached yet, or to take it from a
+scene bundle instead, and the time it takes to set up and play a scene once it's program is cached,
+with the delays skipped. At last, it compiles a generated dialogue tree and compares the cost of
+setting it up with the cost of taking a single path through it, since the branches are only
+compiled when they are taken. In between, it reports how long a scene blocks the game when it's
+played right after the player entered a place, with and without the scenes around the place being
+prefetched.
+
+Run it from the root directory of the game: python Benchmarks/scene_setup.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import Source
+from Source.EngineL import Core, Scene
+
+REPEATS = 200
+TREE_OPTIONS = 4
+TREE_DEPTH = 6
+
+def report(label, seconds):
+    """
+    This function prints the given time in microseconds.
+    """
+    print(label.ljust(32) + ("%.1f us" % (seconds * 1000000)).rjust(14))
+
+def load_all(cache, scene_names):
+    """
+    This function gets the given scenes from the given cache without using cached programs, so
+    they are either compiled or taken from the cache's bundle.
+    """
+    for scene_name in scene_names:
+        cache.clear()
+        cache.get_program(scene_name)
+
+def measure_bundle(scene_names):
+    """
+    This function measures compiling the given scenes and taking them from a scene bundle.
+    """
+    cache = Scene.SceneProgramCache(bundle_path=None)
+    seconds = timeit.timeit(lambda: load_all(cache, scene_names), number=REPEATS)
+    report("compiling a scene", seconds / REPEATS / len(scene_names))
+
+    with tempfile.TemporaryDirectory() as directory:
+        bundle_path = os.path.join(directory, "scenes.bundle")
+        entries = dict()
+        for scene_name in scene_names:
+            scene_path = cache.get_scene_path(scene_name)
+            with open(scene_path, "rb") as scene_file:
+                source = scene_file.read()
+            entries[scene_name] = Scene.build_bundle_entry(source, os.stat(scene_path),
+                                                           Scene.SceneProgram(source))
+        Scene.write_scene_bundle(bundle_path, entries)
+        cache = Scene.SceneProgramCache(bundle_path=bundle_path)
+        seconds = timeit.timeit(lambda: load_all(cache, scene_names), number=REPEATS)
+        report("loading a bundled scene", seconds / REPEATS / len(scene_names))
+
+def measure_prefetching(app):
+    """
+    This function measures how long getting the programs of the scenes around every place takes
+    after the player entered it, when they are compiled on demand and when they were prefetched.
+    """
+    cache = Scene.get_program_cache()
+    prefetcher = Scene.get_prefetcher()
+    places = app.findChildren(Core.Place)
+    scene_names = [[scene_name for entity in [place] + place.findChildren(Core.Entity)
+                    for scene_name in entity.get_scene_names()] for place in places]
+    scene_count = sum(len(names) for names in scene_names)
+
+    def enter_all(prefetch):
+        seconds = 0.0
+        for place, names in zip(places, scene_names):
+            cache.clear()
+            if prefetch:
+                prefetcher.prefetch_around(place)
+                prefetcher.wait()
+            seconds += timeit.timeit(lambda: [cache.get_program(name) for name in names],
+                                     number=1)
+        return seconds
+    seconds = sum(enter_all(False) for _ in range(0, REPEATS))
+    report("getting a scene on demand", seconds / REPEATS / scene_count)
+    seconds = sum(enter_all(True) for _ in range(0, REPEATS))
+    report("getting a prefetched scene", seconds / REPEATS / scene_count)
+
+def write_dialogue_tree(save_file, depth):
+    """
+    This function writes the elements of a generated dialogue to the given text file, in which
+    every choice has TREE_OPTIONS options and the dialogue goes on for the given depth.
+    """
+    save_file.write("<text>Frage " + str(depth) + "</text><delay time=\"1000\" /><choice>")
+    for index in range(0, TREE_OPTIONS):
+        save_file.write("<option text=\"Antwort " + str(index) + "\"><text>Antwort</text>")
+        if depth > 1:
+            write_dialogue_tree(save_file, depth - 1)
+        save_file.write("</option>")
+    save_file.write("</choice>")
+
+def take_first_path(program):
+    """
+    This function compiles the blocks a playback of the given program needs when it always
+    chooses the first option and returns the number of blocks it took.
+    """
+    block = program.get_block(0)
+    blocks_taken = 1
+    while True:
+        choices = [branches for code, _, branches in block if code == "choice"]
+        if len(choices) == 0:
+            return blocks_taken
+        block = program.get_block(choices[0][0])
+        blocks_taken += 1
+
+def measure_dialogue_tree():
+    """
+    This function measures setting up a generated dialogue tree and taking a path through it.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "Tree.xml"), "w", encoding="UTF-8") as scene_file:
+            scene_file.write("<scene>")
+            write_dialogue_tree(scene_file, TREE_DEPTH)
+            scene_file.write("</scene>")
+        cache = Scene.SceneProgramCache(directory, bundle_path=None)
+
+        def set_up():
+            cache.clear()
+            return cache.get_program("Tree")
+        report("setting up a dialogue tree", timeit.timeit(set_up, number=REPEATS) / REPEATS)
+        seconds = timeit.timeit(lambda: take_first_path(set_up()), number=REPEATS) / REPEATS
+        report("... and taking one path", seconds)
+
+        tracemalloc.start()
+        program = set_up()
+        size_after_set_up = tracemalloc.get_traced_memory()[0]
+        take_first_path(program)
+        size_after_path = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("compiled " + str(program.get_compiled_block_count()) + " of "
+              + str(program.get_block_count()) + " blocks, " + str(size_after_set_up // 1024)
+              + " KiB after setting up, " + str(size_after_path // 1024)
+              + " KiB after taking one path")
+
+def main():
+    """
+    This function runs the benchmark and returns the exit code.
+    """
+    app = Source.HeadlessGame([sys.argv[0], "-n", "--skip-delays"], lambda text: None)
+    player = app.find_entity(app.get_res_man().get_string("core.player.name"))
+    scene_names = Scene.list_scene_names()
+    measure_bundle(scene_names)
+
+    def set_up_all():
+        for scene_name in scene_names:
+            Scene.XMLScene(scene_name, player).setParent(None)
+    seconds = timeit.timeit(set_up_all, number=REPEATS)
+    report("setting up a cached scene", seconds / REPEATS / len(scene_names))
+
+    # Scenes that change the world can only be played once, so only the others are played.
+    cache = Scene.get_program_cache()
+    played_names = [scene_name for scene_name in scene_names
+                    if all(code in ("clearCommandRow", "showCommandLine", "text", "delay")
+                           for code, _, _ in cache.get_program(scene_name).get_block(0))]
+    def play_all():
+        for scene_name in played_names:
+            Scene.XMLScene(scene_name, player).play()
+    seconds = timeit.timeit(play_all, number=REPEATS)
+    report("playing a cached scene", seconds / REPEATS / len(played_names))
+    measure_prefetching(app)
+    measure_dialogue_tree()
+
+    # Skip the teardown of the world, which isn't measured.
+    sys.stdout.flush()
+    os._exit(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+This script benchmarks the key lookups of the StringResourceManager against generated string tables
+of growing size. The cost of a lookup should stay flat, no matter how many keys there are.
+
+Run it from the root directory of the game: python Benchmarks/string_lookup.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import random
+import sys
+import tempfile
+import timeit
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Source.EngineL.Core import StringResourceManager
+
+SIZES = [100, 1000, 10000, 50000]
+LOOKUPS = 20000
+
+def generate_strings(path, size):
+    """
+    This function writes a strings file with the given number of keys to the given path and
+    returns a list of all keys. The keys are spread over three levels, like in the real strings.xml.
+    """
+    root = ElementTree.Element("strings")
+    keys = []
+    groups = max(1, int(size ** (1 / 3)))
+    for index in range(0, size):
+        group = "group" + str(index % groups)
+        section = "section" + str((index // groups) % groups)
+        group_element = root.find(group)
+        if group_element is None:
+            group_element = ElementTree.SubElement(root, group)
+        section_element = group_element.find(section)
+        if section_element is None:
+            section_element = ElementTree.SubElement(group_element, section)
+        string_element = ElementTree.SubElement(section_element, "string" + str(index))
+        string_element.text = "Text number " + str(index)
+        if index % 2 == 0:
+            string_element.attrib["bold"] = "True"
+        keys.append(group + "." + section + ".string" + str(index))
+    ElementTree.ElementTree(root).write(path, encoding="UTF-16", xml_declaration=True)
+    return keys
+
+def walk_lookup(tree, key):
+    """
+    This function looks a key up the way the StringResourceManager did before it had it's index,
+    by calling find once per level.
+    """
+    current_element = tree.getroot()
+    for tag in key.split("."):
+        current_element = current_element.find(tag)
+    return current_element.text
+
+def main():
+    """
+    This function runs the benchmark and prints one line per table size.
+    """
+    print("keys".rjust(8) + "indexed (us)".rjust(16) + "walked (us)".rjust(16))
+    with tempfile.TemporaryDirectory() as directory:
+        for size in SIZES:
+            path = os.path.join(directory, "strings" + str(size) + ".xml")
+            keys = generate_strings(path, size)
+            res_man = StringResourceManager(None, path)
+            sample = [random.choice(keys) for _ in range(0, LOOKUPS)]
+
+            indexed = timeit.timeit(lambda: [res_man.get_string(key, False) for key in sample],
+                                    number=1)
+            walked = timeit.timeit(lambda: [walk_lookup(res_man.get_tree(), key) for key in sample],
+                                   number=1)
+
+            indexed = indexed / LOOKUPS * 1000000
+            walked = walked / LOOKUPS * 1000000
+            print(str(size).rjust(8) + ("%.3f" % indexed).rjust(16) + ("%.3f" % walked).rjust(16))
+
+if __name__ == "__main__":
+    main()
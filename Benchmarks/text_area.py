@@ -0,0 +1,78 @@
+"""
+This script measures what it costs to show text in the window of the game during a long session.
+It shows many paragraphs, a batch of them per turn of the event loop like a scene or a command
+would, and reports the time per paragraph, the number of edits of the text area's document and the
+number of paragraphs that are kept, with the default scrollback limit and without one.
+
+Run it from the root directory of the game: python Benchmarks/text_area.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import Source
+from Source.EngineL import Core
+
+PARAGRAPHS = 20000
+BATCH_SIZE = 20
+
+def report(label, seconds, edits, blocks):
+    """
+    This function prints the given time in microseconds, the number of edits and of blocks.
+    """
+    print(label.ljust(32) + ("%.1f us" % (seconds * 1000000)).rjust(14)
+          + (str(edits) + " edits").rjust(14) + (str(blocks) + " blocks").rjust(14))
+
+def show_paragraphs(app, window, scrollback_limit):
+    """
+    This function shows PARAGRAPHS paragraphs in the given window, with the given scrollback
+    limit, and reports the cost.
+    """
+    window.set_scrollback_limit(scrollback_limit)
+    document = window.get_text_area().document()
+    document.clear()
+    edits = []
+    document.contentsChange.connect(lambda *arguments: edits.append(arguments))
+
+    start = time.perf_counter()
+    for index in range(0, PARAGRAPHS):
+        window.show_text("${core.player.beginning} Absatz " + str(index))
+        if index % BATCH_SIZE == BATCH_SIZE - 1:
+            window.show_command("sieh Ort")
+            app.processEvents()
+    app.processEvents()
+    seconds = (time.perf_counter() - start) / PARAGRAPHS
+    document.contentsChange.disconnect()
+    report("limit " + str(scrollback_limit), seconds, len(edits), document.blockCount())
+
+def main():
+    """
+    This function runs the benchmark and returns the exit code.
+    """
+    app = Source.Game([sys.argv[0], "-n", "--skip-delays"])
+    window = app.find_entity(app.get_res_man().get_string("core.player.name")).get_window()
+    show_paragraphs(app, window, Core.SCROLLBACK_LIMIT)
+    show_paragraphs(app, window, 0)
+
+    # Skip the teardown of the world, which isn't measured.
+    sys.stdout.flush()
+    os._exit(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
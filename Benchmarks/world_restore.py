@@ -0,0 +1,105 @@
+"""
+This script benchmarks how the world is restored from generated world files with 10k, 50k and 100k
+entities. Every world consists of places with 100 entities each, some of which contain another
+entity, and every place is connected to the next and the previous one. It reports the time it
+takes to restore the world and to build the connections and how much the peak memory of the
+process grew, both of which should grow linearly with the size of the world. Every world is
+restored in a new process in a temporary directory, since a process can only hold one game.
+
+Run it from the root directory of the game: python Benchmarks/world_restore.py
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import Source
+from Source.EngineL import Core
+
+WORLD_SIZES = [10000, 50000, 100000]
+PLACE_SIZE = 100
+
+def generate_world(directory, entities):
+    """
+    This function writes a generated world file with the given number of entities and the string
+    resources into the Resources directory of the given directory.
+    """
+    resources_path = os.path.join(directory, "Resources")
+    os.mkdir(resources_path)
+    shutil.copy(os.path.join(ROOT_PATH, "Resources", "strings.xml"), resources_path)
+    root = Core.ElementTree.Element("world")
+    places = entities // PLACE_SIZE
+    for place_index in range(0, places):
+        place = Core.ElementTree.SubElement(root, "Place", {"name": "Ort " + str(place_index)})
+        children = Core.ElementTree.SubElement(place, "children")
+        for index in range(0, PLACE_SIZE - 1, 2):
+            name = "Kiste " + str(place_index) + "." + str(index)
+            entity = Core.ElementTree.SubElement(children, "StaticEntity", {"name": name,
+                                                                            "gender": "f"})
+            Core.ElementTree.SubElement(entity, "state", {"key": "opened", "value": "0"})
+            entity_children = Core.ElementTree.SubElement(entity, "children")
+            Core.ElementTree.SubElement(entity_children, "Entity", {"name": name + " Inhalt"})
+        for offset in (places - 1, 1):
+            name = "Ort " + str((place_index + offset) % places)
+            Core.ElementTree.SubElement(place, "connection", {"name": name})
+    Core.ElementTree.ElementTree(root).write(os.path.join(directory, Core.WORLD_PATH),
+                                             encoding="UTF-8", xml_declaration=True)
+
+def run_restore():
+    """
+    This function restores the world in the current directory and prints the time it took in
+    seconds and by how many kilobytes the peak memory of the process grew.
+    """
+    app = Core.HeadlessApp([sys.argv[0], "-n"])
+    Source.register_entity_classes(app)
+    start_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.perf_counter()
+    app.restore_world()
+    app.connect_places()
+    restore_time = time.perf_counter() - start_time
+    print(restore_time, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_memory)
+    # The interpreter would spend a lot of time tearing down the entities.
+    sys.stdout.flush()
+    os._exit(0)
+
+def main():
+    """
+    This function runs the benchmark.
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_restore()
+        return
+    for entities in WORLD_SIZES:
+        with tempfile.TemporaryDirectory() as directory:
+            generate_world(directory, entities)
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                              "--child"], cwd=directory)
+        restore_time, memory = output.split()[-2:]
+        restore_time = float(restore_time)
+        print((str(entities) + " entities").ljust(20)
+              + ("%.2f s" % restore_time).rjust(12)
+              + ("%.1f us per entity" % (restore_time / entities * 1000000)).rjust(24)
+              + ("%.1f MB peak memory" % (int(memory) / 1024)).rjust(24))
+
+if __name__ == "__main__":
+    main()
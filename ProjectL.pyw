@@ -15,9 +15,62 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import re
+import sys
+import time
 import Source
 
+HTML_TAG_PATTERN = re.compile(r"<[^>]*>")
+
+def run_headless(argv):
+    """
+    This function runs the game without widgets. It reads commands from stdin, one per line, and
+    prints everything the game shows to stdout. While a scene offers options, a line with the
+    number of an option chooses it.
+    """
+    from PyQt5.QtCore import QEventLoop
+
+    game = Source.HeadlessGame(argv, lambda text: print(HTML_TAG_PATTERN.sub("", text).strip()))
+    window = game.get_player_window()
+
+    def wait_for_input():
+        while window.is_busy():
+            game.processEvents(QEventLoop.WaitForMoreEvents)
+        # This lets the game autosave between commands.
+        game.processEvents()
+        for number, text in enumerate(window.get_option_texts()):
+            print("[" + str(number + 1) + "] " + text)
+
+    wait_for_input()
+    for line in sys.stdin:
+        line = line.strip()
+        if len(window.get_option_texts()) > 0:
+            if line.isdigit() and 0 < int(line) <= len(window.get_option_texts()):
+                window.choose_option(int(line) - 1)
+        else:
+            window.enter_command(line)
+        wait_for_input()
+
+    game.save_world()
+    return 0
+
+def list_slots():
+    """
+    This function prints the name, the current place, the play time and the time of the last save
+    of every save slot, the newest one first. Only the headers of the saves are read.
+    """
+    for slot_name, header in Source.EngineL.Core.list_save_slots():
+        play_time = int(header.get("playTime", 0))
+        saved_time = time.localtime(int(header.get("timestamp", 0)))
+        print(slot_name + "\t" + header.get("place", str()) + "\t"
+              + "{}:{:02}:{:02}".format(play_time // 3600, play_time // 60 % 60, play_time % 60)
+              + "\t" + time.strftime("%Y-%m-%d %H:%M", saved_time))
+    return 0
+
 if __name__ == "__main__":
-    import sys
+    if "--list-slots" in sys.argv:
+        sys.exit(list_slots())
+    if "--headless" in sys.argv:
+        sys.exit(run_headless(sys.argv))
     GAME_INSTANCE = Source.Game(sys.argv)
     sys.exit(GAME_INSTANCE.exec_())
@@ -17,30 +17,172 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from collections import deque
+from collections import Counter, deque, OrderedDict
+import functools
+import hashlib
+import itertools
+import json
+import marshal
+import os
 import os.path
+import re
+import sys
+import threading
+import time
+import unicodedata
+import weakref
 from xml.etree import ElementTree
-from PyQt5.QtCore import QObject, Qt
+from PyQt5.QtCore import QObject, QCoreApplication, QEvent, Qt, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QApplication, QErrorMessage
 
+TEMPLATE_PATTERN = re.compile(r"\$\{([^}]*)\}")
+TEMPLATE_CACHE_SIZE = 1024
+STRING_CACHE_VERSION = (2,) + tuple(sys.version_info[:2])
+UMLAUT_TABLE = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue"})
+ARTICLE_KEY_PREFIXES = ("core.grammar.definiteArticle.", "core.grammar.indefiniteArticle.")
+FUZZY_MAX_DISTANCE = 2
+NGRAM_SIZE = 3
+SAVE_PATH = "Resources/save.xml"
+WORLD_PATH = "Resources/world.xml"
+JOURNAL_PATH = "Resources/save.journal"
+AUTOSAVE_INTERVAL = 60000
+AUTOSAVE_CHANGE_THRESHOLD = 1000
+BINARY_SAVE_PATH = "Resources/save.bin"
+BINARY_SAVE_MAGIC = b"PLSAVE"
+BINARY_SAVE_VERSION = 2
+BINARY_HEADER_READ_SIZE = 4096
+SAVES_DIRECTORY = "Resources/Saves"
+SAVE_FORMAT_VERSION = 1
+SLOT_NAME_PATTERN = re.compile(r"[\w\- ]+\Z")
+BINARY_VALUE_STRING = 0
+BINARY_VALUE_INTEGER = 1
+BINARY_VALUE_TRUE = 2
+BINARY_VALUE_FALSE = 3
+INTEGER_PATTERN = re.compile(r"-?[0-9]+\Z")
+MULTI_BYTE_VARINT_PATTERN = re.compile(b"[\\x80-\\xff]+[\\x00-\\x7f]")
+JOURNALED_ATTRIBUTES = frozenset(["description", "gender", "show_article", "use_definite_article"])
+SCENE_CLOCK_MODES = ("real", "scaled", "instant")
+SCROLLBACK_LIMIT = 5000
+ATTACH_ORDER = itertools.count()
+
 class StringResourceManager(QObject):
     """
     The StringResourceManager manages the strings used by the game. At startup, it loads them from
-    the resources file and is able to look them up all the time in many different ways.
+    the resources file and is able to look them up all the time in many different ways. Whenever
+    the string tables were (re)loaded, it emits strings_loaded, so that everything that was built
+    from them can be rebuilt.
     """
 
-    def __init__(self, parent=None):
+    strings_loaded = pyqtSignal()
+
+    def __init__(self, parent=None, path="Resources/strings.xml"):
         QObject.__init__(self, parent)
 
+        self.path = path
+        self.cache_path = os.path.splitext(path)[0] + ".cache"
+        self.tree = None
+        self.elements = None
+        self.strings = dict()
+        self.lists = dict()
+        self.templates = OrderedDict()
+        self.articles = None
+        self.load()
+
+    def load(self):
+        """
+        This non-constant method (re)loads the string tables and rebuilds the flat key index, so
+        that every later lookup is a single dictionary access. If the precompiled cache file next to
+        our resources file is still valid, the table is read from it and the XML file isn't parsed
+        at all. If not, the XML file is parsed and the cache is rebuilt. If the resources file could
+        not be read, the game will crash.
+        """
+        self.tree = None
+        self.elements = None
+        self.templates.clear()
+        self.articles = None
+
         try:
-            self.tree = ElementTree.parse("Resources/strings.xml")
-        except (FileNotFoundError, ElementTree.ParseError) as exception:
-            parent.crash(str(exception))
+            source_stat = os.stat(self.path)
+        except OSError as exception:
+            self.parent().crash(str(exception))
+        cache = self.read_cache()
+
+        if cache is not None and cache["mtime"] == source_stat.st_mtime_ns\
+        and cache["size"] == source_stat.st_size:
+            self.strings = cache["strings"]
+            self.lists = cache["lists"]
+            self.strings_loaded.emit()
+            return
+
+        try:
+            with open(self.path, "rb") as source_file:
+                source = source_file.read()
+        except OSError as exception:
+            self.parent().crash(str(exception))
+        digest = hashlib.sha1(source).hexdigest()
+
+        if cache is not None and cache["hash"] == digest:
+            self.strings = cache["strings"]
+            self.lists = cache["lists"]
+        else:
+            try:
+                self.tree = ElementTree.ElementTree(ElementTree.fromstring(source))
+            except ElementTree.ParseError as exception:
+                self.parent().crash(str(exception))
+            self.elements, self.strings, self.lists = build_string_index(self.tree.getroot())
+        self.write_cache(source_stat, digest)
+        self.strings_loaded.emit()
+
+    def read_cache(self):
+        """
+        This constant method reads our precompiled cache file in one go and returns it's content as
+        a dictionary, or None if it does not exist, is broken or was written by another version.
+        """
+        try:
+            with open(self.cache_path, "rb") as cache_file:
+                cache = marshal.loads(cache_file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(cache, dict) or cache.get("version") != STRING_CACHE_VERSION:
+            return None
+        return cache
+
+    def write_cache(self, source_stat, digest):
+        """
+        This constant method writes our flat string and list tables, together with the modification
+        time, size and hash of the resources file it was built from, to our cache file. The file is
+        replaced atomically, so other game processes never read a half-written cache. If the cache
+        could not be written, nothing happens since it is only an optimization.
+        """
+        cache = {
+            "version": STRING_CACHE_VERSION,
+            "mtime": source_stat.st_mtime_ns,
+            "size": source_stat.st_size,
+            "hash": digest,
+            "strings": self.strings,
+            "lists": self.lists
+        }
+        temp_path = self.cache_path + "." + str(os.getpid())
+        try:
+            with open(temp_path, "wb") as cache_file:
+                cache_file.write(marshal.dumps(cache))
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
 
     def get_tree(self):
         """
-        This constant method returns the file tree.
+        This constant method returns the file tree. If the string tables were loaded from the
+        cache, the file is parsed now.
         """
+        if self.tree is None:
+            try:
+                self.tree = ElementTree.parse(self.path)
+            except (FileNotFoundError, ElementTree.ParseError) as exception:
+                QApplication.instance().crash(str(exception))
         return self.tree
 
     def get_element(self, key):
@@ -49,16 +191,12 @@ class StringResourceManager(QObject):
         like "key.to.string". If the requested element could not be found, it crashes the game since
         this is a fatal error.
         """
-        split_path = key.split(".")
-        index = 0
-        current_element = self.tree.getroot()
-        while index < len(split_path):
-            new_element = current_element.find(split_path[index])
-            if new_element is None:
-                QApplication.instance().crash("Could not find a resource string with the key " +key)
-            current_element = new_element
-            index += 1
-        return current_element
+        if self.elements is None:
+            self.elements = build_string_index(self.get_tree().getroot())[0]
+        element = self.elements.get(key)
+        if element is None:
+            QApplication.instance().crash("Could not find a resource string with the key " + key)
+        return element
 
     def get_string(self, key, pure_text=True):
         """
@@ -67,49 +205,328 @@ class StringResourceManager(QObject):
         will add <b>-tags if the string has the attribute "bold":"True".
         If the requested string could not be found, the game will crash.
         """
-        try:
-            element = self.get_element(key)
-        except LookupError as err:
-            raise err
-        text = element.text
-        if (not pure_text) and ("bold" in element.attrib):
-            if bool(element.attrib["bold"]):
-                text = "<b>" + text + "</b>"
+        entry = self.strings.get(key)
+        if entry is None:
+            QApplication.instance().crash("Could not find a resource string with the key " + key)
+        text, bold = entry
+        if (not pure_text) and bold:
+            text = "<b>" + text + "</b>"
         return text
 
+    def get_string_list(self, key):
+        """
+        This constant method returns the list of the texts of all strings with the given key, which
+        are siblings with the same tag, like the verbs of a command group. If the requested string
+        could not be found, the game will crash.
+        """
+        texts = self.lists.get(key)
+        if texts is None:
+            return [self.get_string(key)]
+        return texts
+
+    def has_string(self, key):
+        """
+        This constant method returns whether there is a string with the given key.
+        """
+        return key in self.strings
+
+    def get_articles(self):
+        """
+        This constant method returns the set of all articles, folded with fold_word, which are
+        ignored at the beginning of entity names the player entered.
+        """
+        if self.articles is None:
+            self.articles = frozenset(fold_word(text) for key, (text, _) in self.strings.items()
+                                      if key.startswith(ARTICLE_KEY_PREFIXES) and text is not None)
+        return self.articles
+
     def decode_string(self, string, pure_text=False):
         """
         This constant method takes the given string, replaces every resource string key with it's
         representation and returns the result. If the given string contains a key that doesn't
         exist, the game will crash.
+
+        Every template is compiled only once and kept in a bounded LRU cache, which is dropped
+        whenever the string tables are reloaded.
         """
-        complete_text = string
-        continue_searching = True
-        while continue_searching:
-            res_string_begin = complete_text.find("${")
-            res_string_end = complete_text.find("}")
+        if "${" not in string:
+            return string
 
-            if res_string_begin != -1 and res_string_end != -1:
-                key = complete_text[res_string_begin+2:res_string_end]
-                try:
-                    middle_part = self.get_string(key, pure_text)
-                except LookupError as err:
-                    raise err
+        cache_key = (string, pure_text)
+        segments = self.templates.get(cache_key)
+        if segments is None:
+            segments = self.compile_template(string, pure_text)
+            self.templates[cache_key] = segments
+            if len(self.templates) > TEMPLATE_CACHE_SIZE:
+                self.templates.popitem(last=False)
+        else:
+            self.templates.move_to_end(cache_key)
+        return "".join(segments)
+
+    def compile_template(self, string, pure_text=False):
+        """
+        This constant method splits the given string into it's literal parts and resource string
+        keys in a single pass and returns them as a tuple of segments, with every key already
+        replaced by it's representation. If a representation contains keys itself, they are
+        decoded too. If the given string contains a key that doesn't exist, the game will crash.
+        """
+        segments = []
+        position = 0
+        for match in TEMPLATE_PATTERN.finditer(string):
+            segments.append(string[position:match.start()])
+            middle_part = self.get_string(match.group(1), pure_text)
+            if "${" in middle_part:
+                middle_part = self.decode_string(middle_part, pure_text)
+            segments.append(middle_part)
+            position = match.end()
+        segments.append(string[position:])
+        return tuple(segments)
+
+def build_string_index(root):
+    """
+    This function walks the given strings root element once and returns three flat dictionaries:
+    The first one maps every key like "key.to.string" to it's element and the second one maps it to
+    a (text, bold) tuple. Like ElementTree.find, only the first element with a given tag is
+    reachable this way if there are several siblings with the same tag, so the third one maps the
+    keys of such siblings to the list of all their texts, in their order.
+    """
+    elements = dict()
+    strings = dict()
+    lists = dict()
+    element_stack = [(str(), root)]
+    while len(element_stack) > 0:
+        prefix, parent_element = element_stack.pop()
+        for element in parent_element:
+            if not isinstance(element.tag, str):
+                continue
+            key = prefix + element.tag
+            if key in elements:
+                lists.setdefault(key, [strings[key][0]]).append(element.text)
+                continue
+            elements[key] = element
+            strings[key] = (element.text, bool(element.get("bold")))
+            element_stack.append((key + ".", element))
+    return elements, strings, lists
+
+def cached_description(method):
+    """
+    This decorator memoizes the text returned by a description generating method of an entity in
+    the entity's description cache, until the entity invalidates it. Cache hits and misses are
+    counted in Entity.description_cache_hits and Entity.description_cache_misses.
+    """
+    @functools.wraps(method)
+    def cached_method(self, *args, **kwargs):
+        cache_key = (method.__qualname__, args, tuple(sorted(kwargs.items())))
+        text = self.description_cache.get(cache_key)
+        if text is None:
+            Entity.description_cache_misses += 1
+            text = method(self, *args, **kwargs)
+            self.description_cache[cache_key] = text
+        else:
+            Entity.description_cache_hits += 1
+        return text
+    return cached_method
 
-                if res_string_begin > 0:
-                    first_part = complete_text[0:res_string_begin]
-                else:
-                    first_part = str()
+@functools.lru_cache(maxsize=4096)
+def fold_word(word):
+    """
+    This function returns the form of the given word that is used to compare words the player
+    entered: It is case folded, umlauts are replaced by their two-letter spellings and all other
+    accents are dropped. Since the same words are entered again and again, results are cached.
+    """
+    word = word.casefold().translate(UMLAUT_TABLE)
+    decomposed_word = unicodedata.normalize("NFKD", word)
+    if len(decomposed_word) != len(word):
+        word = "".join(char for char in decomposed_word if not unicodedata.combining(char))
+    return word
 
-                if res_string_end+1 < len(complete_text):
-                    last_part = complete_text[res_string_end+1:len(complete_text)]
-                else:
-                    last_part = str()
+def normalize_name(name):
+    """
+    This function returns the normalized form of the given name, which is used to resolve the names
+    the player entered: Every word is folded with fold_word and leading articles are removed.
+    """
+    words = [fold_word(word) for word in name.split()]
+    articles = get_res_man().get_articles()
+    while len(words) > 1 and words[0] in articles:
+        del words[0]
+    return " ".join(words)
 
-                complete_text = first_part + middle_part + last_part
-            else:
-                continue_searching = False
-        return complete_text
+def edit_distance(word_a, word_b, max_distance=None):
+    """
+    This function returns the Levenshtein distance of the two given strings, which is the number of
+    inserted, deleted or replaced characters needed to turn one into the other. If max_distance is
+    given and the distance is larger, it stops early and returns max_distance + 1.
+    """
+    if len(word_a) < len(word_b):
+        word_a, word_b = word_b, word_a
+    if max_distance is not None and len(word_a) - len(word_b) > max_distance:
+        return max_distance + 1
+    previous_row = list(range(0, len(word_b) + 1))
+    for index_a, char_a in enumerate(word_a):
+        current_row = [index_a + 1]
+        for index_b, char_b in enumerate(word_b):
+            current_row.append(min(previous_row[index_b + 1] + 1, current_row[index_b] + 1,
+                                   previous_row[index_b] + (char_a != char_b)))
+        if max_distance is not None and min(current_row) > max_distance:
+            return max_distance + 1
+        previous_row = current_row
+    return previous_row[-1]
+
+def get_ngrams(normalized_name):
+    """
+    This function returns the set of all n-grams of the given normalized name, including the ones
+    at it's beginning and end.
+    """
+    padded_name = "\x02" + normalized_name + "\x03"
+    return {padded_name[index:index + NGRAM_SIZE]
+            for index in range(0, len(padded_name) - NGRAM_SIZE + 1)}
+
+class NameResolver:
+    """
+    The NameResolver finds the names that were meant by a name the player entered. It maps the
+    normalized form of every name it knows to the names themselves, so that the case, umlauts and
+    leading articles don't matter. If no normalized name matches, it looks for the closest ones
+    within a small edit distance. Every edit changes at most NGRAM_SIZE of the n-grams of a name,
+    so a name within the distance shares all but a few n-grams with the entered name, and at least
+    one of any few of them. We keep an index from every n-gram to the normalized names that contain
+    it, take the candidates from the entries of the rarest n-grams of the entered name, drop those
+    that don't share enough n-grams and only compute the edit distance to the rest.
+    """
+
+    def __init__(self, names=()):
+        self.normalized_names = dict()
+        self.ngrams = dict()
+        self.ngram_index = dict()
+        for name in names:
+            self.add_name(name)
+
+    def add_name(self, name):
+        """
+        This non-constant method adds the given name.
+        """
+        normalized_name = normalize_name(name)
+        if normalized_name not in self.normalized_names:
+            self.normalized_names[normalized_name] = dict()
+            self.ngrams[normalized_name] = get_ngrams(normalized_name)
+            for ngram in self.ngrams[normalized_name]:
+                self.ngram_index.setdefault(ngram, set()).add(normalized_name)
+        self.normalized_names[normalized_name][name] = None
+
+    def remove_name(self, name):
+        """
+        This non-constant method removes the given name, if we know it.
+        """
+        normalized_name = normalize_name(name)
+        names = self.normalized_names.get(normalized_name)
+        if names is None:
+            return
+        names.pop(name, None)
+        if len(names) == 0:
+            del self.normalized_names[normalized_name]
+            for ngram in self.ngrams.pop(normalized_name):
+                indexed_names = self.ngram_index[ngram]
+                indexed_names.discard(normalized_name)
+                if len(indexed_names) == 0:
+                    del self.ngram_index[ngram]
+
+    def lookup(self, name):
+        """
+        This constant method returns a list of all names that may be meant by the given name. If
+        there are names with the same normalized form, only they are returned. If not, all names
+        whose normalized form is within the allowed edit distance are returned, the closest ones
+        first. Short names allow fewer edits, so that they don't match completely different ones.
+        """
+        normalized_name = normalize_name(name)
+        names = self.normalized_names.get(normalized_name)
+        if names is not None:
+            return list(names)
+
+        max_distance = min(FUZZY_MAX_DISTANCE, len(normalized_name) // 4)
+        if max_distance == 0:
+            return []
+        ngrams = get_ngrams(normalized_name)
+        rare_ngrams = sorted(ngrams, key=lambda ngram: len(self.ngram_index.get(ngram, ())))
+        candidates = set()
+        for ngram in rare_ngrams[0:max_distance * NGRAM_SIZE + 1]:
+            candidates.update(self.ngram_index.get(ngram, ()))
+
+        min_shared_ngrams = len(ngrams) - max_distance * NGRAM_SIZE
+        matches = []
+        for candidate in candidates:
+            if len(ngrams & self.ngrams[candidate]) < min_shared_ngrams:
+                continue
+            distance = edit_distance(normalized_name, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, candidate))
+        matches.sort()
+        return [name for _, candidate in matches for name in self.normalized_names[candidate]]
+
+def get_indexing_containers(container):
+    """
+    This generator yields the given container and all of it's ancestors that keep a name index of
+    their descendants, which are entities and the application.
+    """
+    while container is not None:
+        name_index = getattr(container, "name_index", None)
+        if name_index is None:
+            return
+        yield container
+        container = container.parent()
+
+def index_entities(container, entities):
+    """
+    This function adds the given (name, entity) pairs to the name indices of the given container
+    and all of it's indexing ancestors.
+    """
+    for indexing_container in get_indexing_containers(container):
+        name_index = indexing_container.name_index
+        name_resolver = getattr(indexing_container, "name_resolver", None)
+        for name, entity in entities:
+            if name_resolver is not None and name not in name_index:
+                name_resolver.add_name(name)
+            name_index.setdefault(name, dict())[entity] = None
+
+def unindex_entities(container, entities):
+    """
+    This function removes the given (name, entity) pairs from the name indices of the given
+    container and all of it's indexing ancestors.
+    """
+    for indexing_container in get_indexing_containers(container):
+        name_index = indexing_container.name_index
+        name_resolver = getattr(indexing_container, "name_resolver", None)
+        for name, entity in entities:
+            named_entities = name_index.get(name)
+            if named_entities is not None:
+                named_entities.pop(entity, None)
+                if len(named_entities) == 0:
+                    del name_index[name]
+                    if name_resolver is not None:
+                        name_resolver.remove_name(name)
+
+def find_indexed_entity(container, name, entity_class=None, recursive=True):
+    """
+    This function looks the entity with the given name up in the name index of the given container
+    and returns it, or None if there is no such entity. If entity_class is given, only instances of
+    it are found and if recursive is False, only direct children of the container are found. Like
+    QObject.findChild, direct children are preferred to deeper descendants.
+    """
+    named_entities = container.name_index.get(name)
+    if named_entities is None:
+        return None
+    if entity_class is None:
+        entity_class = Entity
+
+    found_entity = None
+    for entity in named_entities:
+        if isinstance(entity, entity_class):
+            if entity.parent() is container:
+                return entity
+            elif found_entity is None:
+                found_entity = entity
+    if recursive:
+        return found_entity
+    else:
+        return None
 
 def get_res_man():
     """
@@ -117,13 +534,63 @@ def get_res_man():
     """
     return QApplication.instance().get_res_man()
 
+def get_place_graph():
+    """
+    This constant method returns the current place graph.
+    """
+    return QApplication.instance().get_place_graph()
+
+def get_transfer_dispatcher():
+    """
+    This constant method returns the current transfer event dispatcher.
+    """
+    return QApplication.instance().get_transfer_dispatcher()
+
+def get_command_trie():
+    """
+    This constant method returns the current command trie.
+    """
+    return QApplication.instance().get_command_trie()
+
+def get_save_journal():
+    """
+    This constant method returns the current save journal.
+    """
+    return QApplication.instance().get_save_journal()
+
+def get_scene_clock():
+    """
+    This constant method returns the current scene clock.
+    """
+    return QApplication.instance().get_scene_clock()
+
 class Entity(QObject):
     """
     The Entity base class for all "things" inside the game.
+
+    The texts generated by generate_description and the listing methods are cached. The cache is
+    invalidated when children are added or removed, a state is changed using set_state, we or one
+    of our children are renamed or one of the attributes in LISTED_ATTRIBUTES is changed. If a
+    subclass' raw description depends on anything else, it has to call invalidate_description.
+
+    Every entity has an id that is unique in the game and stays the same in saves. All changes that
+    are saved, which are our creation, our parent, name, states and JOURNALED_ATTRIBUTES, are
+    written to the save journal as they happen.
     """
 
+    LISTED_ATTRIBUTES = frozenset(["description", "gender", "hidden", "show_article",
+                                   "use_definite_article"])
+
+    description_cache_hits = 0
+    description_cache_misses = 0
+
     def __init__(self, parent=None):
-        QObject.__init__(self, parent)
+        QObject.__init__(self)
+        self.entity_id = QApplication.instance().register_entity(self)
+        self.journal_change("spawn", self.__class__.__name__)
+        self.description_cache = dict()
+        self.name_index = dict()
+        self.name_resolver = None
         self.description = str()
         self.is_place = False
         self.states = dict()
@@ -132,6 +599,12 @@ class Entity(QObject):
         self.show_article = True
         self.use_definite_article = False
         self.activly_usable = False
+        self.attach_order = next(ATTACH_ORDER)
+
+        if parent is not None:
+            self.setParent(parent)
+
+        self.subscribe_transfer_events()
 
     def transfer(self, targeted_parent):
         """
@@ -160,6 +633,124 @@ class Entity(QObject):
             QApplication.instance().on_transfer(self, old_parent, targeted_parent)
         return transfer_okay
 
+    def __setattr__(self, name, value):
+        """
+        This overriden, non-constant method sets the attribute with the given name and invalidates
+        all cached descriptions that show it if it is one of our LISTED_ATTRIBUTES.
+        """
+        QObject.__setattr__(self, name, value)
+        if name in Entity.LISTED_ATTRIBUTES:
+            self.invalidate_description()
+            self.invalidate_listings()
+            if name in JOURNALED_ATTRIBUTES:
+                self.journal_change("attribute", name, value)
+
+    def journal_change(self, operation, *arguments):
+        """
+        This constant method writes a change of ours to the save journal.
+        """
+        get_save_journal().record(operation, self.entity_id, *arguments)
+
+    def setObjectName(self, name):
+        """
+        This overriden, non-constant method renames us, updates the name indices of our ancestors
+        and invalidates all cached descriptions that show our name.
+        """
+        unindex_entities(self.parent(), [(self.objectName(), self)])
+        QObject.setObjectName(self, name)
+        index_entities(self.parent(), [(self.objectName(), self)])
+        self.invalidate_description()
+        self.invalidate_listings()
+        self.journal_change("name", name)
+
+    def setParent(self, parent):
+        """
+        This overriden, non-constant method sets our parent and moves us and all of our descendants
+        from the name indices of our old ancestors to the ones of our new ancestors. Since Qt puts
+        us behind all other children of our new parent, we also take a new attach order, which
+        sorts like our position among our siblings.
+        """
+        subtree = self.get_indexed_subtree()
+        unindex_entities(self.parent(), subtree)
+        if parent is not self.parent():
+            self.attach_order = next(ATTACH_ORDER)
+        QObject.setParent(self, parent)
+        index_entities(parent, subtree)
+        if parent is None:
+            self.journal_change("parent", None)
+        else:
+            self.journal_change("parent", getattr(parent, "entity_id", 0))
+
+    def get_indexed_subtree(self):
+        """
+        This constant method returns a list of (name, entity) pairs for us and all of our
+        descendants.
+        """
+        subtree = [(self.objectName(), self)]
+        for name, named_entities in self.name_index.items():
+            for entity in named_entities:
+                subtree.append((name, entity))
+        return subtree
+
+    def find_entity(self, name, entity_class=None, recursive=True):
+        """
+        This constant method returns the descendant entity with the given name, or None if it
+        doesn't exist. If entity_class is given, only instances of it are found and if recursive is
+        False, only our direct children are found. Since we keep an index of our descendants' names,
+        this doesn't need to walk the tree.
+        """
+        return find_indexed_entity(self, name, entity_class, recursive)
+
+    def resolve_entity(self, name, entity_class=None, recursive=True):
+        """
+        This constant method works like find_entity, but it is meant for names the player entered:
+        If there is no entity with exactly the given name, it also finds entities whose name only
+        differs in case, umlauts or leading articles and, if there are none, the ones with the
+        closest similar name.
+        """
+        entity = find_indexed_entity(self, name, entity_class, recursive)
+        if entity is not None:
+            return entity
+        for known_name in self.get_name_resolver().lookup(name):
+            entity = find_indexed_entity(self, known_name, entity_class, recursive)
+            if entity is not None:
+                return entity
+        return None
+
+    def get_name_resolver(self):
+        """
+        This constant method returns the resolver for the names of our descendants, which is
+        created when it is first needed and then kept up to date with our name index.
+        """
+        if self.name_resolver is None:
+            self.name_resolver = NameResolver(self.name_index)
+        return self.name_resolver
+
+    def childEvent(self, event):
+        """
+        This overriden, non-constant method invalidates our cached descriptions whenever a child
+        was added to or removed from us, regardless of whether it was transfered or created with us
+        as it's parent.
+        """
+        if event.type() == QEvent.ChildAdded or event.type() == QEvent.ChildRemoved:
+            self.invalidate_description()
+        QObject.childEvent(self, event)
+
+    def invalidate_description(self):
+        """
+        This non-constant method drops all of our cached descriptions and listings.
+        """
+        self.description_cache.clear()
+
+    def invalidate_listings(self):
+        """
+        This non-constant method drops the cached descriptions of all entities that list us, which
+        is our parent.
+        """
+        parent = self.parent()
+        if isinstance(parent, Entity):
+            parent.invalidate_description()
+
     def check_transfer_as_subject(self, targeted_parent):
         """
         This semi-abstract, constant method which checks a planned transfer from the point-of-view
@@ -175,12 +766,12 @@ class Entity(QObject):
         if target is None:
             return True
         else:
-            if not subject in self.children():
+            if subject.parent() is not self:
                 return False
             parent = self
             while not parent.get_is_place():
                 parent = parent.parent()
-            return parent == target or parent.findChild(Entity, target.objectName()) is not None
+            return parent == target or parent.find_entity(target.objectName()) is not None
 
     def check_transfer_as_target(self, subject):
         """
@@ -189,14 +780,24 @@ class Entity(QObject):
         """
         return True
 
+    def subscribe_transfer_events(self):
+        """
+        This semi-abstract, non-constant method subscribes us to the transfer events we are
+        interested in and gets called when we are created. At default, we subscribe to every
+        transfer if our class overrides on_transfer and to none if not. Subclasses should override
+        this to subscribe to the subjects, subject classes, parents or targets they really care
+        about, since every transfer then only costs as much as there are interested entities.
+        """
+        if self.__class__.on_transfer is not Entity.on_transfer:
+            get_transfer_dispatcher().subscribe(self)
+
     def on_transfer(self, subject, parent, target):
         """
-        This semi-abstract method gets called when an entity in the game gets transfered from it's
-        parent to a target. At default, it calles on_transfer to our children.
+        This semi-abstract method gets called when an entity in the game, that we subscribed to,
+        gets transfered from it's parent to a target. At default, it passes the event on to all of
+        our descendants that are interested in it, before it is passed on to anyone else.
         """
-        for child in self.children():
-            if issubclass(child.__class__, Entity):
-                child.on_transfer(subject, parent, target)
+        get_transfer_dispatcher().dispatch_to_descendants(self, subject, parent, target)
 
     def on_game_launched(self):
         """
@@ -207,6 +808,13 @@ class Entity(QObject):
             if issubclass(child.__class__, Entity):
                 child.on_game_launched()
 
+    def get_scene_names(self):
+        """
+        This semi-abstract, constant method returns the names of the scenes we may play, so that
+        they can be read ahead of time while the player is close to us. At default, we play none.
+        """
+        return []
+
 
     def talk_to(self, target_name):
         """
@@ -221,10 +829,10 @@ class Entity(QObject):
                 return False
 
         target = None
-        if place.objectName() == target_name:
+        if normalize_name(place.objectName()) == normalize_name(target_name):
             target = place
         else:
-            target = place.findChild(Entity, target_name)
+            target = place.resolve_entity(target_name)
         if target is None:
             return False
 
@@ -266,6 +874,7 @@ class Entity(QObject):
         """
         return self.description
 
+    @cached_description
     def generate_description(self):
         """
         This constant method returns our description including our raw description and additional
@@ -277,6 +886,7 @@ class Entity(QObject):
         else:
             return self.get_raw_description()
 
+    @cached_description
     def generate_inventory_list(self, empty_note=False):
         """
         This constant method generates a list of our inventory (aka or children) for display
@@ -387,13 +997,14 @@ class Entity(QObject):
         """
         element = ElementTree.Element(self.__class__.__name__)
 
+        element.attrib["id"] = str(self.entity_id)
         element.attrib["name"] = self.objectName()
         element.attrib["description"] = self.description
         element.attrib["gender"] = self.gender
 
         article_element = ElementTree.SubElement(element, "article")
         article_element.attrib["shown"] = str(self.show_article)
-        article_element.attrib["used"] = str(self.use_definite_article)
+        article_element.attrib["definite"] = str(self.use_definite_article)
 
         for state in self.states.items():
             children_element = ElementTree.SubElement(element, "state")
@@ -414,6 +1025,13 @@ class Entity(QObject):
         some cases, it might raise a LookupError. If so, the object and it's children are in a valid
         state, but might be changed.
         """
+        try:
+            QApplication.instance().set_entity_id(self, int(element.attrib["id"]))
+        except KeyError:
+            pass
+        except ValueError:
+            raise LookupError("Invalid entity id!")
+
         try:
             o_name = get_res_man().decode_string(element.attrib["name"], True)
             self.setObjectName(o_name)
@@ -436,17 +1054,14 @@ class Entity(QObject):
         if article_element is not None:
             try:
                 o_show = article_element.attrib["shown"]
-                o_show = bool(o_show)
-                self.show_article = o_show
-            except (TypeError, KeyError):
+                self.show_article = o_show == "True"
+            except KeyError:
                 pass
 
-            try:
-                o_definite = article_element.attrib["definite"]
-                o_definite = bool(o_definite)
-                self.use_definite_article = o_definite
-            except (TypeError, KeyError):
-                pass
+            # Older saves called the definite attribute 'used'.
+            o_definite = article_element.get("definite", article_element.get("used"))
+            if o_definite is not None:
+                self.use_definite_article = o_definite == "True"
 
         for state_element in element.findall("state"):
             key = state_element.get("key")
@@ -479,6 +1094,8 @@ class Entity(QObject):
         """
         if isinstance(key, str) and isinstance(value, int):
             self.states[key] = value
+            self.invalidate_description()
+            self.journal_change("state", key, value)
 
     def remove_state(self, key):
         """
@@ -489,6 +1106,9 @@ class Entity(QObject):
             del self.states[key]
         except KeyError:
             pass
+        else:
+            self.invalidate_description()
+            self.journal_change("removeState", key)
 
     def get_states(self):
         """
@@ -525,6 +1145,7 @@ class Entity(QObject):
         This non-constant method sets our `is_hidden` flag: If it is True, we won't be listed in
         inventory or exit listings.
         """
+        self.hidden = is_hidden
 
     def get_gender(self):
         """
@@ -575,6 +1196,22 @@ class StaticEntity(Entity):
         else:
             return False
 
+def rename_key(table, old_key, new_key):
+    """
+    This function renames the given key of the given OrderedDict without moving it's entry. Only
+    the entries behind it are moved, the table itself is kept.
+    """
+    keys_behind = []
+    found = False
+    for key in table:
+        if found:
+            keys_behind.append(key)
+        elif key == old_key:
+            found = True
+    table[new_key] = table.pop(old_key)
+    for key in keys_behind:
+        table.move_to_end(key)
+
 class Place(Entity):
     """
     The base class for all places in the game.
@@ -583,33 +1220,25 @@ class Place(Entity):
     def __init__(self, parent=None):
         Entity.__init__(self, parent)
         self.is_place = True
-        self.connected_places = []
+        self.connected_places = OrderedDict()
+        self.connection_resolver = None
         self.connected_places_names = []
+        self.incoming_places = OrderedDict()
         self.set_state("visited", 0)
 
     def check_transfer_as_parent(self, subject, target):
         """
         This overriden, constant, semi-abstract method checks whether the planned transfer is ok. If
-        the new parent is a place, it tries to find a connection from us to it using a breadth-first
-        search. If not, it uses the default behaviour. Returns True if the transfer is okay, False
-        if not.
+        the new parent is a place, it asks the place graph whether there is a path of connections
+        from us to it. If not, it uses the default behaviour. Returns True if the transfer is okay,
+        False if not.
         """
         if target is None:
             return True
         elif target.is_place:
-            if not subject in self.children():
+            if subject.parent() is not self:
                 return False
-            place_queue = deque()
-            place_queue.append(self)
-            checked_places = [self]
-            while len(place_queue) > 0:
-                for new_place in place_queue.popleft().get_connected_places():
-                    if new_place == target:
-                        return True
-                    if new_place not in checked_places:
-                        place_queue.append(new_place)
-                        checked_places.append(new_place)
-            return False
+            return get_place_graph().is_reachable(self, target)
         else:
             return Entity.check_transfer_as_parent(self, subject, target)
 
@@ -621,14 +1250,11 @@ class Place(Entity):
         If not all entries could be found, it raises a LookupError.
         """
         if object_names is None:
-            return self.connected_places
+            return list(self.connected_places.values())
         else:
             found_places = []
-            for place in self.connected_places:
-                if place.objectName() in object_names:
-                    found_places.append(place)
-            if len(found_places) != object_names:
-                raise LookupError("Could not find all requested elements!")
+            for name in object_names:
+                found_places.append(self.get_connected_place(name))
             return found_places
 
     def get_connected_place(self, object_name):
@@ -636,19 +1262,44 @@ class Place(Entity):
         This constant method returns the connected place with the given object name or raises a
         LookupError if it doesn't exist.
         """
-        for place in self.connected_places:
-            if place.objectName() == object_name:
-                return place
-        raise LookupError()
+        place = self.connected_places.get(object_name)
+        if place is None:
+            raise LookupError("Could not find the place " + object_name + "!")
+        return place
+
+    def resolve_connected_place(self, object_name):
+        """
+        This constant method works like get_connected_place, but it is meant for names the player
+        entered and resolves them like Entity.resolve_entity does. It returns None if no connected
+        place could be found.
+        """
+        place = self.connected_places.get(object_name)
+        if place is not None:
+            return place
+        if self.connection_resolver is None:
+            self.connection_resolver = NameResolver(self.connected_places)
+        for name in self.connection_resolver.lookup(object_name):
+            return self.connected_places[name]
+        return None
 
     def connect_place(self, new_place):
         """
         This non-constant function connects us with the new_place. If new_place is not a subclass
-        of Place, it throws a TypeError.
+        of Place, it throws a TypeError. If we are already connected to another place with the same
+        name, it throws a ValueError.
         """
         if issubclass(new_place.__class__, Place):
-            if not new_place in self.connected_places:
-                self.connected_places.append(new_place)
+            connected_place = self.connected_places.get(new_place.objectName())
+            if connected_place is None:
+                self.connected_places[new_place.objectName()] = new_place
+                new_place.incoming_places[self] = None
+                if self.connection_resolver is not None:
+                    self.connection_resolver.add_name(new_place.objectName())
+                self.journal_change("connect", new_place.entity_id)
+                self.invalidate_description()
+                get_place_graph().add_connection(self, new_place)
+            elif connected_place is not new_place:
+                raise ValueError("Already connected to another " + new_place.objectName() + "!")
         else:
             raise TypeError(str(new_place) + " is not a Place!")
 
@@ -658,26 +1309,61 @@ class Place(Entity):
         it's object name. It might raise a LookupError if the given place does not exist or is not
         connected to us. If so, nothing will be changed.
         """
-        places_index = -1
-        for index in range(0, len(self.connected_places)):
-            if self.connected_places[index].get_object_name() == object_name:
-                places_index = index
-                break
-        if places_index == -1:
-            raise LookupError("Could not find the place " + object_name + "!")
-        del self.connected_places[places_index]
+        place = self.get_connected_place(object_name)
+        del place.incoming_places[self]
+        del self.connected_places[object_name]
+        if self.connection_resolver is not None:
+            self.connection_resolver.remove_name(object_name)
+        self.journal_change("disconnect", place.entity_id)
+        self.invalidate_description()
+        get_place_graph().remove_connection(self, place)
+
+    def setObjectName(self, name):
+        """
+        This overriden, non-constant method renames us and updates the connection tables of all
+        places that are connected to us, keeping the order of their exits. If one of them is
+        already connected to another place with the new name, it raises a ValueError and nothing
+        will be changed.
+        """
+        old_name = self.objectName()
+        # Entity.__init__ already names us before we have our connection tables.
+        incoming_places = getattr(self, "incoming_places", {})
+        if name != old_name:
+            for place in incoming_places:
+                if name in place.connected_places:
+                    raise ValueError(place.objectName() + " is already connected to another "
+                                     + name + "!")
+        Entity.setObjectName(self, name)
+        if name == old_name:
+            return
+        for place in incoming_places:
+            rename_key(place.connected_places, old_name, name)
+            if place.connection_resolver is not None:
+                place.connection_resolver.remove_name(old_name)
+                place.connection_resolver.add_name(name)
+
+    def invalidate_listings(self):
+        """
+        This overriden, non-constant method drops the cached descriptions of all entities that list
+        us, which are our parent and all places that are connected to us.
+        """
+        Entity.invalidate_listings(self)
+        # Entity.__init__ already sets listed attributes before we have our connection tables.
+        for place in getattr(self, "incoming_places", {}):
+            place.invalidate_description()
 
     def build_all_connections(self):
         """
         This non-constant method creates a connection the every place listed in
-        connected_places_names. If a place could not be found, it raises a LookupError, but the
-        object might be changed when this happens.
+        connected_places_names and clears it. If a place could not be found, it raises a
+        LookupError, but the object might be changed when this happens.
         """
         for name in self.connected_places_names:
             try:
                 self.build_connection(name)
             except LookupError as err:
                 raise err
+        self.connected_places_names = []
 
     def build_connection(self, object_name):
         """
@@ -685,24 +1371,25 @@ class Place(Entity):
         the given place could not be found, it raises a LookupError, but nothing will be changed
         when this happens.
         """
-        try:
-            place = self.parent().findChild(Place, object_name)
-        except LookupError as err:
-            raise err
+        place = self.parent().find_entity(object_name, Place)
+        if place is None:
+            raise LookupError("Could not find the place " + object_name + "!")
         self.connect_place(place)
 
+    @cached_description
     def generate_description(self):
         desc = self.description + " " + self.generate_inventory_list()
         desc += self.generate_exit_list() + "."
         return desc
 
+    @cached_description
     def generate_exit_list(self):
         """
         This constant method generates a readable list of all places we are connected to. It may
         throw a LookupError if a resource string could not be found.
         """
         con_places = []
-        for place in self.connected_places:
+        for place in self.connected_places.values():
             if not place.get_is_hidden():
                 con_places.append(place)
 
@@ -732,8 +1419,8 @@ class Place(Entity):
 
     def to_etree_element(self, parent_element):
         element = Entity.to_etree_element(self, parent_element)
-        for place in self.connected_places:
-            ElementTree.SubElement(element, "connection", attrib={"name": place.objectName()})
+        for name in self.connected_places:
+            ElementTree.SubElement(element, "connection", attrib={"name": name})
         return element
 
     def from_etree_element(self, element):
@@ -745,15 +1432,1291 @@ class Place(Entity):
             name = get_res_man().decode_string(name, pure_text=True)
             self.connected_places_names.append(name)
 
-class SinglePlayerApp(QApplication):
+class PlaceGraph(QObject):
     """
-    The SinglePlayerApp.
+    The PlaceGraph answers whether a place can be reached from another place by following their
+    connections. It groups the places into strongly connected components, in which every place can
+    reach every other place, and caches which components can be reached from each other, so that
+    most checks are a single lookup.
+
+    Connections within a component don't change the components, so adding them costs nothing and
+    removing a connection between two components only drops the cached reachability. Only the other
+    changes make us rebuild the components, which happens on the next check.
+
+    We only know the places that have connections and hold them weakly, so a place that lost it's
+    last connection or was destroyed isn't kept alive or walked by the next rebuild.
     """
 
-    def __init__(self, argv):
-        QApplication.__init__(self, argv)
+    def __init__(self, parent=None):
+        QObject.__init__(self, parent)
+        self.places = weakref.WeakKeyDictionary()
+        self.components = None
+        self.component_members = []
+        self.component_edges = []
+        self.component_reach = dict()
+
+    def add_connection(self, source, target):
+        """
+        This non-constant method tells us that the source place was connected to the target place.
+        """
+        self.places[source] = None
+        self.places[target] = None
+        if self.components is not None:
+            source_component = self.components.get(source)
+            if source_component is None or source_component != self.components.get(target):
+                self.clear_components()
+
+    def remove_connection(self, source, target):
+        """
+        This non-constant method tells us that the connection from the source place to the target
+        place was cut. A place without any connections left is forgotten.
+        """
+        isolated_places = [place for place in (source, target)
+                           if len(place.connected_places) == 0 and len(place.incoming_places) == 0]
+        for place in isolated_places:
+            self.places.pop(place, None)
+        if len(isolated_places) > 0:
+            # The components still hold the forgotten places, so they are dropped as a whole.
+            self.clear_components()
+        elif self.components is not None:
+            component = self.components.get(source)
+            if component == self.components.get(target):
+                self.clear_components()
+            else:
+                self.component_edges[component] = self.get_component_edges(component)
+                self.component_reach.clear()
+
+    def clear_components(self):
+        """
+        This non-constant method drops the components and everything cached about them, so that
+        they are rebuilt on the next check.
+        """
+        self.components = None
+        self.component_members = []
+        self.component_edges = []
+        self.component_reach.clear()
+
+    def is_reachable(self, source, target):
+        """
+        This constant method returns True if there is a path of at least one connection from the
+        source place to the target place and False if not.
+        """
+        if self.components is None:
+            self.build_components()
+
+        source_component = self.components.get(source)
+        target_component = self.components.get(target)
+        if source_component is None or target_component is None:
+            return False
+        elif source_component == target_component:
+            if source is not target or len(self.component_members[source_component]) > 1:
+                return True
+            return source in source.incoming_places
+
+        reach = self.component_reach.get(source_component)
+        if reach is None:
+            reach = self.get_reachable_components(source_component)
+            self.component_reach[source_component] = reach
+        return target_component in reach
+
+    def get_reachable_components(self, component):
+        """
+        This constant method returns a set of all components that can be reached from the given
+        component.
+        """
+        reach = set()
+        component_queue = deque([component])
+        while len(component_queue) > 0:
+            for next_component in self.component_edges[component_queue.popleft()]:
+                if next_component not in reach:
+                    reach.add(next_component)
+                    component_queue.append(next_component)
+        return reach
+
+    def get_component_edges(self, component):
+        """
+        This constant method returns a set of all components that the places of the given component
+        are directly connected to.
+        """
+        edges = set()
+        for place in self.component_members[component]:
+            for next_place in place.get_connected_places():
+                next_component = self.components[next_place]
+                if next_component != component:
+                    edges.add(next_component)
+        return edges
+
+    def build_components(self):
+        """
+        This non-constant method groups all known places into strongly connected components, using
+        an iterative version of Tarjan's algorithm, and collects the connections between them.
+        """
+        self.components = dict()
+        self.component_members = []
+        self.component_reach.clear()
+
+        indices = dict()
+        lowlinks = dict()
+        stack = []
+        on_stack = set()
+        for root in list(self.places.keys()):
+            if root in indices:
+                continue
+            indices[root] = lowlinks[root] = len(indices)
+            stack.append(root)
+            on_stack.add(root)
+            work_stack = [(root, iter(root.get_connected_places()))]
+            while len(work_stack) > 0:
+                place, connections = work_stack[-1]
+                descended = False
+                for next_place in connections:
+                    if next_place not in indices:
+                        indices[next_place] = lowlinks[next_place] = len(indices)
+                        stack.append(next_place)
+                        on_stack.add(next_place)
+                        work_stack.append((next_place, iter(next_place.get_connected_places())))
+                        descended = True
+                        break
+                    elif next_place in on_stack:
+                        lowlinks[place] = min(lowlinks[place], indices[next_place])
+                if descended:
+                    continue
+
+                work_stack.pop()
+                if len(work_stack) > 0:
+                    parent_place = work_stack[-1][0]
+                    lowlinks[parent_place] = min(lowlinks[parent_place], lowlinks[place])
+                if lowlinks[place] == indices[place]:
+                    component = len(self.component_members)
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        self.components[member] = component
+                        members.append(member)
+                        if member is place:
+                            break
+                    self.component_members.append(members)
+
+        self.component_edges = []
+        for component in range(0, len(self.component_members)):
+            self.component_edges.append(self.get_component_edges(component))
+
+class TransferEventDispatcher(QObject):
+    """
+    The TransferEventDispatcher passes transfer events on to the entities that subscribed to them,
+    either by the subject's class, by the subject, by the parent or target of the transfer, or to
+    all transfers. This way, a transfer only costs as much as there are interested entities and not
+    as much as there are entities in the world.
+
+    Like the old walk through the whole world, only entities that are part of the world get events
+    and they get them in the order of the world tree, with outer entities before the entities
+    inside of them. An entity that calls Entity.on_transfer passes the event on to it's interested
+    descendants right away.
+    """
+
+    def __init__(self, parent=None):
+        QObject.__init__(self, parent)
+        self.all_listeners = weakref.WeakKeyDictionary()
+        self.class_listeners = dict()
+        self.subject_listeners = weakref.WeakKeyDictionary()
+        self.parent_listeners = weakref.WeakKeyDictionary()
+        self.target_listeners = weakref.WeakKeyDictionary()
+        self.pending_events = []
+
+    def subscribe(self, listener, subject_class=None, subject=None, parent=None, target=None):
+        """
+        This non-constant method subscribes the listener entity to all transfers of instances of
+        the subject_class, of the subject, from the parent or to the target. If several of them are
+        given, the listener gets every transfer that matches one of them, but only once. If none of
+        them is given, the listener gets every transfer. Subscriptions don't keep the entities
+        alive.
+        """
+        if subject_class is None and subject is None and parent is None and target is None:
+            self.all_listeners[listener] = None
+        if subject_class is not None:
+            self.class_listeners.setdefault(subject_class, weakref.WeakKeyDictionary())
+            self.class_listeners[subject_class][listener] = None
+        for entity, entity_listeners in [(subject, self.subject_listeners),
+                                         (parent, self.parent_listeners),
+                                         (target, self.target_listeners)]:
+            if entity is not None:
+                entity_listeners.setdefault(entity, weakref.WeakKeyDictionary())
+                entity_listeners[entity][listener] = None
+
+    def unsubscribe(self, listener):
+        """
+        This non-constant method removes all subscriptions of the listener.
+        """
+        self.all_listeners.pop(listener, None)
+        for listeners in self.class_listeners.values():
+            listeners.pop(listener, None)
+        for entity_listeners in [self.subject_listeners, self.parent_listeners,
+                                 self.target_listeners]:
+            for listeners in entity_listeners.values():
+                listeners.pop(listener, None)
+
+    def get_listeners(self, subject, parent, target):
+        """
+        This constant method returns a list of all entities in the world that are interested in the
+        given transfer, in the order of the world tree.
+        """
+        listeners = dict(self.all_listeners.items())
+        for subject_class in subject.__class__.__mro__:
+            listeners.update(self.class_listeners.get(subject_class, {}).items())
+        for entity, entity_listeners in [(subject, self.subject_listeners),
+                                         (parent, self.parent_listeners),
+                                         (target, self.target_listeners)]:
+            if entity is not None:
+                listeners.update(entity_listeners.get(entity, {}).items())
+
+        if len(listeners) == 1:
+            return [listener for listener in listeners if self.is_in_world(listener)]
+
+        ordered_listeners = []
+        for listener in listeners:
+            position = self.get_world_position(listener)
+            if position is not None:
+                ordered_listeners.append((position, listener))
+        ordered_listeners.sort(key=lambda entry: entry[0])
+        return [entry[1] for entry in ordered_listeners]
+
+    def is_in_world(self, entity):
+        """
+        This constant method returns True if the entity is part of the world and False if not.
+        """
+        while entity is not None:
+            if entity is self.parent():
+                return True
+            entity = entity.parent()
+        return False
+
+    def get_world_position(self, entity):
+        """
+        This constant method returns the position of the entity in the world tree as a list of the
+        attach orders of it and it's ancestors, which sorts like a walk through the world would
+        visit the entities, or None if the entity isn't part of the world. It only costs as much as
+        the entity is deep in the world.
+        """
+        position = []
+        while entity is not self.parent():
+            parent = entity.parent()
+            if parent is None:
+                return None
+            position.append(getattr(entity, "attach_order", 0))
+            entity = parent
+        position.reverse()
+        return position
+
+    def dispatch(self, subject, parent, target):
+        """
+        This non-constant method passes the transfer event on to all entities in the world that are
+        interested in it. The event is kept as a list of itself, it's listeners, the set of the
+        listeners that already got it and the index of the listener that gets it right now, so that
+        dispatch_to_descendants neither passes it on twice nor looks at earlier listeners again.
+        """
+        pending_listeners = self.get_listeners(subject, parent, target)
+        served_listeners = set()
+        pending_event = [(subject, parent, target), pending_listeners, served_listeners, 0]
+        self.pending_events.append(pending_event)
+        try:
+            for index, listener in enumerate(pending_listeners):
+                if listener not in served_listeners:
+                    pending_event[3] = index
+                    served_listeners.add(listener)
+                    if self.is_in_world(listener):
+                        listener.on_transfer(subject, parent, target)
+        finally:
+            self.pending_events.pop()
+
+    def dispatch_to_descendants(self, entity, subject, parent, target):
+        """
+        This non-constant method passes the transfer event, which has to be the one that is
+        currently dispatched, on to all interested descendants of the entity which did not get it
+        yet.
+        """
+        if len(self.pending_events) == 0 or self.pending_events[-1][0] != (subject, parent, target):
+            return
+        _, pending_listeners, served_listeners, first_index = self.pending_events[-1]
+
+        for listener in pending_listeners[first_index:]:
+            if listener in served_listeners:
+                continue
+            ancestor = listener.parent()
+            while ancestor is not None and ancestor is not entity:
+                ancestor = ancestor.parent()
+            if ancestor is entity:
+                served_listeners.add(listener)
+                if self.is_in_world(listener):
+                    listener.on_transfer(subject, parent, target)
+
+class CommandTrie(QObject):
+    """
+    The CommandTrie maps the commands the player can enter to their handlers. Commands are
+    registered in groups: Every group is a resource string element whose "command" sub-elements
+    contain all verbs of the group, which may consist of several words, and all of them are handled
+    by the same handler. The verbs are compiled into a trie of words, so that the longest verb at
+    the beginning of an entered text is found in one pass over it's words, no matter how many verbs
+    there are. Words are compared in their folded form, so their case doesn't matter. The trie is
+    compiled when it is first needed and again after the string tables were reloaded. If two groups
+    contain the same verb, the group that was registered first wins.
+    """
+
+    def __init__(self, parent=None):
+        QObject.__init__(self, parent)
+        self.groups = []
+        self.root = None
+        get_res_man().strings_loaded.connect(self.invalidate)
+
+    def register_group(self, key, handler):
+        """
+        This non-constant method registers the command group in the resource string element with
+        the given key. Whenever one of it's verbs is entered, handler is called.
+        """
+        self.groups.append((key, handler))
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        This non-constant method drops the compiled trie.
+        """
+        self.root = None
+
+    def compile(self):
+        """
+        This non-constant method compiles the verbs of all registered groups into the trie. Every
+        node of the trie is a dictionary from a word to the next node, and the handler of a verb is
+        stored in the node of it's last word, under the key None. If the verbs of a group could not
+        be found, the game crashes.
+        """
+        root = dict()
+        for key, handler in self.groups:
+            for command in get_res_man().get_string_list(key + ".command"):
+                node = root
+                for word in command.split():
+                    node = node.setdefault(fold_word(word), dict())
+                node.setdefault(None, handler)
+        self.root = root
+
+    def match(self, words):
+        """
+        This constant method looks for the longest verb the given list of words begins with and
+        returns it's handler together with the number of words the verb consists of. If the words
+        don't begin with a verb, it returns (None, 0).
+        """
+        if self.root is None:
+            self.compile()
+        handler, used_words = None, 0
+        node = self.root
+        for index, word in enumerate(words):
+            node = node.get(fold_word(word))
+            if node is None:
+                break
+            if None in node:
+                handler, used_words = node[None], index + 1
+        return handler, used_words
+
+class SaveJournal(QObject):
+    """
+    The SaveJournal keeps the save up to date while the game is played: Every saved change of an
+    entity is appended to the journal as it happens, as a JSON list of a sequence number, the
+    operation, the entity's id and the operation's arguments. Every line is handed to the operating
+    system right away, so a killed game loses nothing. The save file is a snapshot of the world
+    that contains the sequence number of the last change it includes, and restoring it means
+    reading the snapshot and replaying all later changes from the journal.
+
+    The journal is split into segments, files whose names end with the sequence number of their
+    first change. Whenever a snapshot is taken, we start a new segment, and once the snapshot was
+    written, all older segments are removed, so the journal never grows large. Until the first
+    segment is started, changes are not recorded, for example while the world is restored.
+    """
+
+    def __init__(self, parent=None, path=JOURNAL_PATH):
+        QObject.__init__(self, parent)
+        self.path = path
+        self.journal_file = None
+        self.sequence_number = 0
+        self.record_count = 0
+
+    def get_sequence_number(self):
+        """
+        This constant method returns the sequence number of the last recorded change.
+        """
+        return self.sequence_number
+
+    def set_sequence_number(self, sequence_number):
+        """
+        This non-constant method sets the sequence number of the last recorded change.
+        """
+        self.sequence_number = sequence_number
+
+    def get_record_count(self):
+        """
+        This constant method returns the number of changes in our current segment.
+        """
+        return self.record_count
+
+    def get_segments(self):
+        """
+        This constant method returns a sorted list of pairs of the first sequence number and the
+        path of all segments on the disk.
+        """
+        directory, prefix = os.path.split(self.path)
+        prefix += "."
+        segments = []
+        try:
+            file_names = os.listdir(directory or ".")
+        except OSError:
+            return segments
+        for file_name in file_names:
+            if file_name.startswith(prefix) and file_name[len(prefix):].isdigit():
+                segments.append((int(file_name[len(prefix):]), os.path.join(directory, file_name)))
+        segments.sort()
+        return segments
+
+    def start_segment(self):
+        """
+        This non-constant method starts a new segment and records all following changes in it. It
+        should only be called right after a snapshot was taken.
+        """
+        self.close()
+        segment_path = self.path + "." + str(self.sequence_number + 1)
+        self.journal_file = open(segment_path, "w", encoding="UTF-8", buffering=1)
+        self.record_count = 0
+
+    def remove_segments(self, sequence_number):
+        """
+        This constant method removes all segments that only contain changes up to the given
+        sequence number, because a snapshot that includes them was written. It may be called from
+        any thread.
+        """
+        segments = self.get_segments()
+        for index, (_, segment_path) in enumerate(segments[:-1]):
+            if segments[index + 1][0] <= sequence_number + 1:
+                try:
+                    os.remove(segment_path)
+                except OSError:
+                    pass
+
+    def close(self):
+        """
+        This non-constant method stops recording changes.
+        """
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+    def record(self, operation, entity_id, *arguments):
+        """
+        This non-constant method appends a change to the journal, if it is recording. When there
+        are enough changes in the current segment, it lets the auto saver schedule a snapshot.
+        """
+        if self.journal_file is None:
+            return
+        self.sequence_number += 1
+        record = [self.sequence_number, operation, entity_id] + list(arguments)
+        self.journal_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.record_count += 1
+        if self.record_count == self.parent().get_auto_saver().get_change_threshold():
+            self.parent().get_auto_saver().schedule_save()
+
+    def read_records(self):
+        """
+        This constant method returns a list of all changes in the journal that are newer than our
+        sequence number. A broken last line of a segment, which is left when the game was killed
+        while writing it, is ignored.
+        """
+        records = []
+        for _, segment_path in self.get_segments():
+            try:
+                with open(segment_path, encoding="UTF-8") as journal_file:
+                    for line in journal_file:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break
+                        if record[0] > self.sequence_number:
+                            records.append(record)
+            except FileNotFoundError:
+                pass
+        return records
+
+class AutoSaver(QObject):
+    """
+    The AutoSaver writes the snapshots of the world to the save file at path, in the binary format
+    if binary is True and as XML otherwise. Taking a snapshot, which means converting the world
+    into an element tree, has to happen on the main thread, but serializing it, writing it to a
+    temporary file, syncing it to the disk and replacing the save file with it happens on a worker
+    thread, so that the game doesn't stall. Since the save file is replaced atomically, a crash
+    while saving always leaves a complete save. If a new snapshot is taken while the last one is
+    still written, only the newer one is written next.
+
+    Snapshots are taken periodically, every interval milliseconds if something changed, and when
+    the save journal recorded change_threshold changes since the last one. They are always taken
+    from the event loop, since an action like spawning an entity is recorded as several changes and
+    a snapshot in between would miss the half-done entity. The time the last snapshot took on the
+    main thread and the time it's writing took are kept, so the settings can be tuned.
+    """
+
+    def __init__(self, parent=None, path=SAVE_PATH, binary=False):
+        QObject.__init__(self, parent)
+        self.path = path
+        self.binary = binary
+        self.interval = AUTOSAVE_INTERVAL
+        self.change_threshold = AUTOSAVE_CHANGE_THRESHOLD
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.on_timeout)
+
+        self.condition = threading.Condition()
+        self.pending_snapshot = None
+        self.is_writing = False
+        self.writer_thread = None
+        self.write_error = None
+        self.last_snapshot_cost = 0.0
+        self.last_write_cost = 0.0
+
+    def get_interval(self):
+        """
+        This constant method returns the time between two periodic snapshots in milliseconds.
+        """
+        return self.interval
+
+    def set_interval(self, interval):
+        """
+        This non-constant method sets the time between two periodic snapshots in milliseconds. If
+        it is 0, no periodic snapshots are taken.
+        """
+        self.interval = interval
+        if self.timer.isActive():
+            self.start()
+
+    def get_change_threshold(self):
+        """
+        This constant method returns the number of changes after which a snapshot is taken.
+        """
+        return self.change_threshold
+
+    def set_change_threshold(self, change_threshold):
+        """
+        This non-constant method sets the number of changes after which a snapshot is taken.
+        """
+        self.change_threshold = change_threshold
 
+    def get_last_snapshot_cost(self):
+        """
+        This constant method returns the time in seconds the last snapshot took on the main thread.
+        """
+        return self.last_snapshot_cost
+
+    def get_last_write_cost(self):
+        """
+        This constant method returns the time in seconds the writing of the last snapshot took on
+        the worker thread.
+        """
+        return self.last_write_cost
+
+    def start(self):
+        """
+        This non-constant method starts taking periodic snapshots.
+        """
+        self.timer.stop()
+        if self.interval > 0:
+            self.timer.start(self.interval)
+
+    def schedule_save(self):
+        """
+        This non-constant method lets us take a snapshot as soon as control returns to the event
+        loop.
+        """
+        QTimer.singleShot(0, self.on_timeout)
+
+    def on_timeout(self):
+        """
+        This non-constant method takes a periodic snapshot if something changed since the last one.
+        """
+        if self.parent().get_save_journal().get_record_count() > 0:
+            self.parent().save_world(wait=False)
+
+    def save(self, tree, sequence_number, snapshot_cost, base=None, wait=True):
+        """
+        This non-constant method hands the given snapshot, which includes all changes up to the
+        given sequence number, to the worker thread. If base is a pair of the snapshot of the
+        pristine world and the hash of the world file, only the differences to it are written. If
+        wait is True, it waits until it was written and raises an OSError if this failed.
+        """
+        self.last_snapshot_cost = snapshot_cost
+        class_names = self.parent().get_entity_class_names()
+        with self.condition:
+            self.pending_snapshot = (tree, sequence_number, base, class_names)
+            if self.writer_thread is None:
+                self.writer_thread = threading.Thread(target=self.run_writer, daemon=True)
+                self.writer_thread.start()
+            self.condition.notify_all()
+        if wait:
+            self.wait()
+
+    def wait(self):
+        """
+        This constant method waits until all snapshots were written. It raises an OSError if the
+        last one could not be written.
+        """
+        with self.condition:
+            while self.pending_snapshot is not None or self.is_writing:
+                self.condition.wait()
+            if self.write_error is not None:
+                error, self.write_error = self.write_error, None
+                raise error
+
+    def run_writer(self):
+        """
+        This non-constant method is run by the worker thread and writes every snapshot that is
+        handed to it.
+        """
+        while True:
+            with self.condition:
+                while self.pending_snapshot is None:
+                    self.condition.wait()
+                tree, sequence_number, base, class_names = self.pending_snapshot
+                self.pending_snapshot = None
+                self.is_writing = True
+
+            start_time = time.perf_counter()
+            try:
+                if base is not None:
+                    world_snapshot, world_hash = base
+                    delta = compute_delta(world_snapshot.getroot(), tree.getroot(), world_hash)
+                    tree = ElementTree.ElementTree(delta)
+                self.write(tree, class_names)
+                self.parent().get_save_journal().remove_segments(sequence_number)
+                error = None
+            except OSError as exception:
+                error = exception
+
+            with self.condition:
+                self.last_write_cost = time.perf_counter() - start_time
+                self.write_error = error
+                self.is_writing = False
+                self.condition.notify_all()
+
+    def write(self, tree, class_names):
+        """
+        This constant method writes the given element tree to a temporary file, syncs it to the disk
+        and replaces the save file with it. The class_names are the names of the registered entity
+        classes, which are used by the binary format.
+        """
+        temp_path = self.path + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(temp_path, "wb") as save_file:
+                if self.binary:
+                    write_binary_save(tree, save_file, class_names)
+                else:
+                    tree.write(save_file, encoding="UTF-16", xml_declaration=True)
+                save_file.flush()
+                os.fsync(save_file.fileno())
+            os.replace(temp_path, self.path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        # Syncing the directory makes the replacement itself durable, where that is supported.
+        try:
+            directory_fd = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(directory_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(directory_fd)
+
+class SceneClock(QObject):
+    """
+    The SceneClock decides how long the delays of scenes last. In the real mode, a delay lasts as
+    long as the scene says, and in the scaled mode, it is divided by our speed, so a speed of 4
+    plays scenes four times as fast. In the instant mode, delays don't wait at all: A scene runs
+    until it's end or it's next choice right away, without entering the event loop, so scripted
+    runs and tests are only bound by the CPU.
+
+    Besides that, we keep a virtual time, which is the sum of all delays that were played, in
+    milliseconds. It goes on in every mode, so a scripted run can still tell how long it's scenes
+    would have taken.
+    """
+
+    def __init__(self, parent=None, mode="real", speed=1.0):
+        QObject.__init__(self, parent)
+        self.mode = "real"
+        self.speed = 1.0
+        self.virtual_time = 0
+        self.set_mode(mode, speed)
+
+    def get_mode(self):
+        """
+        This constant method returns our mode, which is one of SCENE_CLOCK_MODES.
+        """
+        return self.mode
+
+    def get_speed(self):
+        """
+        This constant method returns the factor by which delays are shortened in the scaled mode.
+        """
+        return self.speed
+
+    def set_mode(self, mode, speed=1.0):
+        """
+        This non-constant method sets our mode and, for the scaled mode, our speed. It raises a
+        ValueError if the mode is unknown or the speed isn't positive.
+        """
+        if mode not in SCENE_CLOCK_MODES:
+            raise ValueError("Unknown scene clock mode " + str(mode) + "!")
+        if mode == "scaled" and not speed > 0:
+            raise ValueError("The speed of a scene clock has to be positive!")
+        self.mode = mode
+        self.speed = speed if mode == "scaled" else 1.0
+
+    def is_instant(self):
+        """
+        This constant method returns whether delays don't wait at all.
+        """
+        return self.mode == "instant"
+
+    def get_virtual_time(self):
+        """
+        This constant method returns the sum of all delays that were played, in milliseconds.
+        """
+        return self.virtual_time
+
+    def get_wait_time(self, delay):
+        """
+        This non-constant method adds the given delay in milliseconds to our virtual time and
+        returns how many milliseconds a scene really has to wait for it, or None if it doesn't
+        wait at all.
+        """
+        self.virtual_time += delay
+        if self.mode == "instant":
+            return None
+        return int(round(delay / self.speed))
+
+def parse_scene_clock_argument(argument):
+    """
+    This function converts the value of the '--scene-clock' flag into a mode and a speed: 'real'
+    and 'instant' are modes, and a number is the speed of the scaled mode. It raises a ValueError
+    if the value is neither.
+    """
+    if argument in ("real", "instant"):
+        return argument, 1.0
+    try:
+        speed = float(argument)
+    except ValueError:
+        raise ValueError("Invalid scene clock: " + argument)
+    return "scaled", speed
+
+def write_varint(buffer, number):
+    """
+    This function appends the given non-negative integer to the buffer, seven bits per byte and
+    the lowest bits first. The highest bit of a byte tells whether another one follows.
+    """
+    while number > 0x7f:
+        buffer.append((number & 0x7f) | 0x80)
+        number >>= 7
+    buffer.append(number)
+
+def read_varint(data, position):
+    """
+    This function reads an integer written by write_varint from data, starting at position, and
+    returns it together with the position after it.
+    """
+    number = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return number, position
+        shift += 7
+
+def write_binary_string(buffer, string):
+    """
+    This function appends the given string to the buffer, encoded as UTF-8 and prefixed with it's
+    length.
+    """
+    encoded_string = string.encode("UTF-8")
+    write_varint(buffer, len(encoded_string))
+    buffer += encoded_string
+
+def get_binary_value_type(value):
+    """
+    This function returns the type an attribute value is stored as in the binary save format.
+    """
+    if value == "True":
+        return BINARY_VALUE_TRUE
+    if value == "False":
+        return BINARY_VALUE_FALSE
+    # Only canonical numbers can be stored as such, since "007" has to be read back as "007".
+    if INTEGER_PATTERN.match(value) is not None and str(int(value)) == value:
+        return BINARY_VALUE_INTEGER
+    return BINARY_VALUE_STRING
+
+def encode_binary_value(value, string_ids):
+    """
+    This function returns the code of an attribute value for the binary save format. The lowest two
+    bits of it are it's type: Integers are stored as zigzag-encoded numbers, booleans only as their
+    type and all other strings as their index in the string table.
+    """
+    value_type = get_binary_value_type(value)
+    if value_type == BINARY_VALUE_STRING:
+        return string_ids[value] << 2 | BINARY_VALUE_STRING
+    if value_type == BINARY_VALUE_INTEGER:
+        number = int(value)
+        number = number << 1 if number >= 0 else (-number << 1) - 1
+        return number << 2 | BINARY_VALUE_INTEGER
+    return value_type
+
+def write_binary_save(tree, save_file, class_names):
+    """
+    This function writes the given element tree of a save to the binary file object save_file.
+
+    The binary save format starts with BINARY_SAVE_MAGIC and a byte with the BINARY_SAVE_VERSION,
+    followed by the header, which contains the attributes of the root element as their count and
+    their keys and values, so that it can be read without the rest of the file. After it, the
+    table of entity classes and the table of all other strings follow. Every string is encoded as
+    UTF-8 and prefixed with it's length. The class table contains the given class_names, the names
+    of the registered entity classes, so that an entity's class is stored as it's index in the
+    register, and the strings are sorted by how often they are used, so that the common ones get
+    short indices. After this, the root element follows.
+
+    Every element is stored as it's tag, the number of it's attributes, the attributes, the number
+    of it's children and the children. A tag is the index of it's entity class or, if it is none,
+    the number of classes plus the index of the string. An attribute is the index of it's key in
+    the string table followed by the code of it's value, as given by encode_binary_value. The root
+    element is stored without it's attributes, since they are in the header. All numbers are
+    stored as varints. Texts of the elements are not stored, since saves have none.
+    """
+    root = tree.getroot()
+    class_ids = dict((name, index) for (index, name) in enumerate(class_names))
+    string_counts = Counter()
+    value_types = dict()
+    for element in tree.iter():
+        if element.tag not in class_ids:
+            string_counts[element.tag] += 1
+        if element is root:
+            continue
+        for key, value in element.attrib.items():
+            string_counts[key] += 1
+            value_type = value_types.get(value)
+            if value_type is None:
+                value_type = value_types[value] = get_binary_value_type(value)
+            if value_type == BINARY_VALUE_STRING:
+                string_counts[value] += 1
+    strings = [string for (string, _) in string_counts.most_common()]
+    string_ids = dict((string, index) for (index, string) in enumerate(strings))
+    tag_ids = dict((tag, index + len(class_names)) for (tag, index) in string_ids.items())
+    tag_ids.update(class_ids)
+    value_codes = dict((value, encode_binary_value(value, string_ids)) for value in value_types)
+
+    buffer = bytearray(BINARY_SAVE_MAGIC)
+    buffer.append(BINARY_SAVE_VERSION)
+    write_varint(buffer, len(root.attrib))
+    for key, value in root.attrib.items():
+        write_binary_string(buffer, key)
+        write_binary_string(buffer, value)
+    for table in (class_names, strings):
+        write_varint(buffer, len(table))
+        for string in table:
+            write_binary_string(buffer, string)
+
+    # The elements are first flattened into a list of numbers, which are then encoded at once.
+    numbers = [tag_ids[root.tag], 0, len(root)]
+    stack = list(reversed(root))
+    while len(stack) > 0:
+        element = stack.pop()
+        attributes = element.attrib
+        numbers.append(tag_ids[element.tag])
+        numbers.append(len(attributes))
+        for key, value in attributes.items():
+            numbers.append(string_ids[key])
+            numbers.append(value_codes[value])
+        numbers.append(len(element))
+        stack.extend(reversed(element))
+    encoded_numbers = dict()
+    for number in set(numbers):
+        encoded_number = bytearray()
+        write_varint(encoded_number, number)
+        encoded_numbers[number] = bytes(encoded_number)
+    buffer += b"".join(map(encoded_numbers.__getitem__, numbers))
+    save_file.write(buffer)
+
+def iterparse_binary_save(save_file):
+    """
+    This generator reads a save in the binary format, as described in write_binary_save, from the
+    binary file object save_file. Like ElementTree.iterparse, it yields a ("start", element) pair
+    when it has read an element with it's attributes and an ("end", element) pair when it has read
+    all of it's children. The elements are exactly the ones that were written. It raises a
+    ValueError if the file is not a valid binary save.
+    """
+    data = save_file.read()
+    try:
+        header, position = read_binary_save_header(data)
+        tables = []
+        for _ in range(0, 2):
+            count, position = read_varint(data, position)
+            table = []
+            for _ in range(0, count):
+                string, position = read_binary_string(data, position)
+                table.append(string)
+            tables.append(table)
+        class_names, strings = tables
+        tags = class_names + strings
+
+        # The rest of the file only consists of varints. Most of them are single bytes, so instead
+        # of reading them byte by byte, we only search for the longer ones and copy the bytes
+        # between them.
+        numbers = []
+        for match in MULTI_BYTE_VARINT_PATTERN.finditer(data, position):
+            numbers.extend(data[position:match.start()])
+            numbers.append(read_varint(data, match.start())[0])
+            position = match.end()
+        numbers.extend(data[position:])
+        next_number = iter(numbers).__next__
+
+        values = dict()
+        for code in set(numbers):
+            value_type = code & 3
+            if value_type == BINARY_VALUE_STRING:
+                if code >> 2 < len(strings):
+                    values[code] = strings[code >> 2]
+            elif value_type == BINARY_VALUE_INTEGER:
+                number = code >> 2
+                values[code] = str(-((number + 1) >> 1) if number & 1 else number >> 1)
+            else:
+                values[code] = "True" if value_type == BINARY_VALUE_TRUE else "False"
+
+        tag = tags[next_number()]
+        root = ElementTree.Element(tag, {strings[next_number()]: values[next_number()]
+                                         for _ in range(0, next_number())})
+        root.attrib.update(header)
+        yield "start", root
+        # Each entry of the stack is an element and the number of children it still misses.
+        stack = [(root, next_number())]
+        while len(stack) > 0:
+            parent, missing_children = stack.pop()
+            if missing_children == 0:
+                yield "end", parent
+                continue
+            stack.append((parent, missing_children - 1))
+            tag = tags[next_number()]
+            element = ElementTree.SubElement(parent, tag, {strings[next_number()]:
+                                                           values[next_number()]
+                                                           for _ in range(0, next_number())})
+            yield "start", element
+            stack.append((element, next_number()))
+    except (IndexError, KeyError, StopIteration, UnicodeDecodeError):
+        raise ValueError("Invalid binary save!")
+
+def read_binary_string(data, position):
+    """
+    This function reads a string, as it is stored in the binary save format, from data, starting at
+    position, and returns it together with the position after it.
+    """
+    length, position = read_varint(data, position)
+    if position + length > len(data):
+        raise IndexError("The string ends after the data!")
+    return data[position:position + length].decode("UTF-8"), position + length
+
+def read_binary_save_header(data):
+    """
+    This function reads the header of a save in the binary format, as described in
+    write_binary_save, from the start of data and returns it as a dictionary, together with the
+    position after it. Saves of the first version have no header, so it is empty for them. It raises
+    a ValueError if data doesn't start like a binary save and an IndexError if it ends before the
+    header does.
+    """
+    if not data.startswith(BINARY_SAVE_MAGIC):
+        raise ValueError("Invalid binary save!")
+    position = len(BINARY_SAVE_MAGIC)
+    version = data[position]
+    position += 1
+    header = dict()
+    if version == 1:
+        return header, position
+    if version != BINARY_SAVE_VERSION:
+        raise ValueError("Unknown version of the binary save format!")
+    try:
+        count, position = read_varint(data, position)
+        for _ in range(0, count):
+            key, position = read_binary_string(data, position)
+            header[key], position = read_binary_string(data, position)
+    except UnicodeDecodeError:
+        raise ValueError("Invalid binary save!")
+    return header, position
+
+def read_binary_save(save_file):
+    """
+    This function reads a save in the binary format, as described in write_binary_save, from the
+    binary file object save_file and returns it as an element tree, which is exactly the one that
+    was written. It raises a ValueError if the file is not a valid binary save.
+    """
+    root = None
+    for event, element in iterparse_binary_save(save_file):
+        if root is None:
+            root = element
+    return ElementTree.ElementTree(root)
+
+def iterparse_save(save_path):
+    """
+    This generator reads the save or world file at save_path, which may be in the XML or the binary
+    format, and yields the same pairs of events and elements as ElementTree.iterparse with the
+    "start" and "end" events does. It raises an OSError if the file could not be read and a
+    ValueError or an ElementTree.ParseError if it is invalid.
+    """
+    with open(save_path, "rb") as save_file:
+        if save_file.read(len(BINARY_SAVE_MAGIC)) == BINARY_SAVE_MAGIC:
+            save_file.seek(0)
+            yield from iterparse_binary_save(save_file)
+        else:
+            save_file.seek(0)
+            yield from ElementTree.iterparse(save_file, events=("start", "end"))
+
+def read_save_header(save_path):
+    """
+    This function returns the attributes of the root element of the save or world file at
+    save_path, which may be in the XML or the binary format, as a dictionary. For a save, they are
+    it's header, as described in EngineApp.take_snapshot. Only the start of the file is read, so
+    this is fast even for large worlds. It raises an OSError if the file could not be read and a
+    ValueError or an ElementTree.ParseError if it is invalid.
+    """
+    with open(save_path, "rb") as save_file:
+        data = save_file.read(BINARY_HEADER_READ_SIZE)
+        if data.startswith(BINARY_SAVE_MAGIC):
+            try:
+                return read_binary_save_header(data)[0]
+            except IndexError:
+                # The header is longer than what we have read so far.
+                data += save_file.read()
+            try:
+                return read_binary_save_header(data)[0]
+            except IndexError:
+                raise ValueError("Invalid binary save!")
+        save_file.seek(0)
+        _, root = next(ElementTree.iterparse(save_file, events=("start",)))
+        return dict(root.attrib)
+
+def get_slot_path(slot_name, extension):
+    """
+    This function returns the path of the file with the given extension, like ".xml", that belongs
+    to the save slot with the given name.
+    """
+    return os.path.join(SAVES_DIRECTORY, slot_name + extension)
+
+def list_save_slots(directory=SAVES_DIRECTORY):
+    """
+    This function returns a list of pairs of the name and the header of every save slot in the
+    given directory, the newest save first. If a slot has a save in the XML and in the binary
+    format, the newer one is used, like EngineApp.restore_world does. Only the headers of the saves
+    are read and slots whose save can't be read are left out.
+    """
+    saves = dict()
+    try:
+        file_names = os.listdir(directory)
+    except OSError:
+        return []
+    for file_name in file_names:
+        slot_name, extension = os.path.splitext(file_name)
+        if extension not in (".xml", ".bin") or SLOT_NAME_PATTERN.match(slot_name) is None:
+            continue
+        save_path = os.path.join(directory, file_name)
+        try:
+            modification_time = os.path.getmtime(save_path)
+        except OSError:
+            continue
+        if slot_name not in saves or saves[slot_name][0] < modification_time:
+            saves[slot_name] = (modification_time, save_path)
+
+    slots = []
+    for slot_name, (_, save_path) in saves.items():
+        try:
+            slots.append((slot_name, read_save_header(save_path)))
+        except (OSError, ValueError, ElementTree.ParseError, StopIteration):
+            continue
+    slots.sort(key=lambda slot: int(slot[1].get("timestamp", 0)), reverse=True)
+    return slots
+
+def parse_save(save_path):
+    """
+    This function reads the save or world file at save_path, which may be in the XML or the binary
+    format, and returns it as an element tree. It raises an OSError if the file could not be read
+    and a ValueError or an ElementTree.ParseError if it is invalid.
+    """
+    with open(save_path, "rb") as save_file:
+        if save_file.read(len(BINARY_SAVE_MAGIC)) == BINARY_SAVE_MAGIC:
+            save_file.seek(0)
+            return read_binary_save(save_file)
+        save_file.seek(0)
+        return ElementTree.parse(save_file)
+
+def index_snapshot(root):
+    """
+    This function returns two dictionaries for the snapshot with the given root element: The first
+    one maps the id of every entity to it's element and the id of it's parent and the second one
+    maps the id of every entity that has children, or 0 for the root, to the list of the ids of
+    it's children.
+    """
+    entities = dict()
+    children = dict()
+    stack = [(0, root)]
+    while len(stack) > 0:
+        parent_id, container = stack.pop()
+        child_ids = []
+        for element in container:
+            entity_id = int(element.get("id"))
+            entities[entity_id] = (element, parent_id)
+            child_ids.append(entity_id)
+            children_element = element.find("children")
+            if children_element is not None and len(children_element) > 0:
+                stack.append((entity_id, children_element))
+        children[parent_id] = child_ids
+    return entities, children
+
+def get_snapshot_id_hash(root):
+    """
+    This function returns a hash of the ids of all entities in the snapshot with the given root
+    element, together with their classes, names and parents. world.xml doesn't contain any ids, so
+    the entities of the world get theirs in the order they are constructed, which depends on the
+    code of the game as well. The hash tells whether two snapshots of the pristine world numbered
+    the same entities the same way.
+    """
+    entities, _ = index_snapshot(root)
+    id_table = [(entity_id, element.tag, element.get("name"), parent_id)
+                for entity_id, (element, parent_id) in sorted(entities.items())]
+    return hashlib.sha1(repr(id_table).encode("utf-8")).hexdigest()
+
+def get_reordered_suffix(base_items, current_items):
+    """
+    This function compares two lists of items, which are unique within their list, and returns the
+    items at the end of current_items that have to be removed, if they were in base_items, and
+    appended again, in this order, to turn base_items into current_items. Items that are only in
+    base_items are not considered, they have to be removed separately.
+    """
+    current_set = set(current_items)
+    kept_items = [item for item in base_items if item in current_set]
+    length = 0
+    while (length < len(kept_items) and length < len(current_items)
+           and kept_items[length] == current_items[length]):
+        length += 1
+    return current_items[length:]
+
+def compute_delta(base_root, current_root, world_hash):
+    """
+    This function compares the snapshot of the pristine world with the given base_root element to
+    the snapshot with the given current_root element and returns a delta element that only
+    contains the differences. The world_hash identifies the version of the world file the base
+    snapshot was taken from, and the hash of it's ids, which is stored too, the ids the game gave
+    the entities of that world, since the changes refer to the entities by them.
+
+    The delta element contains the header of the current snapshot and a list of changes, which are
+    applied in their order by EngineApp.apply_delta: First, every spawned entity is stored as the
+    element of it's snapshot, but without it's children and connections. Then, the changed names,
+    descriptions and genders ('set'), articles and states of entities follow, and after them, every
+    entity that was moved to another parent or whose position among it's siblings changed is moved
+    to the end of it's parent's children, so that the order of entities is restored exactly.
+    Destroyed entities are moved to no parent at all. At last, the connections of places are cut or
+    built.
+    """
+    delta = ElementTree.Element("delta")
+    delta.attrib.update(current_root.attrib)
+    delta.attrib["world"] = world_hash
+    delta.attrib["ids"] = get_snapshot_id_hash(base_root)
+    base_entities, base_children = index_snapshot(base_root)
+    current_entities, current_children = index_snapshot(current_root)
+    property_changes = []
+    connection_changes = []
+
+    for entity_id, (element, _) in current_entities.items():
+        id_attribute = {"id": str(entity_id)}
+        base_element = base_entities.get(entity_id, (None, None))[0]
+        if base_element is None:
+            spawned_element = ElementTree.Element(element.tag, element.attrib)
+            spawned_element.extend(child for child in element
+                                   if child.tag != "children" and child.tag != "connection")
+            ElementTree.SubElement(delta, "spawn").append(spawned_element)
+            base_connections = []
+        else:
+            changed_attributes = dict(id_attribute)
+            changed_attributes.update((key, value) for (key, value) in element.attrib.items()
+                                      if base_element.get(key) != value)
+            if len(changed_attributes) > 1:
+                property_changes.append(ElementTree.Element("set", changed_attributes))
+
+            article = element.find("article")
+            base_article = base_element.find("article")
+            if article is not None and (base_article is None
+                                        or base_article.attrib != article.attrib):
+                article_attributes = dict(id_attribute)
+                article_attributes.update(article.attrib)
+                property_changes.append(ElementTree.Element("article", article_attributes))
+
+            states = OrderedDict((state.get("key"), state.get("value"))
+                                 for state in element.findall("state"))
+            base_states = OrderedDict((state.get("key"), state.get("value"))
+                                      for state in base_element.findall("state"))
+            reordered_states = get_reordered_suffix(list(base_states), list(states))
+            for key in base_states:
+                if key not in states or key in reordered_states:
+                    property_changes.append(ElementTree.Element("removeState",
+                                                                {"id": str(entity_id), "key": key}))
+            for key, value in states.items():
+                if key in reordered_states or base_states[key] != value:
+                    property_changes.append(ElementTree.Element("state", {"id": str(entity_id),
+                                                                          "key": key,
+                                                                          "value": value}))
+            base_connections = [connection.get("name")
+                                for connection in base_element.findall("connection")]
+
+        connections = [connection.get("name") for connection in element.findall("connection")]
+        reordered_connections = get_reordered_suffix(base_connections, connections)
+        for name in base_connections:
+            if name not in connections or name in reordered_connections:
+                connection_changes.append(ElementTree.Element("disconnect", {"id": str(entity_id),
+                                                                             "name": name}))
+        for name in reordered_connections:
+            connection_changes.append(ElementTree.Element("connect", {"id": str(entity_id),
+                                                                      "name": name}))
+
+    delta.extend(property_changes)
+    for parent_id, child_ids in current_children.items():
+        for entity_id in get_reordered_suffix(base_children.get(parent_id, []), child_ids):
+            ElementTree.SubElement(delta, "move", {"id": str(entity_id), "parent": str(parent_id)})
+    for entity_id, (_, parent_id) in base_entities.items():
+        # The descendants of a destroyed entity are destroyed with it.
+        if entity_id not in current_entities and (parent_id == 0 or parent_id in current_entities):
+            ElementTree.SubElement(delta, "move", {"id": str(entity_id)})
+    delta.extend(connection_changes)
+    return delta
+
+class EngineApp:
+    """
+    The EngineApp contains everything a game needs to run that doesn't depend on the kind of Qt
+    application it runs in. It is meant to be mixed into a Qt application class, before the Qt
+    class in the list of bases, and it's constructor has to be called after the one of the Qt
+    application.
+    """
+
+    def __init__(self, argv):
         self.res_man = StringResourceManager(self)
+        self.transfer_dispatcher = TransferEventDispatcher(self)
+        self.place_graph = PlaceGraph(self)
+        self.command_trie = CommandTrie(self)
+        self.name_index = dict()
+        self.entities_by_id = weakref.WeakValueDictionary()
+        self.next_entity_id = 1
+        self.restored_snapshot = False
+        self.world_snapshot = None
+        self.world_hash = None
+        self.saved_play_time = 0
+        self.session_start = time.monotonic()
 
         self.entity_classes_register = dict()
         self.register_entity_classes([Entity, StaticEntity, Place])
@@ -763,37 +2726,119 @@ class SinglePlayerApp(QApplication):
         else:
             self.save_enabled = True
 
+        # A save slot is selected with '--slot <name>'. Without one, the saves are kept at their
+        # old places in the resources directory.
+        self.save_slot = None
+        if "--slot" in argv and argv.index("--slot") + 1 < len(argv):
+            self.save_slot = argv[argv.index("--slot") + 1]
+            if SLOT_NAME_PATTERN.match(self.save_slot) is None:
+                self.crash("Invalid name of a save slot: " + self.save_slot)
+        if self.save_slot is None:
+            self.save_paths = (SAVE_PATH, BINARY_SAVE_PATH)
+            self.save_journal = SaveJournal(self, JOURNAL_PATH)
+        else:
+            self.save_paths = (get_slot_path(self.save_slot, ".xml"),
+                               get_slot_path(self.save_slot, ".bin"))
+            self.save_journal = SaveJournal(self, get_slot_path(self.save_slot, ".journal"))
+            if self.save_enabled:
+                os.makedirs(SAVES_DIRECTORY, exist_ok=True)
+
+        self.delta_save = "--delta-save" in argv
+        if "--binary-save" in argv:
+            self.auto_saver = AutoSaver(self, self.save_paths[1], True)
+        else:
+            self.auto_saver = AutoSaver(self, self.save_paths[0], False)
+
+        # Scenes wait as long as they say, unless a clock is selected with '--scene-clock <mode>'.
+        # '--skip-delays' is short for '--scene-clock instant'.
+        self.scene_clock = SceneClock(self)
+        if "--skip-delays" in argv:
+            self.scene_clock.set_mode("instant")
+        if "--scene-clock" in argv and argv.index("--scene-clock") + 1 < len(argv):
+            try:
+                self.scene_clock.set_mode(*parse_scene_clock_argument(
+                    argv[argv.index("--scene-clock") + 1]))
+            except ValueError as error:
+                self.crash(str(error))
+
+        # The text area keeps the last SCROLLBACK_LIMIT paragraphs, unless another number is given
+        # with '--scrollback <count>'. 0 keeps all of them.
+        self.scrollback_limit = SCROLLBACK_LIMIT
+        if "--scrollback" in argv and argv.index("--scrollback") + 1 < len(argv):
+            argument = argv[argv.index("--scrollback") + 1]
+            if INTEGER_PATTERN.match(argument) is None or int(argument) < 0:
+                self.crash("Invalid scrollback limit: " + argument)
+            self.scrollback_limit = int(argument)
+
+    def is_headless(self):
+        """
+        This constant method returns whether we run without any widgets, which is the case unless
+        we are mixed into a QApplication.
+        """
+        return not isinstance(self, QApplication)
+
+    def get_scene_clock(self):
+        """
+        This constant method returns the clock that decides how long the delays of scenes last.
+        """
+        return self.scene_clock
+
+    def get_scrollback_limit(self):
+        """
+        This constant method returns the number of paragraphs the text area of the player's window
+        keeps, or 0 if it keeps all of them.
+        """
+        return self.scrollback_limit
+
     def crash(self, error_text, save_world=False):
         """
-        This constant function opens an QErrorMessage with the given error_text and forces python to
-        exit the program. Only call this if a fatal error has happened.
+        This constant function writes the given error_text to stderr and forces python to exit the
+        program. Only call this if a fatal error has happened.
         """
         if save_world:
             self.save_world()
-        error_message = QErrorMessage()
-        error_message.setModal(True)
-        error_message.showMessage(error_text)
-        exit(error_message.exec_())
+        print(error_text, file=sys.stderr)
+        sys.exit(1)
 
     def connect_places(self):
         """
-        This non-constant method calls connect_places to every root child that is a place. It may
-        throw a LookupError and the object may be changed when this happens.
+        This non-constant method builds the connections of every root child that is a place to the
+        places listed in it's connected_places_names and clears them. Every name is only looked up
+        once in our name index. It may throw a LookupError and the object may be changed when this
+        happens.
         """
-        try:
-            for child in self.children():
-                if issubclass(child.__class__, Place):
-                    child.build_all_connections()
-        except LookupError as err:
-            raise err
+        places_by_name = dict()
+        for child in self.children():
+            if not isinstance(child, Place):
+                continue
+            for name in child.connected_places_names:
+                place = places_by_name.get(name)
+                if place is None:
+                    place = self.find_entity(name, Place)
+                    if place is None:
+                        raise LookupError("Could not find the place " + name + "!")
+                    places_by_name[name] = place
+                child.connect_place(place)
+            child.connected_places_names = []
 
     def on_transfer(self, subject, parent, target):
         """
-        This non-constant method passes the on_transfer event to it's children.
+        This non-constant method passes the on_transfer event to all entities that subscribed to
+        it.
         """
-        for child in self.children():
-            if issubclass(child.__class__, Entity):
-                child.on_transfer(subject, parent, target)
+        self.transfer_dispatcher.dispatch(subject, parent, target)
+
+    def get_transfer_dispatcher(self):
+        """
+        This constant method returns the game's transfer event dispatcher.
+        """
+        return self.transfer_dispatcher
+
+    def get_place_graph(self):
+        """
+        This constant method returns the game's place graph.
+        """
+        return self.place_graph
 
     def get_res_man(self):
         """
@@ -801,6 +2846,100 @@ class SinglePlayerApp(QApplication):
         """
         return self.res_man
 
+    def get_command_trie(self):
+        """
+        This constant method returns the game's command trie.
+        """
+        return self.command_trie
+
+    def get_save_journal(self):
+        """
+        This constant method returns the game's save journal.
+        """
+        return self.save_journal
+
+    def get_auto_saver(self):
+        """
+        This constant method returns the game's auto saver.
+        """
+        return self.auto_saver
+
+    def get_save_slot(self):
+        """
+        This constant method returns the name of the save slot that was selected with the '--slot'
+        flag or None if there is none.
+        """
+        return self.save_slot
+
+    def get_play_time(self):
+        """
+        This constant method returns the number of seconds the world was played, including the
+        time of all sessions before the restored save.
+        """
+        return self.saved_play_time + time.monotonic() - self.session_start
+
+    def set_play_time(self, play_time):
+        """
+        This non-constant method sets the number of seconds the world was played until now.
+        """
+        self.saved_play_time = play_time
+        self.session_start = time.monotonic()
+
+    def get_current_place(self):
+        """
+        This constant method returns the name of the entity the player is in or an empty string if
+        there is no player or it is not in an entity.
+        """
+        player = self.find_entity(self.res_man.get_string("core.player.name"))
+        if player is None or not isinstance(player.parent(), Entity):
+            return str()
+        return player.parent().objectName()
+
+    def register_entity(self, entity):
+        """
+        This non-constant method gives the new entity a unique id and returns it.
+        """
+        entity_id = self.next_entity_id
+        self.next_entity_id += 1
+        self.entities_by_id[entity_id] = entity
+        return entity_id
+
+    def set_entity_id(self, entity, entity_id):
+        """
+        This non-constant method changes the id of the given entity, which is done when it is
+        restored from a save.
+        """
+        if self.entities_by_id.get(entity.entity_id) is entity:
+            del self.entities_by_id[entity.entity_id]
+        entity.entity_id = entity_id
+        self.entities_by_id[entity_id] = entity
+        self.next_entity_id = max(self.next_entity_id, entity_id + 1)
+
+    def get_entity_by_id(self, entity_id):
+        """
+        This constant method returns the entity with the given id or None if it doesn't exist.
+        """
+        return self.entities_by_id.get(entity_id)
+
+    def register_commands(self, commands):
+        """
+        This non-constant method registers new command groups the player can enter. commands is a
+        list of pairs of a resource string key, which points to the element with the group's
+        verbs, and a handler, which is called with the gameplay parser as it's only argument when
+        one of the verbs is entered.
+        """
+        for key, handler in commands:
+            self.command_trie.register_group(key, handler)
+
+    def find_entity(self, name, entity_class=None, recursive=True):
+        """
+        This constant method returns the entity in the world with the given name, or None if it
+        doesn't exist. If entity_class is given, only instances of it are found and if recursive is
+        False, only root entities are found. Since we keep an index of all names, this doesn't need
+        to walk the tree.
+        """
+        return find_indexed_entity(self, name, entity_class, recursive)
+
     def register_entity_classes(self, entity_classes):
         """
         This non-constant method registers a new entity class that can be used in xml generation and
@@ -817,39 +2956,342 @@ class SinglePlayerApp(QApplication):
         """
         return self.entity_classes_register.get(name)
 
-    def save_world(self):
+    def get_entity_class_names(self):
         """
-        This constant method saves the complete state of the world into an XML file located in
-        "Resources/save.xml" if saving wasn't disabled by the '-n' flag.
+        This constant method returns a list of the names of all registered entity classes, in the
+        order they were registered in.
+        """
+        return list(self.entity_classes_register.keys())
+
+    def take_snapshot(self):
+        """
+        This constant method returns an element tree that contains the complete state of the world.
+        The attributes of it's root are the header of the save: Besides the sequence number of the
+        last included change and the next entity id, they contain the name of the current place,
+        the play time in seconds, the time the snapshot was taken as a unix timestamp and the
+        SAVE_FORMAT_VERSION. Slot browsers read them with read_save_header.
+        """
+        root = ElementTree.Element("save")
+        root.attrib["sequence"] = str(self.save_journal.get_sequence_number())
+        root.attrib["nextId"] = str(self.next_entity_id)
+        root.attrib["place"] = self.get_current_place()
+        root.attrib["playTime"] = str(int(self.get_play_time()))
+        root.attrib["timestamp"] = str(int(time.time()))
+        root.attrib["version"] = str(SAVE_FORMAT_VERSION)
+        tree = ElementTree.ElementTree(root)
+
+        for child in self.children():
+            if issubclass(child.__class__, Entity):
+                child.to_etree_element(tree.getroot())
+        return tree
+
+    def save_world(self, wait=True):
+        """
+        This non-constant method saves a snapshot of the complete state of the world, if saving
+        wasn't disabled by the '-n' flag, and starts a new segment of the save journal. The snapshot
+        is written by the auto saver on it's worker thread to the XML save of our slot or, if the
+        '--binary-save' flag was given, to the binary one. If the '--delta-save' flag was given,
+        only the differences to the pristine world are written. If wait is True, we wait until it
+        was written.
         """
         if self.save_enabled:
-            tree = ElementTree.ElementTree(ElementTree.Element("save"))
+            start_time = time.perf_counter()
+            tree = self.take_snapshot()
+            self.save_journal.start_segment()
+            snapshot_cost = time.perf_counter() - start_time
+            if self.delta_save and self.world_snapshot is not None:
+                base = (self.world_snapshot, self.world_hash)
+            else:
+                base = None
+            self.auto_saver.save(tree, self.save_journal.get_sequence_number(), snapshot_cost, base,
+                                 wait)
+
+    def start_journal(self):
+        """
+        This non-constant method replays all changes from the save journal that are newer than the
+        restored snapshot, saves a new snapshot and starts recording changes and autosaving, if
+        saving wasn't disabled by the '-n' flag. It has to be called after the world was restored
+        and the places were connected. It may raise a LookupError if a change could not be replayed.
+        """
+        if not self.save_enabled:
+            return
+        if self.restored_snapshot:
+            # Entities without a parent are only kept alive by their references in the game's code,
+            # so we have to keep them until the replay is done.
+            replayed_entities = []
+            for record in self.save_journal.read_records():
+                replayed_entities.append(self.replay_change(record))
+                self.save_journal.set_sequence_number(record[0])
+        self.save_world()
+        self.auto_saver.start()
+
+    def replay_change(self, record):
+        """
+        This non-constant method applies a change that was read from the save journal and returns
+        the changed entity. It raises a LookupError if the change could not be applied.
+        """
+        operation, entity_id, arguments = record[1], record[2], record[3:]
+        if operation == "spawn":
+            entity_class = self.lookup_entity_class(arguments[0])
+            if entity_class is None:
+                raise LookupError("Could not find the entity class " + arguments[0] + "!")
+            entity = entity_class()
+            self.set_entity_id(entity, entity_id)
+            return entity
+
+        entity = self.get_entity_by_id(entity_id)
+        if entity is None:
+            raise LookupError("Could not find the entity " + str(entity_id) + " in the journal!")
+        if operation == "parent":
+            if arguments[0] is None:
+                entity.setParent(None)
+            elif arguments[0] == 0:
+                entity.setParent(self)
+            else:
+                entity.setParent(self.get_entity_by_id(arguments[0]))
+        elif operation == "name":
+            entity.setObjectName(arguments[0])
+        elif operation == "attribute":
+            setattr(entity, arguments[0], arguments[1])
+        elif operation == "state":
+            entity.set_state(arguments[0], arguments[1])
+        elif operation == "removeState":
+            entity.remove_state(arguments[0])
+        elif operation == "connect":
+            entity.connect_place(self.get_entity_by_id(arguments[0]))
+        elif operation == "disconnect":
+            entity.disconnect_place(self.get_entity_by_id(arguments[0]).objectName())
+        else:
+            raise LookupError("Illegal journal operation " + operation + "!")
+        return entity
+
+    def restore_world(self, save_path=None):
+        """
+        This non-constant method restores the complete world from the save file at save_path, which
+        may be in the XML or the binary format. If save_path is None, it uses the newer one of the
+        XML and the binary save of our slot and if none of them exists, it tries to read from
+        WORLD_PATH. A save of a newer SAVE_FORMAT_VERSION is refused with a LookupError.
+        If the save only contains the differences to the pristine world, the world is read from
+        WORLD_PATH and the differences are applied to it. If the file does not exist, it will raise
+        a FileNotFoundError. Also, it may raise any kind of exception if something in the process
+        went wrong. If this is the case, the world will be in a valid but changed state.
+
+        If the '--delta-save' flag was given, it also takes a snapshot of the pristine world, which
+        the later saves are compared to. Since this requires the connections of the places, they
+        are built here in this case.
+        """
+        if save_path is None:
+            save_paths = [path for path in self.save_paths if os.path.exists(path)]
+            if len(save_paths) > 0:
+                save_path = max(save_paths, key=os.path.getmtime)
+            else:
+                save_path = WORLD_PATH
+        events = iterparse_save(save_path)
+        _, root = next(events)
+
+        if int(root.get("version", SAVE_FORMAT_VERSION)) > SAVE_FORMAT_VERSION:
+            raise LookupError("The save was made by a newer version of the game!")
+        self.restored_snapshot = "sequence" in root.attrib
+        if self.restored_snapshot:
+            self.save_journal.set_sequence_number(int(root.attrib["sequence"]))
+            saved_next_id = int(root.attrib.get("nextId", 1))
+            self.set_play_time(int(root.get("playTime", 0)))
+
+        if root.tag == "delta" or (self.delta_save and self.restored_snapshot):
+            # The delta or the complete save is needed as a whole, so we read all of it.
+            for _ in events:
+                pass
+            # The ids of the saved entities are the ones they got when the world was read.
+            with open(WORLD_PATH, "rb") as world_file:
+                self.world_hash = hashlib.sha1(world_file.read()).hexdigest()
+            if root.tag == "delta" and root.get("world") != self.world_hash:
+                raise LookupError("The save was made for another version of the world!")
+            world_events = iterparse_save(WORLD_PATH)
+            _, world_root = next(world_events)
+            self.load_entities(world_root, world_events)
+            self.connect_places()
+            if self.delta_save:
+                self.world_snapshot = self.take_snapshot()
+            if root.tag == "delta":
+                world_snapshot = self.world_snapshot
+                if world_snapshot is None:
+                    world_snapshot = self.take_snapshot()
+                if root.get("ids") != get_snapshot_id_hash(world_snapshot.getroot()):
+                    raise LookupError("The save was made by a version of the game that numbers "
+                                      "the entities of the world differently!")
+            else:
+                # A complete save is turned into a delta, so that it can be applied to the world.
+                root = compute_delta(self.world_snapshot.getroot(), root, self.world_hash)
+            self.apply_delta(root)
+        else:
+            if self.restored_snapshot:
+                self.next_entity_id = max(self.next_entity_id, saved_next_id)
+            self.load_entities(root, events)
+            if self.delta_save:
+                with open(save_path, "rb") as world_file:
+                    self.world_hash = hashlib.sha1(world_file.read()).hexdigest()
+                self.connect_places()
+                self.world_snapshot = self.take_snapshot()
+
+        if self.restored_snapshot:
+            # The restored entities got new ids before they read their saved ones, which are free
+            # again now.
+            self.next_entity_id = max([saved_next_id] + [entity_id + 1 for entity_id
+                                                         in self.entities_by_id.keys()])
+
+    def load_entities(self, root, events):
+        """
+        This non-constant method creates the entities described by a save or world file as our
+        children. The file is given as it's root element and an iterator of the events after the
+        start of it, as returned by iterparse_save. Every entity is created when it's element
+        starts, so that it's children can be created with it as their parent, and it is restored
+        with from_etree_element when it's element ends. Afterwards, the element is dropped, so only
+        the elements of the current entity and it's ancestors are kept in memory.
+        """
+        # Each entry of the stack is an open element, the entity it belongs to and whether it is
+        # the element of the entity, contains entities or is anything else. The first entry stands
+        # for the root element.
+        stack = [(root, self, "entities")]
+        for event, element in events:
+            if event == "start":
+                _, entity, kind = stack[-1]
+                if kind == "entities":
+                    entity_class = self.lookup_entity_class(element.tag)
+                    if entity_class is None:
+                        raise LookupError("Could not find the entity class " + element.tag + "!")
+                    stack.append((element, entity_class(entity), "entity"))
+                elif kind == "entity" and element.tag == "children":
+                    stack.append((element, entity, "entities"))
+                else:
+                    stack.append((element, None, "other"))
+                continue
+
+            _, entity, kind = stack.pop()
+            if kind == "entity":
+                # The children of the entity were already restored and dropped.
+                children_element = element.find("children")
+                if children_element is not None:
+                    element.remove(children_element)
+                entity.from_etree_element(element)
+                element.clear()
+                stack[-1][0].remove(element)
+
+    def apply_delta(self, delta):
+        """
+        This non-constant method applies the changes of the given delta element, as created by
+        compute_delta, to the world. It raises a LookupError if a change could not be applied.
+        """
+        # Spawned entities are only kept alive by this list until they are moved to their parents.
+        spawned_entities = []
+        for change in delta:
+            if change.tag == "spawn":
+                element = change[0]
+                entity_class = self.lookup_entity_class(element.tag)
+                if entity_class is None:
+                    raise LookupError("Could not find the entity class " + element.tag + "!")
+                entity = entity_class()
+                entity.from_etree_element(element)
+                spawned_entities.append(entity)
+                continue
+
+            entity = self.get_entity_by_id(int(change.get("id")))
+            if entity is None:
+                raise LookupError("Could not find the entity " + change.get("id") + " in the save!")
+            if change.tag == "set":
+                for key, value in change.attrib.items():
+                    if key == "name":
+                        entity.setObjectName(value)
+                    elif key != "id":
+                        setattr(entity, key, value)
+            elif change.tag == "article":
+                entity.show_article = change.get("shown") == "True"
+                entity.use_definite_article = change.get("definite") == "True"
+            elif change.tag == "state":
+                entity.set_state(change.get("key"), int(change.get("value")))
+            elif change.tag == "removeState":
+                entity.remove_state(change.get("key"))
+            elif change.tag == "move":
+                parent_id = change.get("parent")
+                if parent_id is None:
+                    parent = None
+                elif parent_id == "0":
+                    parent = self
+                else:
+                    parent = self.get_entity_by_id(int(parent_id))
+                # Moving an entity to it's own parent doesn't change it's position.
+                if parent is not None and entity.parent() is parent:
+                    entity.setParent(None)
+                entity.setParent(parent)
+            elif change.tag == "connect":
+                place = self.find_entity(change.get("name"), Place)
+                if place is None:
+                    raise LookupError("Could not find the place " + change.get("name") + "!")
+                entity.connect_place(place)
+            elif change.tag == "disconnect":
+                entity.disconnect_place(change.get("name"))
+            else:
+                raise LookupError("Illegal change " + change.tag + " in the save!")
+
+class SinglePlayerApp(EngineApp, QApplication):
+    """
+    The SinglePlayerApp runs the game in a window.
+    """
+
+    def __init__(self, argv):
+        QApplication.__init__(self, argv)
+        EngineApp.__init__(self, argv)
+
+    def is_headless(self):
+        """
+        This overriden, constant method returns False, since we always show the game in a window.
+        """
+        return False
+
+    def crash(self, error_text, save_world=False):
+        """
+        This constant function opens an QErrorMessage with the given error_text and forces python to
+        exit the program. Only call this if a fatal error has happened.
+        """
+        if save_world:
+            self.save_world()
+        error_message = QErrorMessage()
+        error_message.setModal(True)
+        error_message.showMessage(error_text)
+        exit(error_message.exec_())
+
+class HeadlessApp(EngineApp, QCoreApplication):
+    """
+    The HeadlessApp runs the game without any widgets, for example on a server or in batch jobs.
+    Everything the game shows is passed to the output sink, which is a callable that takes the
+    text of a paragraph, and commands are entered through the window of the player, which is a
+    Gameplay.HeadlessWindow. If the sink is None, the paragraphs are collected in that window.
 
-            for child in self.children():
-                if issubclass(child.__class__, Entity):
-                    child.to_etree_element(tree.getroot())
+    Since the game looks up it's resources through the application instance, there can only be
+    one session per process at a time.
+    """
 
-            tree.write("Resources/save.xml", encoding="UTF-16", xml_declaration=True)
+    def __init__(self, argv, output_sink=None):
+        QCoreApplication.__init__(self, argv)
+        EngineApp.__init__(self, argv)
+        self.output_sink = output_sink
 
-    def restore_world(self):
+    def is_headless(self):
         """
-        This non-constant method restores the complete world from an XML file located in
-        "Resources/save.xml". If this file does not exist, it tries to read from
-        "Resources/world.xml" and if this does not exist too, it will raise a FileNotFoundError.
-        Also, it may raise any kind of exception if something in the process went wrong. If this is
-        the case, the world will be in a valid but changed state.
+        This overriden, constant method returns True, since we never create any widgets.
         """
-        save_path = "Resources/save.xml"
-        if not os.path.exists(save_path):
-            save_path = "Resources/world.xml"
-        tree = ElementTree.parse(save_path)
+        return True
 
-        for child in list(tree.getroot()):
-            entity_class = self.lookup_entity_class(child.tag)
-            if entity_class is None:
-                raise LookupError("Could not find the entity class " + child.tag + "!")
-            new_entity = entity_class(self)
-            try:
-                new_entity.from_etree_element(child)
-            except Exception as err:
-                raise err
+    def get_output_sink(self):
+        """
+        This constant method returns the callable that receives the game's output or None.
+        """
+        return self.output_sink
+
+    def get_player_window(self):
+        """
+        This constant method returns the window of the player or None if there is no player.
+        """
+        player = self.find_entity(self.res_man.get_string("core.player.name"))
+        if player is None:
+            return None
+        return player.get_window()
@@ -17,8 +17,8 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from PyQt5.QtCore import Qt, QCoreApplication, QObject, pyqtSignal, QEvent
-from PyQt5.QtGui import QColor
+from PyQt5.QtCore import Qt, QCoreApplication, QObject, pyqtSignal, QEvent, QTimer
+from PyQt5.QtGui import QColor, QTextCursor
 from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QLineEdit
 from PyQt5.QtWidgets import QMenuBar, QPushButton
 from Source.EngineL import Core, Scene
@@ -92,6 +92,14 @@ class ClientWindow(QMainWindow):
     """
     This is the game's main window. It abstracts the single elements of the window into single
     methods one can call and use.
+
+    The text area only keeps the last paragraphs, as many as our scrollback limit says, and drops
+    the older ones, so that long sessions don't get slower and slower. Since dropping paragraphs
+    means laying out all remaining ones again, the text area may grow by a quarter of the limit
+    before they are dropped in one go. Also, shown text isn't put into the text area right away:
+    Everything that is shown while the event loop runs the same event, like the many paragraphs of
+    a scene, is collected and put into it as one edit, with a single scroll, when the event loop
+    gets back to us.
     """
 
     return_pressed = pyqtSignal()
@@ -120,6 +128,14 @@ class ClientWindow(QMainWindow):
         self.text_area.setReadOnly(True)
         self.text_area.setObjectName("text_area")
         vertical_layout.addWidget(self.text_area)
+        self.scrollback_limit = QCoreApplication.instance().get_scrollback_limit()
+
+        # The paragraphs that are not in the text area yet, as tuples of their color and text.
+        self.pending_paragraphs = []
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(0)
+        self.flush_timer.timeout.connect(self.flush_paragraphs)
 
         self.command_row = QWidget(central_widget)
         self.command_row.setObjectName("command_row")
@@ -157,10 +173,42 @@ class ClientWindow(QMainWindow):
 
     def get_text_area(self):
         """
-        This constant method returns our text area widget.
+        This non-constant method returns our text area widget, after putting all pending paragraphs
+        into it.
         """
+        self.flush_paragraphs()
         return self.text_area
 
+    def get_scrollback_limit(self):
+        """
+        This constant method returns the number of paragraphs our text area keeps, or 0 if it keeps
+        all of them.
+        """
+        return self.scrollback_limit
+
+    def set_scrollback_limit(self, limit):
+        """
+        This non-constant method sets the number of paragraphs our text area keeps. If it is 0, all
+        of them are kept. If there are more paragraphs than this, the oldest ones are dropped now.
+        """
+        self.scrollback_limit = limit
+        cursor = QTextCursor(self.text_area.document())
+        cursor.beginEditBlock()
+        self.trim_text_area(cursor, 0)
+        cursor.endEditBlock()
+
+    def trim_text_area(self, cursor, slack):
+        """
+        This non-constant method uses the given cursor to drop the oldest paragraphs of our text
+        area, if it has more than our scrollback limit plus the given slack, so that the limit is
+        met again.
+        """
+        excess = self.text_area.document().blockCount() - self.scrollback_limit
+        if self.scrollback_limit > 0 and excess > slack:
+            cursor.movePosition(QTextCursor.Start)
+            cursor.movePosition(QTextCursor.NextBlock, QTextCursor.KeepAnchor, excess)
+            cursor.removeSelectedText()
+
     def get_command_text(self, show_command=False, clear_prompt=False):
         """
         This non-constant method Returns the text of the command prompt widget. If show_command is
@@ -181,8 +229,40 @@ class ClientWindow(QMainWindow):
     def scroll_text_area_down(self):
         """
         This non-constant method scrolls our text area down until the end of our text is visible.
+        If there are pending paragraphs, this happens when they are put into the text area.
+        """
+        if len(self.pending_paragraphs) == 0:
+            scroll_bar = self.text_area.verticalScrollBar()
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    def add_paragraph(self, color, text):
         """
-        self.text_area.ensureCursorVisible()
+        This non-constant method adds a paragraph with the given color and text to the pending
+        ones, which are put into the text area when the event loop gets back to us.
+        """
+        self.pending_paragraphs.append((color, text))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush_paragraphs(self):
+        """
+        This non-constant method puts all pending paragraphs into our text area as a single edit,
+        so that the document is only laid out and trimmed once, and scrolls it down.
+        """
+        if len(self.pending_paragraphs) == 0:
+            return
+        self.flush_timer.stop()
+        paragraphs, self.pending_paragraphs = self.pending_paragraphs, []
+
+        # While the edit block is open, the document isn't laid out.
+        cursor = QTextCursor(self.text_area.document())
+        cursor.beginEditBlock()
+        for color, text in paragraphs:
+            self.text_area.setTextColor(color)
+            self.text_area.append(text)
+        self.trim_text_area(cursor, self.scrollback_limit // 4)
+        cursor.endEditBlock()
+        self.scroll_text_area_down()
 
     def show_text(self, text, emplace_res_strings=True, add_html_tags=True):
         """
@@ -191,14 +271,11 @@ class ClientWindow(QMainWindow):
         it and if add_html_tags is True (default), it will add tags to the text that indicate that
         it should be handled as an HTML snippet.
         """
-        self.text_area.setTextColor(QColor(0, 0, 0))
         if emplace_res_strings:
             text = Core.get_res_man().decode_string(text)
         if add_html_tags:
             text = '<html><body>' + text + '</body></html>'
-        self.text_area.append(text)
-        self.text_area.show()
-        self.scroll_text_area_down()
+        self.add_paragraph(QColor(0, 0, 0), text)
 
     def show_command(self, text):
         """
@@ -206,8 +283,7 @@ class ClientWindow(QMainWindow):
         and adds a "> " to show that the given text is a command or something else the user said or
         did.
         """
-        self.text_area.setTextColor(QColor(125, 125, 125))
-        self.text_area.append("> " + text)
+        self.add_paragraph(QColor(125, 125, 125), "> " + text)
 
     def clear_command_row(self):
         """
@@ -251,6 +327,199 @@ class ClientWindow(QMainWindow):
         QCoreApplication.instance().save_world()
         event.accept()
 
+class HeadlessOptionButton(QObject):
+    """
+    This is the stand-in for an option button of the HeadlessWindow. It has the same signals as a
+    QPushButton and is clicked by the HeadlessWindow when an option is chosen.
+    """
+
+    pressed = pyqtSignal()
+    clicked = pyqtSignal()
+
+    def __init__(self, text, parent=None):
+        QObject.__init__(self, parent)
+        self.button_text = text
+        self.down = False
+
+    def text(self):
+        """
+        This constant method returns our text.
+        """
+        return self.button_text
+
+    def isDown(self):
+        """
+        This constant method returns whether we are currently pressed.
+        """
+        return self.down
+
+    def click(self):
+        """
+        This non-constant method presses and releases us like a mouse click would do.
+        """
+        self.down = True
+        self.pressed.emit()
+        self.down = False
+        self.clicked.emit()
+
+class HeadlessWindow(QObject):
+    """
+    This is the player's window when the game runs without widgets. It has the same methods as the
+    ClientWindow, but passes every paragraph it shows to the output sink, a callable that takes
+    the paragraph's text. If there is no sink, the paragraphs are collected in our output list.
+    Commands are entered with enter_command and options are chosen with choose_option.
+    """
+
+    return_pressed = pyqtSignal()
+
+    def __init__(self, output_sink=None):
+        QObject.__init__(self)
+
+        self.command_stack = []
+        self.output = []
+        self.output_sink = output_sink
+        self.title = self.raw_title = Core.get_res_man().get_string("core.windowTitle")
+
+        self.command_line_enabled = True
+        self.command_text = str()
+        self.option_buttons = []
+
+    def get_raw_title(self):
+        """
+        This constant method returns our raw window title.
+        """
+        return self.raw_title
+
+    def windowTitle(self):
+        """
+        This constant method returns our current window title.
+        """
+        return self.title
+
+    def setWindowTitle(self, title):
+        """
+        This non-constant method sets our current window title.
+        """
+        self.title = title
+
+    def get_command_stack(self):
+        """
+        This constant method returns a stack with all commands we ran.
+        """
+        return self.command_stack
+
+    def stack_command(self, command_text):
+        """
+        This non-constant method puts another command on our command stack.
+        """
+        self.command_stack.append(command_text)
+
+    def get_output(self):
+        """
+        This constant method returns all paragraphs we have shown, if there is no output sink.
+        """
+        return self.output
+
+    def write(self, text):
+        """
+        This non-constant method passes the given paragraph to our output sink or collects it.
+        """
+        if self.output_sink is None:
+            self.output.append(text)
+        else:
+            self.output_sink(text)
+
+    def enter_command(self, command_text):
+        """
+        This non-constant method enters the given command like a user pressing return in the
+        command line would do. It returns False if there is no command line at the moment, for
+        example while a scene waits for an option to be chosen, and True otherwise.
+        """
+        if not self.command_line_enabled:
+            return False
+        self.command_text = command_text
+        self.return_pressed.emit()
+        return True
+
+    def is_busy(self):
+        """
+        This constant method returns whether we can neither take a command nor an option at the
+        moment, which is the case while a scene is playing.
+        """
+        return not self.command_line_enabled and len(self.option_buttons) == 0
+
+    def get_option_texts(self):
+        """
+        This constant method returns the texts of all options that can be chosen at the moment.
+        """
+        return [button.text() for button in self.option_buttons]
+
+    def choose_option(self, index):
+        """
+        This non-constant method clicks the option button with the given index. It raises an
+        IndexError if there is no such option.
+        """
+        self.option_buttons[index].click()
+
+    def get_command_text(self, show_command=False, clear_prompt=False):
+        """
+        This non-constant method returns the entered command text. If show_command is True, it will
+        also show the entered text and if clear_prompt is True, it will also add the command to our
+        command stack and clear the prompt.
+        """
+        if self.command_line_enabled:
+            text = self.command_text
+            if show_command and len(text) > 0:
+                self.show_command(text)
+            if clear_prompt:
+                self.stack_command(text)
+                self.command_text = str()
+            return text
+        else:
+            return str()
+
+    def show_text(self, text, emplace_res_strings=True, add_html_tags=True):
+        """
+        This non-constant method shows the given text as it's own paragraph. If emplace_res_strings
+        is True (default), it will also decode resource string keys in it. Since there is no text
+        area to render them, add_html_tags is ignored.
+        """
+        if emplace_res_strings:
+            text = Core.get_res_man().decode_string(text)
+        self.write(text)
+
+    def show_command(self, text):
+        """
+        This non-constant method shows the given text with a leading "> " to show that the given
+        text is a command or something else the user said or did.
+        """
+        self.write("> " + text)
+
+    def clear_command_row(self):
+        """
+        This non-constant method removes the command line and all option buttons.
+        """
+        for button in self.option_buttons:
+            button.setParent(None)
+        self.option_buttons = []
+        self.command_line_enabled = False
+        self.command_text = str()
+
+    def add_command_line(self):
+        """
+        This non-constant method adds the command line again.
+        """
+        self.command_line_enabled = True
+
+    def add_option_button(self, text):
+        """
+        This non-constant method adds an option button with the given text and returns it. The text
+        may contain unresolved resource string keys as they will be resolved inside this method.
+        """
+        button = HeadlessOptionButton(Core.get_res_man().decode_string(text), self)
+        self.option_buttons.append(button)
+        return button
+
 class GameplayParser(QObject):
     """
     The GameplayParser takes entered commands and interprets them.
@@ -262,6 +531,8 @@ class GameplayParser(QObject):
         self.window = parent.get_window()
         self.split_text = []
         self.used_words = 0
+        self.ignored_words = None
+        Core.get_res_man().strings_loaded.connect(self.invalidate_ignored_words)
 
     def command_entered(self):
         """
@@ -276,64 +547,45 @@ class GameplayParser(QObject):
 
         self.identify_command()
 
-    def filter_ignored_words(self):
+    def get_ignored_words(self):
         """
-        This non-constant method gets all ignored words from the resources manager and removes
-        every appearence from our split_text.
+        This non-constant method returns the set of all ignored words. They are read from the
+        resources manager only once and again after the string tables were reloaded.
         """
-        parsers_root = Core.get_res_man().get_element("core.gameplayParser")
-        ignored_words = []
-        for word in parsers_root.findall("ignoreWord"):
-            ignored_words.append(word.text)
+        if self.ignored_words is None:
+            ignored_words = Core.get_res_man().get_string_list("core.gameplayParser.ignoreWord")
+            self.ignored_words = frozenset(Core.fold_word(word) for word in ignored_words)
+        return self.ignored_words
 
-        index = 0
-        while index < len(self.split_text):
-            if self.split_text[index] in ignored_words:
-                del self.split_text[index]
-            else:
-                index += 1
+    def invalidate_ignored_words(self):
+        """
+        This non-constant method drops the set of ignored words, so that it is read again.
+        """
+        self.ignored_words = None
 
-    def identify_command(self):
+    def filter_ignored_words(self):
         """
-        This non-constant method identifies and executes the previously read command.
+        This non-constant method removes every appearence of an ignored word from our split_text,
+        regardless of it's case.
         """
-        string_collection = Core.get_res_man().get_element("core.gameplayParser")
+        ignored_words = self.get_ignored_words()
+        self.split_text = [word for word in self.split_text
+                           if Core.fold_word(word) not in ignored_words]
 
+    def identify_command(self):
+        """
+        This non-constant method identifies and executes the previously read command by looking up
+        the longest registered verb at the beginning of our split_text in the command trie.
+        """
         if len(self.split_text) == 0:
-            pass
-        elif self.compare_commands_with_text(string_collection.find("lookAt").findall("command")):
-            self.exec_look_at()
-        elif self.compare_commands_with_text(string_collection.find("walkTo").findall("command")):
-            self.exec_walk_to()
-        elif self.compare_commands_with_text(string_collection.find("pickUp").findall("command")):
-            self.exec_pick_up()
-        elif self.compare_commands_with_text(string_collection.find("drop").findall("command")):
-            self.exec_drop()
-        elif self.compare_commands_with_text(string_collection.find("combine").findall("command")):
-            self.exec_combine()
-        elif self.compare_commands_with_text(string_collection.find("talk").findall("command")):
-            self.exec_talk()
-        else:
-            self.exec_invalid_command()
+            return
 
-    def compare_commands_with_text(self, commands):
-        """
-        This non-constant method iterates through the given etree elements (commands) and compares
-        their text with the beginning of our split_text. If one of those commands is equal to the
-        beginning of our split_text, it returns True and False if not.
-        """
-        for command in commands:
-            command = command.text.split()
-            if len(command) > len(self.split_text):
-                continue
-            matches = True
-            for i in range(0, len(command)):
-                if self.split_text[i] != command[i]:
-                    matches = False
-            if matches:
-                self.used_words = len(command)
-                return True
-        return False
+        handler, used_words = Core.get_command_trie().match(self.split_text)
+        if handler is None:
+            self.exec_invalid_command()
+        else:
+            self.used_words = used_words
+            handler(self)
 
     def get_argument(self):
         """
@@ -379,14 +631,16 @@ class GameplayParser(QObject):
         key_inventory = "core.gameplayParser.lookAt.keyword.inventory"
         keyword_inventory = Core.get_res_man().get_string(key_inventory)
 
+        normalized_name = Core.normalize_name(target_name)
         if len(target_name) == 0:
             self.window.show_text(place.generate_description())
-        elif target_name == keyword_place or target_name == place.objectName():
+        elif normalized_name in (Core.normalize_name(keyword_place),
+                                 Core.normalize_name(place.objectName())):
             self.window.show_text(place.generate_description())
-        elif target_name == keyword_inventory:
+        elif normalized_name == Core.normalize_name(keyword_inventory):
             self.window.show_text(self.parent().generate_inventory_list(empty_note=True) + ".")
         else:
-            target = place.findChild(Core.Entity, target_name)
+            target = place.resolve_entity(target_name)
             if target is None:
                 self.window.show_text("${core.gameplayParser.invalidTargetMessage}")
             else:
@@ -398,12 +652,7 @@ class GameplayParser(QObject):
         and transfering our parent, the player, to it. If it fails, it will post a message to the
         player that tells him so and nothing will be changed.
         """
-        try:
-            target = self.parent().parent().get_connected_place(self.get_argument_as_string())
-        except LookupError:
-            self.window.show_text("${core.gameplayParser.invalidTargetMessage}")
-            return
-
+        target = self.parent().parent().resolve_connected_place(self.get_argument_as_string())
         if target is None:
             self.window.show_text("${core.gameplayParser.invalidTargetMessage}")
             return
@@ -421,7 +670,7 @@ class GameplayParser(QObject):
         """
         target_name = self.get_argument_as_string()
         place = self.parent().parent()
-        target = place.findChild(Core.Entity, target_name)
+        target = place.resolve_entity(target_name)
         if target is None:
             self.window.show_text("${core.gameplayParser.invalidTargetMessage}")
         elif not target.transfer(self.parent()):
@@ -434,7 +683,7 @@ class GameplayParser(QObject):
         it will post a message to the player that tells him so and nothing will be changed.
         """
         target_name = self.get_argument_as_string()
-        target = self.parent().findChild(Core.Entity, target_name, Qt.FindDirectChildrenOnly)
+        target = self.parent().resolve_entity(target_name, recursive=False)
         if target is None:
             self.window.show_text("${core.gameplayParser.invalidTargetMessage}")
         elif not target.transfer(self.parent().parent()):
@@ -454,9 +703,10 @@ class GameplayParser(QObject):
 
         # Find the combination argument separator, usually 'with'.
         separator = Core.get_res_man().get_string("core.gameplayParser.combine.argumentSeparator")
+        separator = Core.fold_word(separator)
         separator_position = -1
         for i in range(0, len(argument)):
-            if argument[i] == separator:
+            if Core.fold_word(argument[i]) == separator:
                 separator_position = i
                 break
 
@@ -480,14 +730,14 @@ class GameplayParser(QObject):
             arg_b_name += argument[len(argument)-1]
 
             # Find entity B, which is only if an entity B is mentioned
-            arg_b = self.parent().parent().findChild(Core.Entity, arg_b_name)
+            arg_b = self.parent().parent().resolve_entity(arg_b_name)
             if arg_b is None:
                 text = "${core.gameplayParser.invalidTargetMessage}"
                 self.window.show_text(text)
                 return
 
         # Find entity A, which is always needed.
-        arg_a = self.parent().parent().findChild(Core.Entity, arg_a_name)
+        arg_a = self.parent().parent().resolve_entity(arg_a_name)
         if arg_a is None:
             text = "${core.gameplayParser.invalidTargetMessage}"
             self.window.show_text(text)
@@ -523,8 +773,12 @@ class Player(Core.Entity):
         self.gender = "f"
         self.show_article = False
 
-        self.window = ClientWindow()
-        self.window.show()
+        app = QCoreApplication.instance()
+        if app.is_headless():
+            self.window = HeadlessWindow(app.get_output_sink())
+        else:
+            self.window = ClientWindow()
+            self.window.show()
 
         self.gameplay_parser = GameplayParser(self)
 
@@ -546,10 +800,12 @@ class Player(Core.Entity):
 
     def on_game_launched(self):
         """
-        This constant, overriden method gets called when the game has just started. It shows the
-        description of our current place in the text area and updates our window title.
+        This constant, overriden method gets called when the game has just started. It starts
+        reading the scenes around us ahead of time, shows the description of our current place in
+        the text area and updates our window title.
         """
         Core.Entity.on_game_launched(self)
+        Scene.get_prefetcher().prefetch_around(self.parent())
         self.update_window_title()
         self.get_window().show_text(self.parent().generate_description())
         if self.get_state("first run") == 1:
@@ -563,16 +819,24 @@ class Player(Core.Entity):
         new_title = self.parent().objectName() + " | " + self.get_window().get_raw_title()
         self.get_window().setWindowTitle(new_title)
 
+    def subscribe_transfer_events(self):
+        """
+        This overriden, non-constant method subscribes us to all transfers of ourselves, from us
+        and to us.
+        """
+        Core.get_transfer_dispatcher().subscribe(self, subject=self, parent=self, target=self)
+
     def on_transfer(self, subject, parent, target):
         """
         This constant, overriden method does two things: First, if we are the the subject and we
         moved to a place that is not marked as visited, we will display the the description of this
-        place. Second, if we are the target, we will post a message telling that we received a new
-        item.
+        place and start reading the scenes around it ahead of time. Second, if we are the target, we
+        will post a message telling that we received a new item.
         """
         Core.Entity.on_transfer(self, subject, parent, target)
 
         if subject == self:
+            Scene.get_prefetcher().prefetch_around(target)
             self.get_window().show_text(target.generate_description())
 
         if target == self:
@@ -585,6 +849,7 @@ class Player(Core.Entity):
             message += subject.objectName() + " ${core.player.itemLostEnding}"
             self.get_window().show_text(message)
 
+    @Core.cached_description
     def generate_inventory_list(self, empty_note=False):
         """
         This constant method is an exact copy of the Entity's generate_inventory_list, but it
@@ -628,3 +893,16 @@ def register_entity_classes(app):
     This function registers all of our new Entity classes to the given application instance.
     """
     app.register_entity_classes([Player])
+
+def register_commands(app):
+    """
+    This function registers all of our commands to the given application instance.
+    """
+    app.register_commands([
+        ("core.gameplayParser.lookAt", GameplayParser.exec_look_at),
+        ("core.gameplayParser.walkTo", GameplayParser.exec_walk_to),
+        ("core.gameplayParser.pickUp", GameplayParser.exec_pick_up),
+        ("core.gameplayParser.drop", GameplayParser.exec_drop),
+        ("core.gameplayParser.combine", GameplayParser.exec_combine),
+        ("core.gameplayParser.talk", GameplayParser.exec_talk)
+    ])
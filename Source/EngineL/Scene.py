@@ -16,340 +16,764 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
+import marshal
+import os
+import os.path
+import sys
+import threading
 from xml.etree import ElementTree
-from PyQt5.QtCore import Qt, QObject, QCoreApplication, QEvent, pyqtSignal
+from xml.parsers import expat
+from PyQt5.QtCore import QObject, QCoreApplication, QEvent
 from Source.EngineL import Core
 
-class XMLScene(QObject):
+SCENES_PATH = "Resources/Scenes"
+SCENE_BUNDLE_PATH = "Resources/scenes.bundle"
+SCENE_BUNDLE_VERSION = (1,) + tuple(sys.version_info[:2])
+SCENE_CACHE_BUDGET = 8 * 1024 * 1024
+SCENE_PREFETCH_THREADS = 2
+BRANCH_NAMES = {"transfer": ("noSubject", "noTarget", "noTransfer"),
+                "spawn": ("noTarget",),
+                "changeState": ("noSubject",)}
+
+class SceneProgram:
     """
-    This is the base class for scenes designed in XML
+    A SceneProgram is the compiled form of a scene file. It consists of blocks, which are tuples of
+    ops, and the first block is the scene itself. Every op is a tuple of it's code, which is the tag
+    of the scene element it was compiled from, a tuple of it's arguments and it's branch table,
+    which maps the names of the branches the op can take, like 'noSubject' or the index of an
+    option, to the index of their block. When a branch is done, the scene continues after the op
+    that took it.
+
+    Only the first block is compiled right away. The file is read with a parser that doesn't build
+    any elements, and of every branch, only the range of it's element in the file is kept, as a
+    list of it's start, the start of it's end tag, it's first line and it's tag. It is compiled
+    when a playback takes the branch for the first time, so that the cost and the memory of a scene
+    follow the paths that are actually played instead of the size of the dialogue tree. The prolog
+    of the file, which is everything before the root element, is kept too and put in front of the
+    range of a branch, so that the branch is read with the same declarations, like the entities of
+    a DOCTYPE, as the rest of the file. Once every block is compiled, the file's content is
+    dropped. Apart from this, programs are never changed,
+    so one program can be shared by all playbacks of it's scene, on any thread. It isn't a QObject
+    for this reason.
+
+    Next to every compiled block, the lines in which it's ops start are kept, so that tools can
+    point to the element an op came from. The ops that are added to the first block have the line
+    0. If blocks and lines are given, they are the already compiled blocks of a scene bundle and
+    source is ignored.
+
+    If errors is a list, the elements that are illegal or have an invalid attribute are left out
+    of their blocks and their ValueErrors are appended to it instead of being raised, so that tools
+    can find all of these errors of a scene at once. Such a program must not be played.
     """
 
-    def __init__(self, scene_name, player):
-        QObject.__init__(self, player)
-
-        self.player = player
-
-        try:
-            self.xml_tree = ElementTree.parse("Resources/Scenes/" + scene_name + ".xml")
-        except (FileNotFoundError, ElementTree.ParseError) as error:
-            QCoreApplication.instance().crash(str(error))
-
-        self.elements = [ClearCommandRowElement(self, None)]
-        self.elements = generate_scene_element_path(self, self.xml_tree.getroot(), self.elements)
-
-        previous_element = self.elements[-1]
-        self.elements.append(ShowCommandLineElement(self, None))
-        previous_element.end.connect(self.elements[-1].play)
-        self.elements[-1].end.connect(self.destruct)
-
-    def identify_element(self, xml_element):
-        """
-        This non-constant method identifies which scene element is meant with the xml_element and
-        returns a configured instance of it. If the scene element could not be identified, the game
-        will be saved and crashes.
-        """
-        if xml_element.tag == "text":
-            return TextElement(self, xml_element)
-        elif xml_element.tag == "delay":
-            return DelayElement(self, xml_element)
-        elif xml_element.tag == "choice":
-            return ChoiceElement(self, xml_element)
-        elif xml_element.tag == "transfer":
-            return TransferElement(self, xml_element)
-        elif xml_element.tag == "changeState":
-            return ChangeStateElement(self, xml_element)
-        elif xml_element.tag == "spawn":
-            return SpawnElement(self, xml_element)
-        else:
-            error_message = "Illegal scene element " + xml_element.tag + "! The game was saved!"
-            QCoreApplication.instance().crash(error_message, True)
-
-    def get_player(self):
+    def __init__(self, source, blocks=None, lines=None, errors=None):
+        self.source = source
+        self.encoding = "UTF-8"
+        self.uncompiled_block_count = 0
+        self.lock = threading.Lock()
+        self.errors = errors
+        self.prolog = None
+        self.root_line = 1
+        if blocks is not None:
+            self.blocks = list(blocks)
+            self.lines = list(lines)
+            self.source = None
+            return
+        self.blocks = [None]
+        self.lines = [None]
+        ops, op_lines = self.compile_block(source, None, 0, 0)
+        self.blocks[0] = tuple([("clearCommandRow", (), dict())] + ops
+                               + [("showCommandLine", (), dict())])
+        self.lines[0] = tuple([0] + op_lines + [0])
+        if self.uncompiled_block_count == 0:
+            self.source = None
+            self.prolog = None
+
+    def get_block(self, block_index):
         """
-        This constant method returns our player.
+        This non-constant method returns the block with the given index and compiles it first, if
+        this didn't happen yet. It raises a ValueError if the block contains an illegal element or
+        an invalid attribute and an ElementTree.ParseError if it isn't well-formed.
         """
-        return self.player
-
-    def play(self):
+        block = self.blocks[block_index]
+        if isinstance(block, tuple):
+            return block
+        with self.lock:
+            block = self.blocks[block_index]
+            if not isinstance(block, tuple):
+                start, end, first_line, tag = block
+                # The range ends before the end tag of the branch's element, which is added again.
+                # The prolog ends in the line of the root element, in which the range continues.
+                data = (self.prolog + self.source[start:end]
+                        + ("</" + tag + ">").encode(self.encoding))
+                ops, op_lines = self.compile_block(data, self.encoding, start - len(self.prolog),
+                                                   first_line - self.root_line)
+                block = tuple(ops)
+                self.lines[block_index] = tuple(op_lines)
+                self.blocks[block_index] = block
+                self.uncompiled_block_count -= 1
+                if self.uncompiled_block_count == 0:
+                    self.source = None
+                    self.prolog = None
+        return block
+
+    def get_block_count(self):
         """
-        This non-constant method starts the scene.
+        This constant method returns the number of our blocks, including the ones that are not
+        compiled yet.
         """
-        self.elements[0].play()
+        return len(self.blocks)
 
-    def destruct(self):
+    def get_compiled_block_count(self):
         """
-        This non-constant method deletes ourselves from the game.
+        This constant method returns the number of our blocks that are already compiled.
         """
-        self.setParent(None)
-
-def generate_scene_element_path(scene, xml_root, path=None):
-    """
-    This function generates and returns a scene element path based upon an xml_root element for a
-    scene. If you want to, you can give it a partly built path which will be extended.
-    """
-    if path is None:
-        path = []
-    for xml_element in list(xml_root):
-        if len(path) > 0:
-            previous_element = path[-1]
-        else:
-            previous_element = None
-
-        path.append(scene.identify_element(xml_element))
-
-        if previous_element is not None:
-            previous_element.end.connect(path[-1].play)
-    return path
-
-class SceneElement(QObject):
-    """
-    Abstract base class for scene elements.
-    """
-    def __init__(self, scene, xml_element):
-        QObject.__init__(self, scene)
-        self.xml_element = xml_element
-        self.paths = dict()
+        return len(self.blocks) - self.uncompiled_block_count
 
-    def create_element_path(self, path_name):
+    def get_block_lines(self, block_index):
         """
-        This non-constant method adds a new element path we can branch off to. The path_name is the
-        tag of the XML sub-element which contains all of our path's elements.
+        This non-constant method returns the lines in which the ops of the block with the given
+        index start, and compiles the block first, like get_block.
         """
-        root = self.xml_element.find(path_name)
-        if root is not None:
-            self.paths[path_name] = generate_scene_element_path(self.parent(), root)
-            self.paths[path_name][-1].end.connect(self.end)
+        self.get_block(block_index)
+        return self.lines[block_index]
 
-    def start_path(self, path_name):
+    def compile_all(self):
         """
-        This non-constant method starts the path with the given name.
+        This non-constant method compiles all of our blocks that aren't compiled yet. It raises a
+        ValueError or an ElementTree.ParseError for the first block that can't be compiled.
         """
-        if self.paths.get(path_name) is not None:
-            self.paths[path_name][0].play()
-        else:
-            text = "Error while playing a scene: An operation could not be executed!"
-            QCoreApplication.instance().crash(text)
+        block_index = 0
+        while block_index < len(self.blocks):
+            self.get_block(block_index)
+            block_index += 1
 
-    def play(self):
+    def get_blocks(self):
         """
-        Starts the scene element's action. Subclasses need to override it.
+        This non-constant method compiles all of our blocks and returns them, together with the
+        lines of their ops, as two tuples.
         """
-        raise NotImplementedError
+        self.compile_all()
+        return tuple(self.blocks), tuple(self.lines)
 
-    end = pyqtSignal()
-
-class ClearCommandRowElement(SceneElement):
+    def compile_block(self, data, encoding, offset, line_offset):
+        """
+        This non-constant method compiles the scene elements inside of the root element of the XML
+        document in data and returns the list of their ops and the list of the lines they start
+        in. The blocks of their branches are added without being compiled. A position in data plus
+        the given offset is the position in our source and a line in data plus the given
+        line_offset is the line of the file. It raises an ElementTree.ParseError if the document
+        isn't well-formed and a ValueError if an element is illegal or has an invalid attribute,
+        unless we collect our errors. The first time it is called, it keeps our prolog.
+        """
+        parser = expat.ParserCreate(encoding)
+        parser.buffer_text = True
+        ops = []
+        op_lines = []
+        # The root element has the depth 1, the elements of the ops 2 and their branches 3. An op
+        # is kept as a list of it's tag, attributes, line, the parts of it's text, it's branch
+        # table and the texts of it's options. A branch is kept as a list of it's key in the
+        # branch table, it's tag, the position and line where it starts and whether it contains
+        # elements. Everything inside of the children of an op is only counted, so the handlers are
+        # swapped while we are in one.
+        depth = 0
+        op = None
+        branch = None
+
+        def get_position():
+            return parser.CurrentByteIndex + offset
+
+        def get_line():
+            return parser.CurrentLineNumber + line_offset
+
+        def start_element(tag, attributes):
+            nonlocal depth, op, branch
+            depth += 1
+            if depth == 1 and self.prolog is None:
+                self.prolog = data[0:parser.CurrentByteIndex]
+                self.root_line = parser.CurrentLineNumber
+            elif depth == 2:
+                op = [tag, attributes, get_line(), [], dict(), []]
+            elif depth == 3:
+                # Like in ElementTree, the text of an element ends at it's first child.
+                op[3] = tuple(op[3])
+                if op[0] == "choice" and tag == "option":
+                    branch = [len(op[5]), tag, get_position(), get_line(), False]
+                    op[5].append(attributes.get("text", str()))
+                elif tag in BRANCH_NAMES.get(op[0], ()) and tag not in op[4]:
+                    branch = [tag, tag, get_position(), get_line(), False]
+                parser.StartElementHandler = skip_start_element
+                parser.EndElementHandler = skip_end_element
+                parser.CharacterDataHandler = None
+
+        def end_element(tag):
+            nonlocal depth, op
+            if depth == 2:
+                try:
+                    ops.append(build_op(*op))
+                    op_lines.append(op[2])
+                except ValueError as error:
+                    if self.errors is None:
+                        raise
+                    self.errors.append(error)
+                op = None
+            depth -= 1
+
+        def skip_start_element(tag, attributes):
+            nonlocal depth
+            if depth == 3 and branch is not None:
+                branch[4] = True
+            depth += 1
+
+        def skip_end_element(tag):
+            nonlocal depth, branch
+            if depth == 3:
+                if branch is not None:
+                    if not branch[4]:
+                        # Without any elements, the branch's block is empty, but it's end tag may
+                        # be missing, so it can't be compiled from it's range.
+                        self.blocks.append(())
+                        self.lines.append(())
+                    else:
+                        self.blocks.append([branch[2], get_position(), branch[3], branch[1]])
+                        self.lines.append(None)
+                        self.uncompiled_block_count += 1
+                    op[4][branch[0]] = len(self.blocks) - 1
+                    branch = None
+                parser.StartElementHandler = start_element
+                parser.EndElementHandler = end_element
+                parser.CharacterDataHandler = character_data
+            depth -= 1
+
+        def character_data(text):
+            if depth == 2 and isinstance(op[3], list):
+                op[3].append(text)
+
+        def xml_declaration(version, declared_encoding, standalone):
+            if declared_encoding is not None:
+                self.encoding = declared_encoding
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+        if encoding is None:
+            parser.XmlDeclHandler = xml_declaration
+        # If the block can't be compiled, the blocks of it's branches are dropped again, so that
+        # trying again doesn't add them twice.
+        block_count = len(self.blocks)
+        uncompiled_block_count = self.uncompiled_block_count
+        try:
+            parser.Parse(data, True)
+        except (expat.ExpatError, ValueError) as error:
+            del self.blocks[block_count:]
+            del self.lines[block_count:]
+            self.uncompiled_block_count = uncompiled_block_count
+            if isinstance(error, ValueError):
+                raise
+            parse_error = ElementTree.ParseError(str(error))
+            parse_error.code = error.code
+            parse_error.position = (error.lineno + line_offset, error.offset)
+            raise parse_error
+        return ops, op_lines
+
+def build_op(tag, attributes, line, text_parts, branches, option_texts):
     """
-    This scene element removes all widgets from the command row.
+    This function returns the op of a scene element with the given tag and attributes, that
+    started in the given line, from the parts of it's text, it's branch table and the texts of it's
+    options. It raises a ValueError, whose line attribute is the given line, if the element is
+    illegal or has an invalid attribute.
     """
-    def __init__(self, scene, xml_element):
-        SceneElement.__init__(self, scene, xml_element)
-
-    def play(self):
-        self.parent().get_player().get_window().clear_command_row()
-        self.end.emit()
-
-class ShowCommandLineElement(SceneElement):
+    if tag == "text":
+        arguments = ("".join(text_parts) if text_parts else None,)
+    elif tag == "delay":
+        arguments = (get_number(tag, attributes, "time", line),)
+    elif tag == "choice":
+        arguments = tuple(option_texts)
+    elif tag == "transfer":
+        arguments = (attributes.get("subject", str()), attributes.get("target", str()))
+    elif tag == "spawn":
+        arguments = (attributes.get("class", str()), attributes.get("target", str()))
+    elif tag == "changeState":
+        arguments = (attributes.get("subject", str()), attributes.get("state", str()),
+                     get_number(tag, attributes, "value", line))
+    else:
+        error = ValueError("Illegal scene element " + tag + " in line " + str(line) + "!")
+        error.line = line
+        raise error
+    return (tag, arguments, branches)
+
+def get_number(tag, attributes, key, line):
     """
-    This scene element clears the command row and adds the command line again.
+    This function returns the value of the attribute with the given key of a scene element with
+    the given tag and attributes, which started in the given line, as an integer. It raises a
+    ValueError, whose line attribute is the given line, if it's missing or not a number.
     """
-    def __init__(self, scene, xml_element):
-        SceneElement.__init__(self, scene, xml_element)
-
-    def play(self):
-        self.parent().get_player().get_window().clear_command_row()
-        self.parent().get_player().get_window().add_command_line()
-        self.end.emit()
-
-class TextElement(SceneElement):
+    try:
+        return int(attributes.get(key, str()))
+    except ValueError:
+        error = ValueError("Invalid number in the attribute " + key + " of the scene element "
+                           + tag + " in line " + str(line) + "!")
+        error.line = line
+        raise error
+
+class SceneProgramCache:
     """
-    A scene element that prints a text when it is played.
+    The SceneProgramCache reads and compiles the scene files and keeps their programs, so that
+    every file is only read once. A program is kept by the path of it's file, together with the
+    file's modification time and size, and it is compiled again when the file was changed. The
+    cache may be used from any thread, and if a program is requested while another thread compiles
+    it, it waits for that thread instead of compiling it again.
+
+    The memory of the programs is bounded by the budget, in bytes. Since it can't be measured
+    cheaply, the size of a program's file is taken for it's size. When the programs get larger than
+    the budget, the least recently used ones are dropped, but never the one that was just
+    requested.
+
+    If there is a scene bundle at bundle_path, as written by Tools/compile_scenes.py, a program
+    that isn't cached is taken from it instead of being compiled, as long as the file still has
+    the modification time and size, or else the hash, it had when the bundle was written. The
+    bundle is read when the first program is requested, and only the programs that are requested
+    are unpacked. If bundle_path is None, every program is compiled.
     """
-    def __init__(self, scene, xml_element):
-        SceneElement.__init__(self, scene, xml_element)
-        self.text = xml_element.text
 
-    def set_text(self, text):
+    def __init__(self, path=SCENES_PATH, budget=SCENE_CACHE_BUDGET, bundle_path=SCENE_BUNDLE_PATH):
+        self.path = path
+        self.budget = budget
+        self.bundle_path = bundle_path
+        self.bundle = None
+        self.size = 0
+        self.programs = OrderedDict()
+        self.compiling_paths = dict()
+        self.lock = threading.Lock()
+
+    def get_budget(self):
         """
-        Sets our text
+        This constant method returns our memory budget in bytes.
         """
-        self.text = text
+        return self.budget
 
-    def get_text(self):
+    def set_budget(self, budget):
         """
-        This constant method returns our text.
+        This non-constant method sets our memory budget in bytes and drops the least recently used
+        programs until we fit into it.
         """
-        return self.text
-
-    def play(self):
-        self.parent().get_player().get_window().show_text(self.text)
-        self.end.emit()
-
-class DelayElement(SceneElement):
-    """
-    This scene element waits for a predefined amount of time and fires it's end_0 when the time is
-    over.
-    """
-    def __init__(self, scene, xml_element):
-        SceneElement.__init__(self, scene, xml_element)
-        self.time = int(xml_element.get("time"))
-        self.timer_id = -1
+        with self.lock:
+            self.budget = budget
+            self.evict()
 
-    def set_time(self, time):
+    def get_size(self):
         """
-        This non-constant method sets our waiting time.
+        This constant method returns the size of all cached programs in bytes.
         """
-        self.time = time
+        return self.size
 
-    def get_time(self):
+    def get_scene_path(self, scene_name):
         """
-        This constant method returns our waiting time.
+        This constant method returns the path of the file of the scene with the given name.
         """
-        return self.time
+        return os.path.join(self.path, scene_name + ".xml")
 
-    def play(self):
-        self.timer_id = self.startTimer(self.time)
-
-    def event(self, event):
+    def is_cached(self, scene_name):
         """
-        This non-constant method checks for the timer to finish.
+        This constant method returns whether the program of the scene with the given name is
+        cached, without checking whether the file was changed.
         """
-        if event.type() == QEvent.Timer:
-            self.killTimer(self.timer_id)
-            self.end.emit()
-            return True
-        return QObject.event(self, event)
+        with self.lock:
+            return self.get_scene_path(scene_name) in self.programs
 
-class TransferElement(SceneElement):
-    """
-    This element transfers a subject to a target if it's possible.
-    """
-    def __init__(self, scene, xml_element):
-        SceneElement.__init__(self, scene, xml_element)
-        self.subject_name = xml_element.get("subject", str())
-        self.target_name = xml_element.get("target", str())
-
-        self.create_element_path("noSubject")
-        self.create_element_path("noTarget")
-        self.create_element_path("noTransfer")
-
-    def play(self):
-        app = QCoreApplication.instance()
+    def get_program(self, scene_name):
+        """
+        This non-constant method returns the program of the scene with the given name and compiles
+        it if it isn't cached or the file was changed. It raises an OSError if the file could not
+        be read, an ElementTree.ParseError if it isn't valid XML and a ValueError if it isn't a
+        valid scene.
+        """
+        scene_path = self.get_scene_path(scene_name)
+        while True:
+            scene_stat = os.stat(scene_path)
+            version = (scene_stat.st_mtime_ns, scene_stat.st_size)
+            with self.lock:
+                cached_version, program, _ = self.programs.get(scene_path, (None, None, 0))
+                if cached_version == version:
+                    self.programs.move_to_end(scene_path)
+                    return program
+                compiled = self.compiling_paths.get(scene_path)
+                if compiled is None:
+                    compiled = self.compiling_paths[scene_path] = threading.Event()
+                    break
+            # Another thread compiles the program right now, so we take it's result.
+            compiled.wait()
 
-        subject = app.findChild(Core.Entity, self.subject_name, Qt.FindChildrenRecursively)
-        if subject is None:
-            self.start_path("noSubject")
-            return
+        try:
+            program = self.load_program(scene_name, scene_path, scene_stat)
+            with self.lock:
+                self.drop(scene_path)
+                self.programs[scene_path] = (version, program, version[1])
+                self.size += version[1]
+                self.evict()
+        finally:
+            with self.lock:
+                del self.compiling_paths[scene_path]
+            compiled.set()
+        return program
+
+    def load_program(self, scene_name, scene_path, scene_stat):
+        """
+        This non-constant method returns the program of the scene with the given name, whose file
+        is at the given path and has the given stat result. It is taken from our bundle if it is
+        still valid and compiled otherwise.
+        """
+        entry = self.get_bundle().get(scene_name)
+        if entry is not None and entry[0] == scene_stat.st_mtime_ns\
+        and entry[1] == scene_stat.st_size:
+            return SceneProgram(None, *marshal.loads(entry[3]))
+        with open(scene_path, "rb") as scene_file:
+            source = scene_file.read()
+        if entry is not None and entry[2] == hashlib.sha1(source).hexdigest():
+            return SceneProgram(None, *marshal.loads(entry[3]))
+        return SceneProgram(source)
+
+    def get_bundle(self):
+        """
+        This non-constant method returns the entries of our scene bundle by the names of their
+        scenes, and reads the bundle if this didn't happen yet. Every entry is a tuple of the
+        modification time, the size and the hash of the scene's file and the marshalled blocks and
+        lines of it's program. If there is no valid bundle, there are no entries.
+        """
+        if self.bundle is None:
+            bundle = read_scene_bundle(self.bundle_path) if self.bundle_path is not None else None
+            self.bundle = bundle if bundle is not None else dict()
+        return self.bundle
 
-        if self.target_name == "None":
-            target = None
-        else:
-            target = app.findChild(Core.Entity, self.target_name, Qt.FindChildrenRecursively)
-            if target is None:
-                self.start_path("noTarget")
-                return
+    def drop(self, scene_path):
+        """
+        This non-constant method drops the program of the file at the given path, if it is cached.
+        The caller has to hold our lock.
+        """
+        entry = self.programs.pop(scene_path, None)
+        if entry is not None:
+            self.size -= entry[2]
 
-        if not subject.transfer(target):
-            self.start_path("noTransfer")
-            return
+    def evict(self):
+        """
+        This non-constant method drops the least recently used programs until we fit into our
+        budget, but it keeps the most recently used one. The caller has to hold our lock.
+        """
+        while self.size > self.budget and len(self.programs) > 1:
+            self.drop(next(iter(self.programs)))
 
-        self.end.emit()
+    def clear(self):
+        """
+        This non-constant method drops all cached programs.
+        """
+        with self.lock:
+            self.programs.clear()
+            self.size = 0
 
-class SpawnElement(SceneElement):
+def read_scene_bundle(bundle_path):
+    """
+    This function reads the scene bundle at the given path in one go and returns it's entries by
+    the names of their scenes, or None if it does not exist, is broken or was written by another
+    version.
+    """
+    try:
+        with open(bundle_path, "rb") as bundle_file:
+            bundle = marshal.loads(bundle_file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(bundle, dict) or bundle.get("version") != SCENE_BUNDLE_VERSION:
+        return None
+    return bundle["scenes"]
+
+def write_scene_bundle(bundle_path, entries):
     """
-    This scene element spawns a new entity.
+    This function writes a scene bundle with the given entries by the names of their scenes to the
+    given path. The file is replaced atomically, so a running game never reads a half-written
+    bundle. It raises an OSError if the bundle could not be written.
     """
-    def __init__(self, scene, xml_element):
-        SceneElement.__init__(self, scene, xml_element)
-        self.classname = xml_element.get("class", str())
-        self.targetname = xml_element.get("target", str())
+    bundle = {
+        "version": SCENE_BUNDLE_VERSION,
+        "scenes": entries
+    }
+    temp_path = bundle_path + "." + str(os.getpid())
+    try:
+        with open(temp_path, "wb") as bundle_file:
+            bundle_file.write(marshal.dumps(bundle))
+        os.replace(temp_path, bundle_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
 
-        self.create_element_path("noTarget")
+def build_bundle_entry(source, scene_stat, program):
+    """
+    This function returns the bundle entry of the given program, which was compiled from the given
+    source, a file with the given stat result. Every block of the program is compiled for this.
+    """
+    return (scene_stat.st_mtime_ns, scene_stat.st_size, hashlib.sha1(source).hexdigest(),
+            marshal.dumps(program.get_blocks()))
 
-    def play(self):
-        app = QCoreApplication.instance()
+class ScenePrefetcher:
+    """
+    The ScenePrefetcher reads and compiles the scenes the player may soon run into on a pool of
+    worker threads, so that this doesn't happen when they are played. These are the scenes of the
+    entities in the player's place and in the places connected to it, as returned by
+    Entity.get_scene_names. The programs are put into the program cache, whose budget bounds how
+    many of them are kept. Scenes that can't be compiled are left out and fail when they are
+    played, like they always did.
+    """
 
-        entity_class = app.lookup_entity_class(self.classname)
-        if entity_class is None:
-            app.crash("Invalid Entity class " + self.classname + "!", True)
+    def __init__(self, cache, thread_count=SCENE_PREFETCH_THREADS):
+        self.cache = cache
+        self.thread_count = thread_count
+        self.executor = None
+        self.pending_names = set()
+        self.lock = threading.Lock()
 
-        target = app.findChild(Core.Entity, self.targetname, Qt.FindChildrenRecursively)
-        if target is None:
-            self.start_path("noTarget")
-            return
+    def prefetch(self, scene_names):
+        """
+        This non-constant method lets the worker threads compile the scenes with the given names,
+        in their order, unless they are cached or about to be compiled already.
+        """
+        for scene_name in scene_names:
+            if self.cache.is_cached(scene_name):
+                continue
+            with self.lock:
+                if scene_name in self.pending_names:
+                    continue
+                self.pending_names.add(scene_name)
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(self.thread_count)
+                self.executor.submit(self.compile, scene_name)
+
+    def prefetch_around(self, place):
+        """
+        This non-constant method prefetches the scenes of the given place, the places connected to
+        it and all entities in them, the ones of the given place first.
+        """
+        places = [place]
+        if isinstance(place, Core.Place):
+            places.extend(place.get_connected_places())
+        scene_names = []
+        for place in places:
+            for entity in [place] + place.findChildren(Core.Entity):
+                scene_names.extend(entity.get_scene_names())
+        self.prefetch(scene_names)
+
+    def wait(self):
+        """
+        This non-constant method waits until all scenes that were handed to the worker threads are
+        compiled.
+        """
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
 
-        entity = entity_class()
-        entity.transfer(target)
+    def compile(self, scene_name):
+        """
+        This non-constant method is run by a worker thread and compiles the scene with the given
+        name.
+        """
+        try:
+            self.cache.get_program(scene_name)
+        except (OSError, ElementTree.ParseError, ValueError):
+            pass
+        finally:
+            with self.lock:
+                self.pending_names.discard(scene_name)
+
+def list_scene_names(path=SCENES_PATH):
+    """
+    This function returns the sorted names of all scene files in the given directory and it's
+    subdirectories, as they are passed to XMLScene.
+    """
+    scene_names = []
+    for directory, _, file_names in os.walk(path):
+        for file_name in file_names:
+            if file_name.endswith(".xml"):
+                scene_path = os.path.relpath(os.path.join(directory, file_name), path)
+                scene_names.append(os.path.splitext(scene_path)[0].replace(os.sep, "/"))
+    return sorted(scene_names)
+
+PROGRAM_CACHE = SceneProgramCache()
+PREFETCHER = ScenePrefetcher(PROGRAM_CACHE)
+
+def get_program_cache():
+    """
+    This function returns the cache of the scene programs, which is shared by all scenes.
+    """
+    return PROGRAM_CACHE
 
-        self.end.emit()
+def get_prefetcher():
+    """
+    This function returns the scene prefetcher, which fills the program cache.
+    """
+    return PREFETCHER
 
-class ChangeStateElement(SceneElement):
+class XMLScene(QObject):
     """
-    This scene element changes an entitie's state to a given value.
+    This is the class for scenes designed in XML. The scene file is compiled once into a
+    SceneProgram, which is shared by all playbacks of it, and a scene only keeps it's position in
+    the program: A stack of frames, each of which is the index of a block and the index of it's
+    next op. The first frame is the scene itself and every following one is a branch that was
+    taken.
     """
-    def __init__(self, scene, xml_element):
-        SceneElement.__init__(self, scene, xml_element)
-        self.subject_name = xml_element.get("subject", str())
-        self.state = xml_element.get("state", str())
-        self.value = int(xml_element.get("value", str()))
 
-        self.create_element_path("noSubject")
+    def __init__(self, scene_name, player):
+        QObject.__init__(self, player)
 
-    def play(self):
-        app = QCoreApplication.instance()
+        self.player = player
+        self.frames = []
+        self.timer_id = -1
+        self.option_texts = ()
+        self.option_branches = dict()
 
-        subject = app.findChild(Core.Entity, self.subject_name, Qt.FindChildrenRecursively)
-        if subject is None:
-            self.start_path("noSubject")
-            return
+        try:
+            self.program = PROGRAM_CACHE.get_program(scene_name)
+        except (OSError, ElementTree.ParseError) as error:
+            QCoreApplication.instance().crash(str(error))
+        except ValueError as error:
+            QCoreApplication.instance().crash(str(error) + " The game was saved!", True)
 
-        subject.set_state(self.state, self.value)
+    def get_player(self):
+        """
+        This constant method returns our player.
+        """
+        return self.player
 
-        self.end.emit()
+    def get_program(self):
+        """
+        This constant method returns the program we play.
+        """
+        return self.program
 
-class ChoiceElement(SceneElement):
-    """
-    This scene element gives the player a choice on how to proced in the dialogue.
-    """
-    def __init__(self, scene, xml_choice_root):
-        SceneElement.__init__(self, scene, xml_choice_root)
+    def play(self):
+        """
+        This non-constant method starts the scene.
+        """
+        self.frames = [[0, 0]]
+        self.resume()
 
-        self.option_texts = []
-        self.option_paths = []
-        self.buttons = []
-        self.down_button_index = -1
+    def resume(self):
+        """
+        This non-constant method runs the ops from our current position on, until one of them has
+        to wait for a delay or a choice of the player. When the scene is done, we delete ourselves
+        from the game.
+        """
+        while len(self.frames) > 0:
+            frame = self.frames[-1]
+            try:
+                block = self.program.get_block(frame[0])
+            except (ElementTree.ParseError, ValueError) as error:
+                QCoreApplication.instance().crash(str(error) + " The game was saved!", True)
+                return
+            if frame[1] == len(block):
+                self.frames.pop()
+                continue
+            code, arguments, branches = block[frame[1]]
+            frame[1] += 1
+            if not self.run_op(code, arguments, branches):
+                return
+        self.destruct()
 
-        for xml_option in xml_choice_root.findall("option"):
-            self.option_texts.append(xml_option.get("text", str()))
-            path = generate_scene_element_path(self.parent(), xml_option)
-            path[-1].end.connect(self.end)
-            self.option_paths.append(path)
+    def run_op(self, code, arguments, branches):
+        """
+        This non-constant method runs a single op. It returns False if the scene has to wait until
+        it is resumed and True if it can go on right away.
+        """
+        app = QCoreApplication.instance()
+        window = self.player.get_window()
+        if code == "clearCommandRow":
+            window.clear_command_row()
+        elif code == "showCommandLine":
+            window.clear_command_row()
+            window.add_command_line()
+        elif code == "text":
+            window.show_text(arguments[0])
+        elif code == "delay":
+            wait_time = app.get_scene_clock().get_wait_time(arguments[0])
+            if wait_time is not None:
+                self.timer_id = self.startTimer(wait_time)
+                return False
+        elif code == "choice":
+            if len(arguments) > 0:
+                self.option_texts = arguments
+                self.option_branches = branches
+                for index, text in enumerate(arguments):
+                    button = window.add_option_button(text)
+                    button.clicked.connect(functools.partial(self.option_chosen, index))
+                return False
+        elif code == "transfer":
+            subject = app.find_entity(arguments[0])
+            if subject is None:
+                return self.start_branch(branches, "noSubject")
+            if arguments[1] == "None":
+                target = None
+            else:
+                target = app.find_entity(arguments[1])
+                if target is None:
+                    return self.start_branch(branches, "noTarget")
+            if not subject.transfer(target):
+                return self.start_branch(branches, "noTransfer")
+        elif code == "spawn":
+            entity_class = app.lookup_entity_class(arguments[0])
+            if entity_class is None:
+                app.crash("Invalid Entity class " + arguments[0] + "!", True)
+            target = app.find_entity(arguments[1])
+            if target is None:
+                return self.start_branch(branches, "noTarget")
+            entity = entity_class()
+            entity.transfer(target)
+        elif code == "changeState":
+            subject = app.find_entity(arguments[0])
+            if subject is None:
+                return self.start_branch(branches, "noSubject")
+            subject.set_state(arguments[1], arguments[2])
+        return True
+
+    def start_branch(self, branches, branch_name):
+        """
+        This non-constant method lets the scene continue with the branch with the given name from
+        the given branch table. If there is no such branch, the game crashes.
+        """
+        block_index = branches.get(branch_name)
+        if block_index is None:
+            text = "Error while playing a scene: An operation could not be executed!"
+            QCoreApplication.instance().crash(text)
+            return False
+        self.frames.append([block_index, 0])
+        return True
 
-    def play(self):
-        if len(self.option_texts) == 0:
-            self.end.emit()
-        else:
-            for text in self.option_texts:
-                new_button = self.parent().get_player().get_window().add_option_button(text)
-                new_button.pressed.connect(self.button_pressed)
-                self.buttons.append(new_button)
+    def option_chosen(self, index, checked=False):
+        """
+        This non-constant method is called when the option button with the given index was clicked.
+        It prints the option's text and continues the scene with the option's branch.
+        """
+        window = self.player.get_window()
+        window.show_text(self.option_texts[index])
+        window.clear_command_row()
+        self.frames.append([self.option_branches[index], 0])
+        self.resume()
 
-    def button_pressed(self):
+    def event(self, event):
         """
-        This non-constant method checks which button is currently pressed and connects it's
-        'clicked' signal to our 'button_clicked' method, which will emit our end.
+        This non-constant method checks for the timer of a delay to finish and resumes the scene.
         """
-        for i in range(0, len(self.buttons)):
-            if self.buttons[i].isDown():
-                self.buttons[i].clicked.connect(self.button_clicked)
-                self.down_button_index = i
+        if event.type() == QEvent.Timer:
+            self.killTimer(self.timer_id)
+            self.resume()
+            return True
+        return QObject.event(self, event)
 
-    def button_clicked(self):
+    def destruct(self):
         """
-        This non-constant method prints the chosen option text and emits our end signal.
+        This non-constant method deletes ourselves from the game.
         """
-        text = self.option_texts[self.down_button_index]
-        self.parent().get_player().get_window().show_text(text)
-        self.parent().get_player().get_window().clear_command_row()
-        self.option_paths[self.down_button_index][0].play()
+        self.setParent(None)
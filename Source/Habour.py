@@ -28,6 +28,12 @@ class Habour(Core.Place):
     def __init__(self, parent=None):
         Core.Place.__init__(self, parent)
 
+    def subscribe_transfer_events(self):
+        """
+        This overriden, non-constant method subscribes us to all transfers to us.
+        """
+        Core.get_transfer_dispatcher().subscribe(self, target=self)
+
     def on_transfer(self, subject, parent, target):
         Core.Place.on_transfer(self, subject, parent, target)
         if target == self and isinstance(subject, Player):
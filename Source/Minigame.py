@@ -57,7 +57,7 @@ class BigHeap(Core.StaticEntity):
             verwandeln. Ich sollte schnell was dagegen, unternehmen bevor sich erneut was ansammeln\
             kann!")
             rth_name = Core.get_res_man().get_string("game.places.roadToHabour.name")
-            road_to_habour = Core.SinglePlayerApp.instance().findChild(Core.Place, rth_name)
+            road_to_habour = Core.SinglePlayerApp.instance().find_entity(rth_name, Core.Place)
             road_to_habour.spawn("trash")
             self.transfer(None)
             return True
@@ -97,7 +97,7 @@ class Trash(Core.StaticEntity):
             erweisen und mir die Arbeit erleich... AUFPASSEN! Ich hab wohl gepennt und nicht\
             gesehen, dass noch immer Müll angeschwemmt wird und erneut ist der Fluss verstopft!")
             rth_name = Core.get_res_man().get_string("game.places.roadToHabour.name")
-            road_to_habour = Core.SinglePlayerApp.instance().findChild(Core.Place, rth_name)
+            road_to_habour = Core.SinglePlayerApp.instance().find_entity(rth_name, Core.Place)
             road_to_habour.spawn("shovel")
             road_to_habour.spawn("dam")
             self.transfer(None)
@@ -149,7 +149,7 @@ class Dam(Core.StaticEntity):
             endlich wieder zum Hafen, aber warum habe ich nicht die Schaufel von da drüben\
             benutzt?")
             rth_name = Core.get_res_man().get_string("game.places.roadToHabour.name")
-            road_to_habour = Core.SinglePlayerApp.instance().findChild(Core.Place, rth_name)
+            road_to_habour = Core.SinglePlayerApp.instance().find_entity(rth_name, Core.Place)
             road_to_habour.set_state("flooded", 0)
             self.transfer(None)
             return True
@@ -163,7 +163,7 @@ class Dam(Core.StaticEntity):
             endlich wieder zum Hafen. Die Schaufel ist jedoch hinüber.")
             other_entity.transfer(None)
             rth_name = Core.get_res_man().get_string("game.places.roadToHabour.name")
-            road_to_habour = Core.SinglePlayerApp.instance().findChild(Core.Place, rth_name)
+            road_to_habour = Core.SinglePlayerApp.instance().find_entity(rth_name, Core.Place)
             road_to_habour.set_state("cleared", 1)
             return True
         return False
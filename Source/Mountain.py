@@ -30,6 +30,12 @@ class CoveredFountain(Core.Entity):
         Core.Entity.__init__(self, parent)
         self.activly_usable = True
 
+    def subscribe_transfer_events(self):
+        """
+        This overriden, non-constant method subscribes us to all transfers of ladder tools.
+        """
+        Core.get_transfer_dispatcher().subscribe(self, subject_class=LadderTool)
+
     def on_transfer(self, subject, parent, target):
         """
         This non-constant, overriden method floods the habour road if the given subject is the
@@ -38,13 +44,13 @@ class CoveredFountain(Core.Entity):
         Core.Entity.on_transfer(self, subject, parent, target)
         if isinstance(subject, LadderTool):
             rth_name = Core.get_res_man().get_string("game.places.roadToHabour.name")
-            road_to_habour = Core.SinglePlayerApp.instance().findChild(Core.Place, rth_name)
+            road_to_habour = Core.SinglePlayerApp.instance().find_entity(rth_name, Core.Place)
             if road_to_habour.get_state("flooded") == 0:
                 road_to_habour.set_state("flooded", 1)
                 road_to_habour.spawn("bigheap")
 
                 player_name = Core.get_res_man().get_string("core.player.name")
-                player = Core.SinglePlayerApp.instance().findChild(Player, player_name)
+                player = Core.SinglePlayerApp.instance().find_entity(player_name, Player)
                 if player is not None:
                     player.get_window().show_text("Eine Quelle hat sich geöffnet und der Fluss fließt wieder.")
 
@@ -58,13 +58,29 @@ class RoadToHabour(Core.Place):
     """
     This is the road betwen the Habour and the village.
     """
+    SCENE = "Hex0"
+
     def __init__(self, parent=None):
         Core.Place.__init__(self, parent)
         self.set_state("flooded", 0)
         self.set_state("cleared", 0)
+
+    def subscribe_transfer_events(self):
+        """
+        This overriden, non-constant method subscribes us to all transfers to us.
+        """
+        Core.get_transfer_dispatcher().subscribe(self, target=self)
+
+    def get_scene_names(self):
+        """
+        This overriden, constant method returns the name of the scene in which Ivy meets Hex.
+        """
+        return [RoadToHabour.SCENE]
+
     def on_transfer(self, subject, parent, target):
         """
-        This non-constant, overriden method starts the scene 'Hex0' if Ivy hadn't met her before.
+        This non-constant, overriden method starts the scene in which Ivy meets Hex, if she hadn't
+        met her before.
         """
         if target == self:
             try:
@@ -80,7 +96,7 @@ class RoadToHabour(Core.Place):
                 hex_entity.use_definite_article = True
 
                 Core.Place.on_transfer(self, subject, parent, target)
-                Scene.XMLScene("Hex0", subject).play()
+                Scene.XMLScene(RoadToHabour.SCENE, subject).play()
                 return
         Core.Place.on_transfer(self, subject, parent, target)
 
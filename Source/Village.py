@@ -26,12 +26,26 @@ class Village(Core.Place):
     """
     This is the village itself.
     """
+    SCENE = "Village0"
+
+    def subscribe_transfer_events(self):
+        """
+        This overriden, non-constant method subscribes us to all transfers to us.
+        """
+        Core.get_transfer_dispatcher().subscribe(self, target=self)
+
+    def get_scene_names(self):
+        """
+        This overriden, constant method returns the name of the scene in which we welcome Ivy.
+        """
+        return [Village.SCENE]
+
     def on_transfer(self, subject, parent, target):
         Core.Place.on_transfer(self, subject, parent, target)
 
         if target == self and isinstance(subject, Player):
             habour_road_name = Core.get_res_man().get_string("game.places.roadToHabour.name")
-            habour_road = self.parent().findChild(Core.Entity, habour_road_name)
+            habour_road = self.parent().find_entity(habour_road_name)
             if habour_road is not None:
                 try:
                     habour_road_flooded = bool(habour_road.get_state("flooded"))
@@ -47,7 +61,7 @@ class Village(Core.Place):
                     dialogue_triggered = False
 
                 if not dialogue_triggered:
-                    Scene.XMLScene("Village0", subject).play()
+                    Scene.XMLScene(Village.SCENE, subject).play()
                     self.set_state("dialogue triggered", 1)
 
 
@@ -55,9 +69,21 @@ class GerritsHouse(Core.StaticEntity):
     """
     This is the house of Gerrit Alt, Ivy's mentor.
     """
+    NO_FIND_SCENE = "Gerrit/#0 no find"
+    WITH_FIND_SCENE = "Gerrit/#0 with find"
+    NO_COIL_SCENE = "Gerrit/#1 no coil"
+    WITH_COIL_SCENE = "Gerrit/#1 with coil"
+
     def __init__(self, parent=None):
         Core.StaticEntity.__init__(self, parent)
 
+    def get_scene_names(self):
+        """
+        This overriden, constant method returns the names of all scenes Gerrit may play with Ivy.
+        """
+        return [GerritsHouse.NO_FIND_SCENE, GerritsHouse.WITH_FIND_SCENE,
+                GerritsHouse.NO_COIL_SCENE, GerritsHouse.WITH_COIL_SCENE]
+
     def on_used(self, user, other_entity=None):
         try:
             gave_broken_turbine = bool(self.get_state("gave broken turbine"))
@@ -67,16 +93,16 @@ class GerritsHouse(Core.StaticEntity):
         if gave_broken_turbine:
             wind_turbine = user.findChild(CopperCoil)
             if wind_turbine is None:
-                Scene.XMLScene("Gerrit/#1 no coil", user).play()
+                Scene.XMLScene(GerritsHouse.NO_COIL_SCENE, user).play()
             else:
-                Scene.XMLScene("Gerrit/#1 with coil", user).play()
+                Scene.XMLScene(GerritsHouse.WITH_COIL_SCENE, user).play()
         else:
             find_name = Core.get_res_man().get_string("game.places.yard.mysteriousFind.name")
-            find = user.findChild(Core.Entity, find_name)
+            find = user.find_entity(find_name)
             if find is None:
-                Scene.XMLScene("Gerrit/#0 no find", user).play()
+                Scene.XMLScene(GerritsHouse.NO_FIND_SCENE, user).play()
             else:
-                Scene.XMLScene("Gerrit/#0 with find", user).play()
+                Scene.XMLScene(GerritsHouse.WITH_FIND_SCENE, user).play()
 
         return True
 
@@ -88,6 +114,12 @@ class House1(Core.StaticEntity):
         Core.StaticEntity.__init__(self, parent)
         self.scene = "House1"
 
+    def get_scene_names(self):
+        """
+        This overriden, constant method returns the name of the scene of our family.
+        """
+        return [self.scene]
+
     def on_used(self, user, other_entity=None):
         try:
             visited_habour = bool(user.get_state("visited habour"))
@@ -63,17 +63,25 @@ class Signpost(Core.StaticEntity):
     """
     An unused signpost in Ivy's yard, which will be reused as the pole of her wind turbine.
     """
+    SCENE = "Ending"
+
     def __init__(self, parent=None):
         Core.StaticEntity.__init__(self, parent)
         self.setObjectName("Wegweiser")
         self.activly_usable = True
 
+    def get_scene_names(self):
+        """
+        This overriden, constant method returns the name of the ending scene.
+        """
+        return [Signpost.SCENE]
+
     def on_used(self, user, other_entity=None):
         if isinstance(other_entity, WindTurbine):
             other_entity.transfer(None)
             self.set_state("turbine mounted", 1)
             self.setObjectName("aufgestelltes Windrad")
-            Scene.XMLScene("Ending", user).play()
+            Scene.XMLScene(Signpost.SCENE, user).play()
             return True
         else:
             return False
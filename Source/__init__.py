@@ -27,31 +27,55 @@ import Source.Roads
 import Source.Village
 import Source.WindTurbine
 
-class Game(Source.EngineL.Core.SinglePlayerApp):
+def register_entity_classes(app):
     """
-    EngineL Game Class
+    This function registers all entity classes of the game with the given app.
     """
-    def __init__(self, argv):
-        Source.EngineL.Core.SinglePlayerApp.__init__(self, argv)
+    Source.EngineL.Gameplay.register_entity_classes(app)
+    Source.Habour.register_entity_classes(app)
+    Source.Hut.register_entity_classes(app)
+    Source.Ladder.register_entity_classes(app)
+    Source.Minigame.register_entity_classes(app)
+    Source.Mountain.register_entity_classes(app)
+    Source.Roads.register_entity_classes(app)
+    Source.Village.register_entity_classes(app)
+    Source.WindTurbine.register_entity_classes(app)
+
+def launch_game(app, save_path=None):
+    """
+    This function registers all entity classes and commands of the game with the given app,
+    restores the world from the given save_path and launches all of it's entities. If save_path is
+    None, the default save or world file is used. If something goes wrong, the app crashes.
+    """
+    try:
+        register_entity_classes(app)
+        Source.EngineL.Gameplay.register_commands(app)
+
+        app.restore_world(save_path)
 
-        try:
-            Source.EngineL.Gameplay.register_entity_classes(self)
+        app.connect_places()
 
-            Source.Habour.register_entity_classes(self)
-            Source.Hut.register_entity_classes(self)
-            Source.Ladder.register_entity_classes(self)
-            Source.Minigame.register_entity_classes(self)
-            Source.Mountain.register_entity_classes(self)
-            Source.Roads.register_entity_classes(self)
-            Source.Village.register_entity_classes(self)
-            Source.WindTurbine.register_entity_classes(self)
+        app.start_journal()
+    except Exception as err:
+        app.crash(str(err))
 
-            self.restore_world()
+    for child in app.children():
+        if issubclass(child.__class__, Source.EngineL.Core.Entity):
+            child.on_game_launched()
 
-            self.connect_places()
-        except Exception as err:
-            self.crash(str(err))
+class Game(Source.EngineL.Core.SinglePlayerApp):
+    """
+    EngineL Game Class
+    """
+    def __init__(self, argv):
+        Source.EngineL.Core.SinglePlayerApp.__init__(self, argv)
+        launch_game(self)
 
-        for child in self.children():
-            if issubclass(child.__class__, Source.EngineL.Core.Entity):
-                child.on_game_launched()
+class HeadlessGame(Source.EngineL.Core.HeadlessApp):
+    """
+    EngineL Game Class without widgets. Everything the game shows is passed to the output_sink and
+    the world is restored from save_path, if it is given.
+    """
+    def __init__(self, argv, output_sink=None, save_path=None):
+        Source.EngineL.Core.HeadlessApp.__init__(self, argv, output_sink)
+        launch_game(self, save_path)
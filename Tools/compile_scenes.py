@@ -0,0 +1,271 @@
+"""
+This script compiles every scene under Resources/Scenes ahead of time, so that mistakes are found
+before a player runs into them. Besides the errors the game would find when it compiles a scene,
+like illegal elements or invalid numbers, it checks every element against the world in
+Resources/world.xml: The classes of spawned entities have to be registered, the names of subjects
+and targets have to be found, either in the world or as the name of an entity a scene spawns, and
+the resource strings that texts and options use have to exist. Since the game's code may create
+entities too, like the witch on the road to the habour, a name that can't be found is only a
+warning, unless --strict is given. Everything is reported with the file and the line of the
+element. If there are no errors, the compiled scenes are written to the scene bundle, which the
+game loads instead of compiling the scenes again.
+
+Run it from the root directory of the game:
+python Tools/compile_scenes.py [--output bundle] [--check] [--strict]
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import argparse
+import ast
+import inspect
+import os
+import sys
+import textwrap
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import Source
+from Source.EngineL import Core, Scene
+
+# The names an op refers to, as the index of it's argument and the branch that is taken if the
+# name can't be found.
+NAME_ARGUMENTS = {"transfer": ((0, "noSubject"), (1, "noTarget")),
+                  "spawn": ((1, "noTarget"),),
+                  "changeState": ((0, "noSubject"),)}
+
+class SceneChecker:
+    """
+    The SceneChecker compiles the scenes and checks them against the world of the given app. It
+    collects the errors and warnings as lines of text.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.errors = []
+        self.warnings = []
+        self.spawned_names = set()
+
+    def report(self, scene_path, line, message, is_error=True):
+        """
+        This non-constant method records the given message about the element in the given line of
+        the scene file at scene_path.
+        """
+        text = scene_path + ":" + str(line) + ": " + message
+        if is_error:
+            self.errors.append(text)
+        else:
+            self.warnings.append(text)
+
+    def report_compile_error(self, scene_path, error):
+        """
+        This non-constant method records the given error of compiling the scene file at
+        scene_path.
+        """
+        if isinstance(error, Core.ElementTree.ParseError):
+            self.report(scene_path, error.position[0], str(error))
+        elif hasattr(error, "line"):
+            self.report(scene_path, error.line, str(error))
+        else:
+            self.errors.append(scene_path + ": " + str(error))
+
+    def compile(self, scene_path):
+        """
+        This non-constant method reads and compiles the scene file at scene_path and returns it's
+        content, stat result and program, or None if it isn't well-formed. Illegal elements and
+        invalid attributes are recorded and left out, and every block is compiled on it's own, so
+        that an error doesn't hide the errors after it or in the other branches. The names of the
+        entities it spawns are recorded, since the other scenes may refer to them.
+        """
+        compile_errors = []
+        try:
+            scene_stat = os.stat(scene_path)
+            with open(scene_path, "rb") as scene_file:
+                source = scene_file.read()
+            program = Scene.SceneProgram(source, errors=compile_errors)
+        except OSError as error:
+            self.errors.append(scene_path + ": " + str(error))
+            return None
+        except Core.ElementTree.ParseError as error:
+            self.report_compile_error(scene_path, error)
+            return None
+
+        compiled_blocks = get_compiled_blocks(program, self, scene_path)
+        for error in compile_errors:
+            self.report_compile_error(scene_path, error)
+        for block, _ in compiled_blocks:
+            for code, arguments, _ in block:
+                if code != "spawn":
+                    continue
+                entity_class = self.app.lookup_entity_class(arguments[0])
+                if entity_class is not None:
+                    self.spawned_names.update(get_constructor_names(self.app, entity_class))
+        return source, scene_stat, program
+
+    def check(self, scene_path, program):
+        """
+        This non-constant method checks every op of the given program, which was compiled from the
+        scene file at scene_path, against the world.
+        """
+        for block, block_lines in get_compiled_blocks(program):
+            for (code, arguments, branches), line in zip(block, block_lines):
+                if code == "text" and arguments[0] is not None:
+                    self.check_strings(scene_path, line, arguments[0])
+                elif code == "choice":
+                    for text in arguments:
+                        self.check_strings(scene_path, line, text)
+                elif code == "spawn" and self.app.lookup_entity_class(arguments[0]) is None:
+                    self.report(scene_path, line, "Unknown entity class " + arguments[0] + "!")
+                for index, branch_name in NAME_ARGUMENTS.get(code, ()):
+                    self.check_name(scene_path, line, code, arguments[index],
+                                    branch_name in branches)
+
+    def check_strings(self, scene_path, line, text):
+        """
+        This non-constant method checks that the resource strings the given text uses exist.
+        """
+        for match in Core.TEMPLATE_PATTERN.finditer(text):
+            if not self.app.get_res_man().has_string(match.group(1)):
+                self.report(scene_path, line, "Unknown resource string " + match.group(1) + "!")
+
+    def check_name(self, scene_path, line, code, name, has_branch):
+        """
+        This non-constant method checks that an entity with the given name exists or is spawned by
+        a scene, and warns if it doesn't. The warning tells whether the op with the given code
+        has a branch for this case or crashes the game.
+        """
+        if code == "transfer" and name == "None":
+            return
+        if self.app.find_entity(name) is not None or name in self.spawned_names:
+            return
+        message = "The entity " + name + " of the scene element " + code + " can't be found, "
+        if has_branch:
+            message += "so it's branch is taken, unless the entity is created by the code."
+        else:
+            message += "so the game crashes, unless the entity is created by the code."
+        self.report(scene_path, line, message, False)
+
+def get_constructor_names(app, entity_class):
+    """
+    This function returns the names the constructor of the given entity class may give it's
+    entities. They are read from the source of the constructor instead of creating an entity, since
+    constructors change the world. If it doesn't call setObjectName, the constructors of the base
+    classes are read. Only names that are string literals or resource strings looked up with
+    get_string are found.
+    """
+    for base_class in entity_class.__mro__:
+        if "__init__" not in base_class.__dict__:
+            continue
+        try:
+            source = textwrap.dedent(inspect.getsource(base_class.__init__))
+        except (OSError, TypeError):
+            return set()
+        names = set()
+        for node in ast.walk(ast.parse(source)):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr == "setObjectName" and len(node.args) == 1):
+                name = get_constant_string(app, node.args[0])
+                if name is not None:
+                    names.add(name)
+        if len(names) > 0:
+            return names
+    return set()
+
+def get_constant_string(app, node):
+    """
+    This function returns the string the given expression node of a constructor evaluates to, if
+    it is a string literal or a call of get_string with one, and None if not.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "get_string" and len(node.args) == 1):
+        key = get_constant_string(app, node.args[0])
+        if key is not None and app.get_res_man().has_string(key):
+            return app.get_res_man().get_string(key)
+    return None
+
+def get_compiled_blocks(program, checker=None, scene_path=None):
+    """
+    This function returns the blocks of the given program that can be compiled, together with the
+    lines of their ops. If a checker is given, it records the errors of the other blocks, which
+    are in the scene file at scene_path.
+    """
+    blocks = []
+    block_index = 0
+    while block_index < program.get_block_count():
+        try:
+            blocks.append((program.get_block(block_index), program.get_block_lines(block_index)))
+        except (Core.ElementTree.ParseError, ValueError) as error:
+            if checker is not None:
+                checker.report_compile_error(scene_path, error)
+        block_index += 1
+    return blocks
+
+def main():
+    """
+    This function runs the compiler and returns the exit code.
+    """
+    parser = argparse.ArgumentParser(description="Checks and compiles all scenes of the game.")
+    parser.add_argument("--output", default=Scene.SCENE_BUNDLE_PATH,
+                        help="the scene bundle to write, by default " + Scene.SCENE_BUNDLE_PATH)
+    parser.add_argument("--check", action="store_true",
+                        help="only check the scenes and don't write the bundle")
+    parser.add_argument("--strict", action="store_true",
+                        help="treat the warnings as errors")
+    arguments = parser.parse_args()
+
+    # The world is only read, so the entities aren't launched and no scene is played.
+    app = Core.HeadlessApp([sys.argv[0], "-n"])
+    Source.register_entity_classes(app)
+    try:
+        app.restore_world(Core.WORLD_PATH)
+    except (OSError, ValueError, LookupError, Core.ElementTree.ParseError) as error:
+        print("Could not read " + Core.WORLD_PATH + ": " + str(error), file=sys.stderr)
+        return 1
+
+    checker = SceneChecker(app)
+    compiled_scenes = dict()
+    for scene_name in Scene.list_scene_names():
+        scene_path = os.path.join(Scene.SCENES_PATH, scene_name + ".xml")
+        compiled_scene = checker.compile(scene_path)
+        if compiled_scene is not None:
+            compiled_scenes[scene_name] = compiled_scene
+    for scene_name, (_, _, program) in sorted(compiled_scenes.items()):
+        checker.check(os.path.join(Scene.SCENES_PATH, scene_name + ".xml"), program)
+
+    # The errors of compiling and checking a file are found in two passes, but shown together.
+    for warning in sorted(checker.warnings, key=lambda text: text.split(":", 1)[0]):
+        print("warning: " + warning, file=sys.stderr)
+    for error in sorted(checker.errors, key=lambda text: text.split(":", 1)[0]):
+        print("error: " + error, file=sys.stderr)
+    if arguments.strict:
+        checker.errors.extend(checker.warnings)
+    if len(checker.errors) > 0:
+        print(str(len(checker.errors)) + " errors, no bundle was written.", file=sys.stderr)
+        return 1
+
+    if not arguments.check:
+        entries = {scene_name: Scene.build_bundle_entry(source, scene_stat, program)
+                   for scene_name, (source, scene_stat, program) in compiled_scenes.items()}
+        try:
+            Scene.write_scene_bundle(arguments.output, entries)
+        except OSError as error:
+            print("Could not write " + arguments.output + ": " + str(error), file=sys.stderr)
+            return 1
+    print("Compiled " + str(len(compiled_scenes)) + " scenes.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
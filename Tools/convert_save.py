@@ -0,0 +1,70 @@
+"""
+This script converts a save file between the XML and the binary format. The format of the input
+file is detected and the output file is written in the other one, unless --format is given.
+
+Run it from the root directory of the game:
+python Tools/convert_save.py input output [--format xml|binary]
+
+Copyright (C) 2017 Jan-Oliver "Janonard" Opdenhövel
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import Source
+from Source.EngineL import Core
+
+def main():
+    """
+    This function runs the conversion and returns the exit code.
+    """
+    parser = argparse.ArgumentParser(description="Converts a save between XML and binary.")
+    parser.add_argument("input", help="the save file to read")
+    parser.add_argument("output", help="the save file to write")
+    parser.add_argument("--format", choices=["xml", "binary"],
+                        help="the format of the output, the other one than the input's by default")
+    arguments = parser.parse_args()
+
+    # The binary format stores the entity classes by their index in the register, so we need one.
+    app = Core.HeadlessApp([sys.argv[0], "-n"])
+    Source.register_entity_classes(app)
+
+    try:
+        with open(arguments.input, "rb") as input_file:
+            binary_input = input_file.read(len(Core.BINARY_SAVE_MAGIC)) == Core.BINARY_SAVE_MAGIC
+        tree = Core.parse_save(arguments.input)
+    except (OSError, ValueError, Core.ElementTree.ParseError) as error:
+        print("Could not read " + arguments.input + ": " + str(error), file=sys.stderr)
+        return 1
+
+    output_format = arguments.format
+    if output_format is None:
+        output_format = "xml" if binary_input else "binary"
+
+    try:
+        with open(arguments.output, "wb") as output_file:
+            if output_format == "binary":
+                Core.write_binary_save(tree, output_file, app.get_entity_class_names())
+            else:
+                tree.write(output_file, encoding="UTF-16", xml_declaration=True)
+    except OSError as error:
+        print("Could not write " + arguments.output + ": " + str(error), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())